@@ -0,0 +1,95 @@
+import logging
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (3.05, 10)
+
+# How often the Tk event loop checks for finished requests, in milliseconds
+POLL_INTERVAL_MS = 50
+
+logger = logging.getLogger(__name__)
+
+
+class ApiClient:
+    """
+    HTTP client for the desktop forms.
+    Requests go through one pooled keep-alive requests.Session and run on a background
+    thread pool, so the Tk main thread never blocks on the network. Completion callbacks
+    are queued and run on the Tk main thread by a poller scheduled with root.after.
+    """
+
+    def __init__(self, base_url: str, root=None, max_workers: int = 4, pool_size: int = 10,
+                 timeout=DEFAULT_TIMEOUT, retries: int = 3, backoff_factor: float = 0.3):
+        self.base_url = base_url.rstrip('/')
+        self.root = root
+        self.timeout = timeout
+        self.session = requests.Session()
+        # Connection failures are retried for every method since nothing reached the server;
+        # read and 5xx failures are only retried for idempotent methods (not POST)
+        retry = Retry(total=retries, connect=retries, read=retries, status=retries,
+                      backoff_factor=backoff_factor, status_forcelist=(502, 503, 504))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='api-client')
+        self._completed: "queue.Queue[Callable[[], None]]" = queue.Queue()
+        if root is not None:
+            root.after(POLL_INTERVAL_MS, self._poll)
+
+    def request(self, method: str, path: str, on_success: Callable[[requests.Response], None],
+                on_error: Optional[Callable[[requests.RequestException], None]] = None, **kwargs) -> Future:
+        """
+        Send a request in the background.
+        on_success(response) or on_error(exception) is later run on the thread that calls
+        process_completed() - the Tk main thread when a root was given.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        return self._executor.submit(self._send, method, f"{self.base_url}{path}", on_success, on_error, kwargs)
+
+    def _send(self, method, url, on_success, on_error, kwargs) -> requests.Response:
+        # Runs on a worker thread; callbacks are only queued here
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException as e:
+            if on_error is not None:
+                self._completed.put(lambda error=e: on_error(error))
+            raise
+        self._completed.put(lambda: on_success(response))
+        return response
+
+    def get(self, path: str, on_success, on_error=None, **kwargs) -> Future:
+        return self.request('GET', path, on_success, on_error, **kwargs)
+
+    def post(self, path: str, on_success, on_error=None, **kwargs) -> Future:
+        return self.request('POST', path, on_success, on_error, **kwargs)
+
+    def process_completed(self) -> int:
+        """Run the callbacks of finished requests on the calling thread. Returns how many ran."""
+        count = 0
+        while True:
+            try:
+                callback = self._completed.get_nowait()
+            except queue.Empty:
+                return count
+            # A failing callback must not drop the responses queued behind it
+            try:
+                callback()
+            except Exception:
+                logger.exception("Error in API response callback")
+            count += 1
+
+    def _poll(self) -> None:
+        try:
+            self.process_completed()
+        finally:
+            self.root.after(POLL_INTERVAL_MS, self._poll)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        self.session.close()
@@ -1,31 +1,61 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, request, jsonify
+from idempotency import idempotent
+from metrics import STORE_LATENCY, timed
+from patient_import import build_patient_record, import_patients, iter_rows, registration_error
+from repository import get_repository
 
-app = Flask(__name__)
+registration = Blueprint('registration', __name__)
 
-# Simulated database
-patients_db = []
+# Patients from the shared repository
+patients_db = get_repository().patients
 
-@app.route('/register', methods=['POST'])
+@registration.route('/register', methods=['POST'])
+@idempotent
 def register_patient():
     data = request.get_json()
 
     # Basic validation
-    required_fields = ['first_name', 'last_name', 'id_number', 'insurance_number', 'contact_info']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Missing field: {field}"}), 400
-
-    # Save to "database"
-    patient_record = {
-        "first_name": data['first_name'],
-        "last_name": data['last_name'],
-        "id_number": data['id_number'],
-        "insurance_number": data['insurance_number'],
-        "contact_info": data['contact_info']
-    }
-    patients_db.append(patient_record)
-
-    return jsonify({"message": "Patient registered successfully!"}), 201
+    error = registration_error(data)
+    if error is not None:
+        return jsonify({"error": error}), 400
+
+    # Save to "database" unless the email, ID number or insurance number is already registered
+    patient_record = build_patient_record(data)
+    with timed(STORE_LATENCY, 'patients', 'add_if_unique'):
+        patient_id, duplicates = patients_db.add_if_unique(patient_record)
+    if duplicates:
+        return jsonify({
+            "error": "Patient already registered",
+            "duplicate_fields": sorted(duplicates)
+        }), 409
+
+    # Near matches (same name and date of birth) are registered but flagged for review
+    with timed(STORE_LATENCY, 'patients', 'find_similar'):
+        similar = patients_db.find_similar(patient_record)
+    possible_duplicates = [p['patient_id'] for p in similar if p['patient_id'] != patient_id]
+
+    return jsonify({
+        "message": "Patient registered successfully!",
+        "patient_id": patient_id,
+        "possible_duplicates": possible_duplicates
+    }), 201
+
+@registration.route('/register/bulk', methods=['POST'])
+def register_patients_bulk():
+    # Upload formats: text/csv with a header row, or application/x-ndjson with one patient per line
+    if request.mimetype == 'text/csv':
+        file_format = 'csv'
+    elif request.mimetype == 'application/x-ndjson':
+        file_format = 'ndjson'
+    else:
+        return jsonify({"error": "Content-Type must be text/csv or application/x-ndjson"}), 415
+
+    report = import_patients(iter_rows(request.stream, file_format), patients_db)
+    return jsonify(report), 200
+
+# Standalone registration service; wsgi.create_app serves every service from one app
+app = Flask(__name__)
+app.register_blueprint(registration)
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -1,192 +1,737 @@
-from flask import Flask, request, jsonify, render_template
-from datetime import datetime
+from flask import Blueprint, Flask, Response, request, jsonify, render_template
+from datetime import datetime, timedelta
+from time import monotonic
+import json
+import os
 import uuid
+from appointment_store import CANCELLED, SLOT_RESOLUTION_MINUTES, slot_index, slot_time
+from availability_feed import availability_feed
+from policy_coverage import lapsed_appointments
+from doctor_registry import DoctorRegistry
+from doctor_schedule import Schedule, load_schedules, slot_times
+from idempotency import idempotent
+from insurance_verification_api import lookup_policy
+from metrics import STORE_LATENCY, timed
+from repository import get_repository
+from slot_search import earliest_openings
+from validation import APPOINTMENT_SCHEMA, RESCHEDULE_SCHEMA, WAITLIST_SCHEMA, is_valid_time, parse_date
+from waitlist import create_waitlist
 
-app = Flask(__name__)
+scheduling = Blueprint('scheduling', __name__)
 
-# Simulated insurance database (from Insurance Verification API)
-insurance_db = {
-    "INS456": {
-        "patient_id": "P123",
-        "first_name": "John",
-        "last_name": "Doe",
-        "date_of_birth": "1980-01-01",
-        "eligibility_status": "active",
-        "coverage_details": {
-            "plan_name": "Gold Plan",
-            "effective_date": "2024-01-01",
-            "expiration_date": "2025-12-31",
-            "copay": 20,
-            "deductible": 500
-        }
-    },
-    "INS789": {
-        "patient_id": "P456",
-        "first_name": "Jane",
-        "last_name": "Smith",
-        "date_of_birth": "1990-05-15",
-        "eligibility_status": "inactive",
-        "coverage_details": {
-            "plan_name": "Silver Plan",
-            "effective_date": "2023-01-01",
-            "expiration_date": "2024-06-30",
-            "copay": 30,
-            "deductible": 1000
-        }
-    }
-}
+# Insurance policies and appointments from the shared repository
+repository = get_repository()
+insurance_db = repository.insurance
 
-# Simulated doctors database
-doctors_db = [
+# Default schedule: every day 9:00 AM to 5:00 PM, 30-minute slots
+default_schedule = Schedule.office_hours("09:00", "17:00", slot_minutes=30, weekdays=range(7))
+default_time_slots = list(slot_times(default_schedule.week_masks[0]))
+
+# Simulated doctors database, indexed by doctor_id and specialty
+doctors_db = DoctorRegistry([
     {"doctor_id": "D001", "name": "Dr. Alice Brown", "specialty": "General Practice"},
     {"doctor_id": "D002", "name": "Dr. Bob Wilson", "specialty": "Cardiology"},
     {"doctor_id": "D003", "name": "Dr. Clara Lee", "specialty": "Pediatrics"}
-]
-
-# Simulated appointments database (in-memory)
-appointments_db = []
-
-# Available time slots (9:00 AM to 5:00 PM, 30-minute intervals)
-default_time_slots = [
-    "09:00", "09:30", "10:00", "10:30", "11:00", "11:30",
-    "12:00", "12:30", "13:00", "13:30", "14:00", "14:30",
-    "15:00", "15:30", "16:00", "16:30"
-]
-
-def validate_date(date_str):
-    try:
-        datetime.strptime(date_str, '%Y-%m-%d')
-        return True
-    except ValueError:
-        return False
-
-def validate_time(time_str):
-    try:
-        datetime.strptime(time_str, '%H:%M')
-        return True
-    except ValueError:
-        return False
-
-def check_insurance_eligibility(patient_id, insurance_id):
-    if insurance_id not in insurance_db:
-        return False, "Insurance policy not found"
-    record = insurance_db[insurance_id]
-    if record['patient_id'] != patient_id:
-        return False, "Patient ID does not match insurance record"
-    if record['eligibility_status'] != "active":
-        return False, "Insurance is not active"
+], default_schedule)
+# Schedule changes are published to subscribers of the availability feed
+doctors_db.on_schedule_change = availability_feed.publish_schedule
+
+# Per-doctor working hours, slot lengths, breaks and holidays (see doctor_schedule.py)
+if os.environ.get('DOCTOR_SCHEDULES_PATH'):
+    with open(os.environ['DOCTOR_SCHEDULES_PATH']) as f:
+        for doctor_id, schedule in load_schedules(json.load(f), default_schedule).items():
+            doctors_db.set_schedule(doctor_id, schedule)
+
+# Appointments, indexed by doctor and date
+appointments_db = repository.appointments
+
+# Patients waiting for a slot of a doctor or specialty; freed slots are offered to them first
+waitlist = create_waitlist(repository)
+
+# Maximum number of days returned by one page of /api/availability/range
+MAX_RANGE_PAGE_DAYS = 31
+
+# Limits of /api/appointments/next-available
+MAX_SEARCH_DAYS = 90
+DEFAULT_SEARCH_DAYS = 14
+MAX_OPENINGS = 50
+
+# Long-poll wait of /api/availability/changes in seconds
+DEFAULT_CHANGES_TIMEOUT = 25
+MAX_CHANGES_TIMEOUT = 60
+# An SSE stream sends a comment this often when idle, and is closed (for the client to
+# reconnect with Last-Event-ID) after STREAM_MAX_SECONDS so it does not hold a worker forever
+STREAM_HEARTBEAT_SECONDS = 15
+STREAM_MAX_SECONDS = int(os.environ.get('AVAILABILITY_STREAM_MAX_SECONDS', 300))
+
+# Longest date range of a waitlist entry
+MAX_WAITLIST_DAYS = 90
+
+# Page size of /api/appointments/day
+DEFAULT_DAY_PAGE = 20
+MAX_DAY_PAGE = 100
+
+def eligibility_decision(result):
+    """(is_eligible, message) for a lookup_policy result"""
+    record, covered, reason = result
+    if not covered:
+        return False, reason
     return True, "Insurance verified successfully"
 
-@app.route('/appointment', methods=['GET'])
+def check_insurance_eligibility(patient_id, insurance_id, service_date=None):
+    # Policy lookups share the insurance service's eligibility cache
+    return eligibility_decision(lookup_policy(patient_id, insurance_id, service_date))
+
+@scheduling.route('/appointment', methods=['GET'])
 def appointment_page():
     return render_template('appointment_scheduling.html')
 
-@app.route('/api/doctors', methods=['GET'])
+@scheduling.route('/api/doctors', methods=['GET'])
 def get_doctors():
     try:
-        return jsonify(doctors_db), 200
+        return jsonify(list(doctors_db)), 200
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/availability', methods=['GET'])
+def free_slot_mask(doctor_id, day):
+    """Bitmap of the slots in a doctor's schedule on a day that are not booked yet"""
+    return doctors_db.schedule(doctor_id).day_mask(day) & ~appointments_db.booked_mask(doctor_id, day.isoformat())
+
+def availability_response(args):
+    """(body, status) of GET /api/availability for a query string"""
+    doctor_id = args.get('doctor_id')
+    date = args.get('date')
+
+    if not doctor_id or not date:
+        return {"error": "doctor_id and date are required"}, 400
+
+    day = parse_date(date)
+    if day is None:
+        return {"error": "Invalid date format. Use YYYY-MM-DD"}, 400
+
+    # Check if doctor exists
+    if doctor_id not in doctors_db:
+        return {"error": "Doctor not found"}, 400
+
+    # Taken before reading the slots, so resuming the feed from it cannot miss a change
+    feed_token = availability_feed.token()
+    # Slots in the doctor's schedule that are not booked
+    with timed(STORE_LATENCY, 'appointments', 'booked_mask'):
+        free_mask = free_slot_mask(doctor_id, day)
+    available_slots = list(slot_times(free_mask))
+
+    return {
+        "doctor_id": doctor_id,
+        "date": date,
+        "available_slots": available_slots,
+        "feed_token": feed_token
+    }, 200
+
+@scheduling.route('/api/availability', methods=['GET'])
 def get_availability():
+    try:
+        body, status = availability_response(request.args)
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def feed_subscription(args):
+    """(doctor_id, date) to follow from the query string, or an error message"""
+    doctor_id = args.get('doctor_id')
+    date = args.get('date')
+    if not doctor_id:
+        return None, "doctor_id is required"
+    if doctor_id not in doctors_db:
+        return None, "Doctor not found"
+    if date and parse_date(date) is None:
+        return None, "Invalid date format. Use YYYY-MM-DD"
+    return (doctor_id, date or None), None
+
+def feed_change(event):
+    """An event of the availability feed as sent to clients, with its resume token"""
+    change = {key: value for key, value in event.items() if key != 'seq'}
+    change['token'] = availability_feed.token(event['seq'])
+    return change
+
+@scheduling.route('/api/availability/changes', methods=['GET'])
+def get_availability_changes():
+    try:
+        subscription, error = feed_subscription(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        timeout = request.args.get('timeout', str(DEFAULT_CHANGES_TIMEOUT))
+        if not timeout.isdigit() or int(timeout) > MAX_CHANGES_TIMEOUT:
+            return jsonify({"error": f"timeout must be between 0 and {MAX_CHANGES_TIMEOUT}"}), 400
+
+        since = request.args.get('since')
+        seq = availability_feed.parse_token(since) if since else availability_feed.last_seq
+        if seq is None:
+            # Changes since the token are no longer known: fetch availability again and resume from here
+            return jsonify({"changes": [], "next": availability_feed.token(), "reset": True}), 200
+
+        events, last = availability_feed.wait(seq, int(timeout), *subscription)
+        if events is None:
+            return jsonify({"changes": [], "next": availability_feed.token(last), "reset": True}), 200
+        return jsonify({
+            "changes": [feed_change(event) for event in events],
+            "next": availability_feed.token(last),
+            "reset": False
+        }), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def sse_event(name, token, data):
+    return f"id: {token}\nevent: {name}\ndata: {json.dumps(data)}\n\n"
+
+@scheduling.route('/api/availability/stream', methods=['GET'])
+def stream_availability():
+    try:
+        subscription, error = feed_subscription(request.args)
+        if error:
+            return jsonify({"error": error}), 400
+        # EventSource sends the id of the last event it received when it reconnects
+        since = request.headers.get('Last-Event-ID') or request.args.get('since')
+        seq = availability_feed.parse_token(since) if since else None
+
+        def generate(seq):
+            yield "retry: 1000\n\n"
+            if seq is None:
+                seq = availability_feed.last_seq
+                if since:
+                    yield sse_event('reset', availability_feed.token(seq), {})
+            deadline = monotonic() + STREAM_MAX_SECONDS
+            while True:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    return
+                events, last = availability_feed.wait(seq, min(STREAM_HEARTBEAT_SECONDS, remaining), *subscription)
+                if events is None:
+                    yield sse_event('reset', availability_feed.token(last), {})
+                elif events:
+                    for event in events:
+                        change = feed_change(event)
+                        yield sse_event('availability', change['token'], change)
+                else:
+                    yield ": keepalive\n\n"
+                seq = last
+
+        response = Response(generate(seq), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        # Stops nginx from buffering the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/availability/range', methods=['GET'])
+def get_availability_range():
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        doctor_ids = [d for d in request.args.get('doctor_ids', '').split(',') if d]
+        specialty = request.args.get('specialty')
+
+        if not start or not end:
+            return jsonify({"error": "start and end are required"}), 400
+        start_date = parse_date(start)
+        end_date = parse_date(end)
+        if start_date is None or end_date is None:
+            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
+        if end_date < start_date:
+            return jsonify({"error": "end must not be before start"}), 400
+
+        page_days = request.args.get('page_days', str(MAX_RANGE_PAGE_DAYS))
+        if not page_days.isdigit() or not 1 <= int(page_days) <= MAX_RANGE_PAGE_DAYS:
+            return jsonify({"error": f"page_days must be between 1 and {MAX_RANGE_PAGE_DAYS}"}), 400
+
+        unknown = [d for d in doctor_ids if d not in doctors_db]
+        if unknown:
+            return jsonify({"error": f"Doctor not found: {', '.join(unknown)}"}), 400
+
+        if doctor_ids:
+            doctors = [doctors_db.get(d) for d in doctor_ids]
+            if specialty:
+                doctors = [d for d in doctors if d['specialty'] == specialty]
+        else:
+            doctors = doctors_db.for_specialty(specialty) if specialty else list(doctors_db)
+
+        # One page covers at most page_days days; the client continues from next_start
+        page_end = min(end_date, start_date + timedelta(days=int(page_days) - 1))
+        days = [start_date + timedelta(days=n) for n in range((page_end - start_date).days + 1)]
+
+        with timed(STORE_LATENCY, 'appointments', 'booked_mask_range'):
+            free_masks = {doctor['doctor_id']: [free_slot_mask(doctor['doctor_id'], day) for day in days]
+                          for doctor in doctors}
+        # The columns are every slot any of the doctors works on any of the days
+        slots_mask = 0
+        for doctor in doctors:
+            schedule = doctors_db.schedule(doctor['doctor_id'])
+            for day in days:
+                slots_mask |= schedule.day_mask(day)
+        slots = slot_times(slots_mask)
+        slot_bits = [1 << slot_index(slot) for slot in slots]
+
+        # Each day is encoded as a string with one character per slot: "1" free, "0" booked or not worked
+        availability = {
+            doctor_id: [''.join('1' if mask & bit else '0' for bit in slot_bits) for mask in masks]
+            for doctor_id, masks in free_masks.items()
+        }
+
+        return jsonify({
+            "start": start,
+            "end": page_end.isoformat(),
+            "slots": list(slots),
+            "dates": [day.isoformat() for day in days],
+            "availability": availability,
+            "next_start": (page_end + timedelta(days=1)).isoformat() if page_end < end_date else None
+        }), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def first_slot_from(minutes):
+    """Index of the first slot starting at or after the given minute of the day"""
+    return -(-minutes // SLOT_RESOLUTION_MINUTES)
+
+def parse_after(value):
+    """Parse YYYY-MM-DD or YYYY-MM-DDTHH:MM into (date, first slot index), or None if invalid"""
+    day = parse_date(value[:10])
+    if day is None:
+        return None
+    if len(value) == 10:
+        return day, 0
+    if value[10] not in 'T ' or not is_valid_time(value[11:]):
+        return None
+    return day, first_slot_from(int(value[11:13]) * 60 + int(value[14:16]))
+
+@scheduling.route('/api/appointments/next-available', methods=['GET'])
+def get_next_available():
+    try:
+        specialty = request.args.get('specialty')
+        doctor_ids = [d for d in request.args.get('doctor_ids', '').split(',') if d]
+
+        after = request.args.get('after')
+        if after:
+            parsed = parse_after(after)
+            if parsed is None:
+                return jsonify({"error": "Invalid after format. Use YYYY-MM-DD or YYYY-MM-DDTHH:MM"}), 400
+        else:
+            now = datetime.now()
+            parsed = now.date(), first_slot_from(now.hour * 60 + now.minute)
+        start_date, first_index = parsed
+
+        days = request.args.get('days', str(DEFAULT_SEARCH_DAYS))
+        if not days.isdigit() or not 1 <= int(days) <= MAX_SEARCH_DAYS:
+            return jsonify({"error": f"days must be between 1 and {MAX_SEARCH_DAYS}"}), 400
+        limit = request.args.get('limit', '5')
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_OPENINGS:
+            return jsonify({"error": f"limit must be between 1 and {MAX_OPENINGS}"}), 400
+
+        unknown = [d for d in doctor_ids if d not in doctors_db]
+        if unknown:
+            return jsonify({"error": f"Doctor not found: {', '.join(unknown)}"}), 400
+        if doctor_ids:
+            doctors = [doctors_db.get(d) for d in doctor_ids]
+            if specialty:
+                doctors = [d for d in doctors if d['specialty'] == specialty]
+        elif specialty:
+            doctors = doctors_db.for_specialty(specialty)
+            if not doctors:
+                return jsonify({"error": f"No doctors with specialty: {specialty}"}), 400
+        else:
+            doctors = list(doctors_db)
+
+        end_date = start_date + timedelta(days=int(days) - 1)
+        with timed(STORE_LATENCY, 'appointments', 'next_available'):
+            openings = earliest_openings([d['doctor_id'] for d in doctors], free_slot_mask,
+                                         start_date, end_date, first_index, int(limit))
+
+        return jsonify({
+            "specialty": specialty,
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
+            "openings": [{
+                "doctor_id": doctor_id,
+                "name": doctors_db.get(doctor_id)['name'],
+                "specialty": doctors_db.get(doctor_id)['specialty'],
+                "date": day.isoformat(),
+                "time": slot_time(index)
+            } for day, index, doctor_id in openings]
+        }), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/appointments/coverage-lapses', methods=['GET'])
+def get_coverage_lapses():
+    try:
+        start = request.args.get('start')
+        start_date = parse_date(start) if start else datetime.now().date()
+        if start_date is None:
+            return jsonify({"error": "Invalid start date. Use YYYY-MM-DD"}), 400
+
+        # Upcoming appointments whose insurance will have lapsed (or not started) by their date
+        with timed(STORE_LATENCY, 'appointments', 'coverage_lapses'):
+            lapsed = lapsed_appointments(appointments_db, insurance_db, start_date)
+        return jsonify({"start": start_date.isoformat(), "lapsed": lapsed}), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def booking_error(data):
+    """(body, status) if a booking request body is invalid, else None"""
+    missing_fields = APPOINTMENT_SCHEMA.missing_fields(data)
+    if missing_fields:
+        return {"error": f"Missing required fields: {', '.join(missing_fields)}"}, 400
+
+    # Validate inputs
+    errors = APPOINTMENT_SCHEMA.validate(data)
+    if errors:
+        return {"error": errors[0]}, 400
+
+    doctor_id = data['doctor_id']
+    if doctor_id not in doctors_db:
+        return {"error": "Doctor not found"}, 400
+    if not doctors_db.schedule(doctor_id).is_bookable(parse_date(data['date']), slot_index(data['time'])):
+        return {"error": "Invalid time slot"}, 400
+    return None
+
+def complete_booking(data, is_eligible, message):
+    """(body, status) of a valid booking request, given the result of check_insurance_eligibility"""
+    if not is_eligible:
+        return {"error": message}, 400
+
+    patient_id = data['patient_id']
+    doctor_id = data['doctor_id']
+    date = data['date']
+    time = data['time']
+
+    # Book appointment
+    appointment_id = str(uuid.uuid4())
+    appointment = {
+        "appointment_id": appointment_id,
+        "patient_id": patient_id,
+        "insurance_id": data['insurance_id'],
+        "doctor_id": doctor_id,
+        "date": date,
+        "time": time,
+        "status": "confirmed"
+    }
+    with timed(STORE_LATENCY, 'appointments', 'add'):
+        added = appointments_db.add(appointment)
+    if not added:
+        return {"error": "Time slot already booked"}, 409
+    availability_feed.publish(doctor_id, date, booked=[time])
+
+    return {
+        "appointment_id": appointment_id,
+        "patient_id": patient_id,
+        "doctor_id": doctor_id,
+        "date": date,
+        "time": time,
+        "status": "confirmed",
+        "message": "Appointment booked successfully"
+    }, 200
+
+@scheduling.route('/api/appointments', methods=['POST'])
+@idempotent
+def book_appointment():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+
+        error = booking_error(data)
+        if error:
+            return jsonify(error[0]), error[1]
+
+        # Verify insurance eligibility
+        is_eligible, message = check_insurance_eligibility(data['patient_id'], data['insurance_id'], data['date'])
+        body, status = complete_booking(data, is_eligible, message)
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def patient_appointments_response(args):
+    """(body, status) of GET /api/appointments for a query string"""
+    patient_id = args.get('patient_id')
+    status = args.get('status')
+    if not patient_id:
+        return {"error": "patient_id is required"}, 400
+
+    # Served from the per-patient index rather than a scan of every appointment
+    with timed(STORE_LATENCY, 'appointments', 'for_patient'):
+        appointments = appointments_db.for_patient(patient_id)
+    if status:
+        appointments = [a for a in appointments if a['status'] == status]
+
+    return {"patient_id": patient_id, "appointments": appointments}, 200
+
+@scheduling.route('/api/appointments', methods=['GET'])
+def list_patient_appointments():
+    try:
+        body, status = patient_appointments_response(request.args)
+        return jsonify(body), status
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/appointments/day', methods=['GET'])
+def list_day_appointments():
     try:
         doctor_id = request.args.get('doctor_id')
         date = request.args.get('date')
+        cursor = request.args.get('cursor')
 
         if not doctor_id or not date:
             return jsonify({"error": "doctor_id and date are required"}), 400
-
-        if not validate_date(date):
+        if parse_date(date) is None:
             return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
-
-        # Check if doctor exists
-        if not any(d['doctor_id'] == doctor_id for d in doctors_db):
+        if doctor_id not in doctors_db:
             return jsonify({"error": "Doctor not found"}), 400
+        # The cursor is the time of the last appointment on the previous page
+        if cursor and not is_valid_time(cursor):
+            return jsonify({"error": "Invalid cursor"}), 400
+        limit = request.args.get('limit', str(DEFAULT_DAY_PAGE))
+        if not limit.isdigit() or not 1 <= int(limit) <= MAX_DAY_PAGE:
+            return jsonify({"error": f"limit must be between 1 and {MAX_DAY_PAGE}"}), 400
 
-        # Get booked slots for the doctor on the specified date
-        booked_slots = [
-            appt['time'] for appt in appointments_db
-            if appt['doctor_id'] == doctor_id and appt['date'] == date
-        ]
-
-        # Calculate available slots
-        available_slots = [slot for slot in default_time_slots if slot not in booked_slots]
+        # One more than a page is read to know whether another page follows
+        with timed(STORE_LATENCY, 'appointments', 'day_appointments'):
+            appointments = appointments_db.day_appointments(
+                doctor_id, date, slot_index(cursor) if cursor else -1, int(limit) + 1)
+        page = appointments[:int(limit)]
 
         return jsonify({
             "doctor_id": doctor_id,
             "date": date,
-            "available_slots": available_slots
+            "appointments": page,
+            "next_cursor": page[-1]['time'] if len(appointments) > len(page) else None
         }), 200
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/appointments', methods=['POST'])
-def book_appointment():
+@scheduling.route('/api/appointments/<appointment_id>', methods=['GET'])
+def get_appointment(appointment_id):
+    try:
+        appointment = appointments_db.get(appointment_id)
+        if appointment is None:
+            return jsonify({"error": "Appointment not found"}), 404
+        return jsonify(appointment), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+def backfill_slot(doctor_id, date, time, exclude_patient=None):
+    """
+    Book a freed slot for the next eligible patient on the waitlist, re-checking their
+    insurance for the slot's date. Returns the new appointment, or None.
+    """
+    if not doctors_db.schedule(doctor_id).is_bookable(parse_date(date), slot_index(time)):
+        return None
+
+    def book(entry):
+        is_eligible, message = check_insurance_eligibility(entry['patient_id'], entry['insurance_id'], date)
+        if not is_eligible:
+            return message
+        appointment = {
+            "appointment_id": str(uuid.uuid4()),
+            "patient_id": entry['patient_id'],
+            "insurance_id": entry['insurance_id'],
+            "doctor_id": doctor_id,
+            "date": date,
+            "time": time,
+            "status": "confirmed",
+            "waitlist_id": entry['waitlist_id']
+        }
+        return appointment if appointments_db.add(appointment) else None
+
+    with timed(STORE_LATENCY, 'waitlist', 'backfill'):
+        entry = waitlist.backfill(doctor_id, doctors_db.get(doctor_id)['specialty'], date, book, exclude_patient)
+    if entry is None:
+        return None
+    availability_feed.publish(doctor_id, date, booked=[time])
+    return appointments_db.get(entry['appointment_id'])
+
+def backfill_summary(appointment):
+    if appointment is None:
+        return None
+    return {key: appointment[key] for key in ("appointment_id", "patient_id", "waitlist_id", "date", "time")}
+
+@scheduling.route('/api/appointments/<appointment_id>/cancel', methods=['POST'])
+def cancel_appointment(appointment_id):
+    try:
+        with timed(STORE_LATENCY, 'appointments', 'cancel'):
+            cancelled = appointments_db.cancel(appointment_id)
+        if cancelled is None:
+            if appointment_id not in appointments_db:
+                return jsonify({"error": "Appointment not found"}), 404
+            return jsonify({"error": "Appointment is already cancelled"}), 409
+        availability_feed.publish(cancelled['doctor_id'], cancelled['date'], released=[cancelled['time']])
+        backfilled = backfill_slot(cancelled['doctor_id'], cancelled['date'], cancelled['time'],
+                                   exclude_patient=cancelled['patient_id'])
+
+        return jsonify({**cancelled, "backfill": backfill_summary(backfilled),
+                        "message": "Appointment cancelled successfully"}), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/appointments/<appointment_id>/reschedule', methods=['POST'])
+def reschedule_appointment(appointment_id):
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "Request body is required"}), 400
+        errors = RESCHEDULE_SCHEMA.validate(data)
+        if errors:
+            return jsonify({"error": errors[0]}), 400
 
-        required_fields = ['patient_id', 'insurance_id', 'doctor_id', 'date', 'time']
-        missing_fields = [field for field in required_fields if field not in data or not data[field]]
-        if missing_fields:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
+        appointment = appointments_db.get(appointment_id)
+        if appointment is None:
+            return jsonify({"error": "Appointment not found"}), 404
+        if appointment['status'] == CANCELLED:
+            return jsonify({"error": "Appointment is cancelled"}), 409
 
-        patient_id = data['patient_id']
-        insurance_id = data['insurance_id']
-        doctor_id = data['doctor_id']
+        doctor_id = data.get('doctor_id') or appointment['doctor_id']
         date = data['date']
         time = data['time']
-
-        # Validate inputs
-        if not validate_date(date):
-            return jsonify({"error": "Invalid date format. Use YYYY-MM-DD"}), 400
-        if not validate_time(time):
-            return jsonify({"error": "Invalid time format. Use HH:MM"}), 400
-        if not any(d['doctor_id'] == doctor_id for d in doctors_db):
+        if doctor_id not in doctors_db:
             return jsonify({"error": "Doctor not found"}), 400
-        if time not in default_time_slots:
+        if not doctors_db.schedule(doctor_id).is_bookable(parse_date(date), slot_index(time)):
             return jsonify({"error": "Invalid time slot"}), 400
 
-        # Verify insurance eligibility
-        is_eligible, message = check_insurance_eligibility(patient_id, insurance_id)
+        # The policy the appointment was booked with must also cover the new date
+        if appointment.get('insurance_id'):
+            is_eligible, message = check_insurance_eligibility(
+                appointment['patient_id'], appointment['insurance_id'], date)
+            if not is_eligible:
+                return jsonify({"error": message}), 400
+
+        try:
+            with timed(STORE_LATENCY, 'appointments', 'reschedule'):
+                updated = appointments_db.reschedule(appointment_id, doctor_id, date, time)
+        except KeyError:
+            # Cancelled or removed since it was read above
+            return jsonify({"error": "Appointment not found or cancelled"}), 409
+        if updated is None:
+            return jsonify({"error": "Time slot already booked"}), 409
+        if (appointment['doctor_id'], appointment['date']) == (doctor_id, date):
+            if appointment['time'] != time:
+                availability_feed.publish(doctor_id, date, booked=[time], released=[appointment['time']])
+        else:
+            availability_feed.publish(appointment['doctor_id'], appointment['date'], released=[appointment['time']])
+            availability_feed.publish(doctor_id, date, booked=[time])
+        backfilled = None
+        if (appointment['doctor_id'], appointment['date'], appointment['time']) != (doctor_id, date, time):
+            backfilled = backfill_slot(appointment['doctor_id'], appointment['date'], appointment['time'],
+                                       exclude_patient=appointment['patient_id'])
+
+        return jsonify({**updated, "backfill": backfill_summary(backfilled),
+                        "message": "Appointment rescheduled successfully"}), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/waitlist', methods=['POST'])
+def join_waitlist():
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Request body is required"}), 400
+        errors = WAITLIST_SCHEMA.validate(data)
+        if errors:
+            return jsonify({"error": errors[0]}), 400
+
+        doctor_id = data.get('doctor_id') or None
+        specialty = data.get('specialty') or None
+        if (doctor_id is None) == (specialty is None):
+            return jsonify({"error": "Give either doctor_id or specialty"}), 400
+        if doctor_id is not None and doctor_id not in doctors_db:
+            return jsonify({"error": "Doctor not found"}), 400
+        if specialty is not None and not doctors_db.for_specialty(specialty):
+            return jsonify({"error": f"No doctors with specialty: {specialty}"}), 400
+        start_date, end_date = parse_date(data['start_date']), parse_date(data['end_date'])
+        if not 0 <= (end_date - start_date).days < MAX_WAITLIST_DAYS:
+            return jsonify({"error": f"end_date must be on or after start_date, within {MAX_WAITLIST_DAYS} days"}), 400
+        priority = data.get('priority', 0)
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            return jsonify({"error": "priority must be an integer"}), 400
+
+        # The policy must be active to join; each offered slot's date is checked again when it is freed
+        is_eligible, message = check_insurance_eligibility(data['patient_id'], data['insurance_id'])
         if not is_eligible:
             return jsonify({"error": message}), 400
 
-        # Check if slot is already booked
-        if any(appt['doctor_id'] == doctor_id and appt['date'] == date and appt['time'] == time
-               for appt in appointments_db):
-            return jsonify({"error": "Time slot already booked"}), 409
+        entry = waitlist.add(data['patient_id'], data['insurance_id'], data['start_date'], data['end_date'],
+                             doctor_id, specialty, priority)
+        return jsonify(entry), 201
 
-        # Book appointment
-        appointment_id = str(uuid.uuid4())
-        appointment = {
-            "appointment_id": appointment_id,
-            "patient_id": patient_id,
-            "doctor_id": doctor_id,
-            "date": date,
-            "time": time,
-            "status": "confirmed"
-        }
-        appointments_db.append(appointment)
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        return jsonify({
-            "appointment_id": appointment_id,
-            "patient_id": patient_id,
-            "doctor_id": doctor_id,
-            "date": date,
-            "time": time,
-            "status": "confirmed",
-            "message": "Appointment booked successfully"
-        }), 200
+@scheduling.route('/api/waitlist', methods=['GET'])
+def get_waitlist():
+    try:
+        doctor_id = request.args.get('doctor_id')
+        specialty = request.args.get('specialty')
+        if not doctor_id and not specialty:
+            return jsonify({"error": "doctor_id or specialty is required"}), 400
+        entries = waitlist.queue(doctor_id) if doctor_id else waitlist.queue(specialty=specialty)
+        return jsonify({"doctor_id": doctor_id, "specialty": specialty, "entries": entries}), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/waitlist/<waitlist_id>', methods=['GET'])
+def get_waitlist_entry(waitlist_id):
+    try:
+        entry = waitlist.get(waitlist_id)
+        if entry is None:
+            return jsonify({"error": "Waitlist entry not found"}), 404
+        return jsonify(entry), 200
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@scheduling.route('/api/waitlist/<waitlist_id>', methods=['DELETE'])
+def leave_waitlist(waitlist_id):
+    try:
+        entry = waitlist.remove(waitlist_id)
+        if entry is None:
+            if waitlist.get(waitlist_id) is None:
+                return jsonify({"error": "Waitlist entry not found"}), 404
+            return jsonify({"error": "Waitlist entry is no longer waiting"}), 409
+        return jsonify(entry), 200
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+# Standalone scheduling service; wsgi.create_app serves every service from one app
+app = Flask(__name__)
+app.register_blueprint(scheduling)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
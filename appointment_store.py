@@ -0,0 +1,259 @@
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+# Slots are tracked as bits in a per-day bitmap, one bit per 5 minutes of the day
+SLOT_RESOLUTION_MINUTES = 5
+
+# Number of locks shared between all (doctor_id, date) keys
+LOCK_STRIPES = 64
+
+# A cancelled appointment is kept for the patient's history but no longer holds its slot
+CANCELLED = 'cancelled'
+
+
+def slot_index(time_str: str) -> int:
+    """Convert an HH:MM time to its bit position in a day bitmap"""
+    hours, minutes = time_str.split(':')
+    return (int(hours) * 60 + int(minutes)) // SLOT_RESOLUTION_MINUTES
+
+
+def slot_time(index: int) -> str:
+    """Convert a bit position in a day bitmap back to an HH:MM time"""
+    minutes = index * SLOT_RESOLUTION_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class AppointmentStore:
+    """
+    In-memory appointment store indexed by appointment_id, by patient_id and by (doctor_id, date).
+    Availability and conflict checks only touch a single day's bitmap, so their cost
+    does not depend on how many appointments are stored in total.
+    Writes for the same (doctor_id, date) are serialized by a striped lock, so
+    add() is an atomic check-and-reserve of a slot under threaded serving, and
+    reschedule() holds the locks of both days to move an appointment atomically.
+    With a journal (see journal.py), every change is recorded under the slot's lock and
+    is durable before add() or remove() returns.
+    """
+
+    def __init__(self, lock_stripes: int = LOCK_STRIPES, journal=None):
+        self.journal = journal
+        self._locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._appointments: Dict[str, Dict] = {}
+        # (doctor_id, date) -> bitmap of booked slots
+        self._day_masks: Dict[Tuple[str, str], int] = {}
+        # (doctor_id, date) -> {slot index: appointment_id}
+        self._day_slots: Dict[Tuple[str, str], Dict[int, str]] = {}
+        # patient_id -> appointment_ids, cancelled ones included
+        self._by_patient: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._appointments)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(list(self._appointments.values()))
+
+    def __contains__(self, appointment_id: str) -> bool:
+        return appointment_id in self._appointments
+
+    def get(self, appointment_id: str) -> Optional[Dict]:
+        return self._appointments.get(appointment_id)
+
+    def _lock_for(self, key: Tuple[str, str]) -> threading.Lock:
+        return self._locks[hash(key) % len(self._locks)]
+
+    @contextmanager
+    def _locked(self, appointment_id: str, *keys: Tuple[str, str]) -> Iterator[Optional[Dict]]:
+        """
+        Hold the locks of an appointment's day and of keys, and yield its record (None if
+        there is none). Stripes are taken in index order, so two callers cannot deadlock.
+        """
+        while True:
+            appointment = self._appointments.get(appointment_id)
+            day_keys = set(keys)
+            if appointment is not None:
+                day_keys.add((appointment['doctor_id'], appointment['date']))
+            stripes = sorted({hash(key) % len(self._locks) for key in day_keys})
+            with ExitStack() as stack:
+                for stripe in stripes:
+                    stack.enter_context(self._locks[stripe])
+                # Records are replaced, never mutated: if it is still the same one, it is still on that day
+                if self._appointments.get(appointment_id) is appointment:
+                    yield appointment
+                    return
+
+    def booked_mask(self, doctor_id: str, date: str) -> int:
+        """Bitmap of booked slots for a doctor on a date"""
+        return self._day_masks.get((doctor_id, date), 0)
+
+    def is_booked(self, doctor_id: str, date: str, time: str) -> bool:
+        return bool(self.booked_mask(doctor_id, date) >> slot_index(time) & 1)
+
+    def booked_times(self, doctor_id: str, date: str) -> List[str]:
+        """Sorted HH:MM times already booked for a doctor on a date"""
+        slots = self._day_slots.get((doctor_id, date), {})
+        return [slot_time(index) for index in sorted(slots)]
+
+    def for_patient(self, patient_id: str) -> List[Dict]:
+        """A patient's appointments, cancelled ones included, by date and time"""
+        appointments = [self._appointments.get(appointment_id)
+                        for appointment_id in list(self._by_patient.get(patient_id, ()))]
+        return sorted((a for a in appointments if a is not None), key=lambda a: (a['date'], a['time']))
+
+    def day_appointments(self, doctor_id: str, date: str, after: int = -1,
+                         limit: Optional[int] = None) -> List[Dict]:
+        """A doctor's booked appointments on a date in slot order, starting after slot index after"""
+        key = (doctor_id, date)
+        mask = self._day_masks.get(key, 0) >> (after + 1) << (after + 1)
+        slots = self._day_slots.get(key, {})
+        found = []
+        while mask and (limit is None or len(found) < limit):
+            lowest = mask & -mask
+            appointment = self._appointments.get(slots.get(lowest.bit_length() - 1))
+            if appointment is not None:
+                found.append(appointment)
+            mask ^= lowest
+        return found
+
+    def add(self, appointment: Dict) -> bool:
+        """
+        Atomically store an appointment if its slot is free.
+        Returns False without storing anything if the slot is already booked.
+        """
+        key = (appointment['doctor_id'], appointment['date'])
+        index = slot_index(appointment['time'])
+        with self._lock_for(key):
+            mask = self._day_masks.get(key, 0)
+            if mask >> index & 1:
+                return False
+            if self.journal is not None:
+                seq = self.journal.record('put', appointment['appointment_id'], appointment)
+            self._store(key, index, appointment)
+        if self.journal is not None:
+            self.journal.commit(seq)
+        return True
+
+    def _store(self, key: Tuple[str, str], index: int, appointment: Dict) -> None:
+        appointment_id = appointment['appointment_id']
+        if appointment.get('status') != CANCELLED:
+            self._day_masks[key] = self._day_masks.get(key, 0) | 1 << index
+            self._day_slots.setdefault(key, {})[index] = appointment_id
+        self._appointments[appointment_id] = appointment
+        self._by_patient.setdefault(appointment['patient_id'], set()).add(appointment_id)
+
+    def remove(self, appointment_id: str) -> Optional[Dict]:
+        """Remove an appointment and release its slot. Returns the removed record."""
+        with self._locked(appointment_id) as appointment:
+            if appointment is None:
+                return None
+            key = (appointment['doctor_id'], appointment['date'])
+            index = slot_index(appointment['time'])
+            if self.journal is not None:
+                seq = self.journal.record('del', appointment_id)
+            self._discard(key, index, appointment_id)
+        if self.journal is not None:
+            self.journal.commit(seq)
+        return appointment
+
+    def cancel(self, appointment_id: str) -> Optional[Dict]:
+        """
+        Mark an appointment cancelled and release its slot. Returns the cancelled record,
+        or None if there is no appointment or it was already cancelled.
+        """
+        with self._locked(appointment_id) as appointment:
+            if appointment is None or appointment.get('status') == CANCELLED:
+                return None
+            key = (appointment['doctor_id'], appointment['date'])
+            index = slot_index(appointment['time'])
+            cancelled = {**appointment, 'status': CANCELLED}
+            if self.journal is not None:
+                seq = self.journal.record('put', appointment_id, cancelled)
+            self._discard(key, index, appointment_id)
+            self._store(key, index, cancelled)
+        if self.journal is not None:
+            self.journal.commit(seq)
+        return cancelled
+
+    def reschedule(self, appointment_id: str, doctor_id: str, date: str, time: str) -> Optional[Dict]:
+        """
+        Atomically move an appointment to another slot: the new slot is claimed and the old
+        one released together, or nothing changes. Returns the updated record, or None if
+        the new slot is already booked. Raises KeyError if there is no active appointment.
+        """
+        new_key = (doctor_id, date)
+        new_index = slot_index(time)
+        with self._locked(appointment_id, new_key) as appointment:
+            if appointment is None or appointment.get('status') == CANCELLED:
+                raise KeyError(appointment_id)
+            key = (appointment['doctor_id'], appointment['date'])
+            index = slot_index(appointment['time'])
+            if (key, index) != (new_key, new_index) and self._day_masks.get(new_key, 0) >> new_index & 1:
+                return None
+            updated = {**appointment, 'doctor_id': doctor_id, 'date': date, 'time': time}
+            if self.journal is not None:
+                seq = self.journal.record('put', appointment_id, updated)
+            self._discard(key, index, appointment_id)
+            self._store(new_key, new_index, updated)
+        if self.journal is not None:
+            self.journal.commit(seq)
+        return updated
+
+    def _discard(self, key: Tuple[str, str], index: int, appointment_id: str) -> None:
+        appointment = self._appointments.pop(appointment_id, None)
+        if appointment is not None:
+            patient_ids = self._by_patient.get(appointment['patient_id'])
+            if patient_ids is not None:
+                patient_ids.discard(appointment_id)
+                if not patient_ids:
+                    del self._by_patient[appointment['patient_id']]
+        slots = self._day_slots.get(key, {})
+        # A cancelled appointment does not hold its slot, which may have been booked again
+        if slots.get(index) != appointment_id:
+            return
+        slots.pop(index)
+        mask = self._day_masks.get(key, 0) & ~(1 << index)
+        if mask:
+            self._day_masks[key] = mask
+        else:
+            self._day_masks.pop(key, None)
+            self._day_slots.pop(key, None)
+
+    def clear(self) -> None:
+        if self.journal is not None:
+            seq = self.journal.record('clear')
+        self._appointments.clear()
+        self._day_masks.clear()
+        self._day_slots.clear()
+        self._by_patient.clear()
+        if self.journal is not None:
+            self.journal.commit(seq)
+
+    def dump(self) -> List[Dict]:
+        """Every appointment, for a snapshot"""
+        return list(self._appointments.values())
+
+    def load(self, appointments: List[Dict]) -> None:
+        """Add the appointments of a snapshot"""
+        for appointment in appointments:
+            self._store((appointment['doctor_id'], appointment['date']), slot_index(appointment['time']), appointment)
+
+    def apply(self, op: str, appointment_id: Optional[str] = None, appointment: Optional[Dict] = None) -> None:
+        """
+        Redo a journaled change during recovery.
+        """
+        if op == 'put':
+            previous = self._appointments.get(appointment_id)
+            if previous is not None:
+                self._discard((previous['doctor_id'], previous['date']), slot_index(previous['time']), appointment_id)
+            self._store((appointment['doctor_id'], appointment['date']), slot_index(appointment['time']), appointment)
+        elif op == 'del':
+            previous = self._appointments.get(appointment_id)
+            if previous is not None:
+                self._discard((previous['doctor_id'], previous['date']), slot_index(previous['time']), appointment_id)
+        elif op == 'clear':
+            self._appointments.clear()
+            self._day_masks.clear()
+            self._day_slots.clear()
+            self._by_patient.clear()
+        else:
+            raise ValueError(f"Unknown journal operation: {op}")
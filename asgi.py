@@ -0,0 +1,239 @@
+"""
+ASGI app serving the eligibility, availability and booking routes with async handlers.
+
+Usage: uvicorn --factory asgi:create_app   (uvicorn, or any ASGI server, is installed separately)
+
+The Flask handlers block their worker thread while an eligibility lookup waits on the
+policy source, so once that source is a payer's API, throughput is capped by the number
+of worker threads. Here the lookup is awaited instead: one event loop keeps any number
+of lookups in flight, and concurrent cache misses for the same policy share one fetch.
+
+Only these routes are served; the rest of the API stays on the WSGI app (wsgi.py):
+    GET  /api/insurance/eligibility     POST /api/insurance/eligibility
+    GET  /api/availability
+    GET  /api/appointments              POST /api/appointments (with Idempotency-Key)
+Validation and responses are those of the Flask handlers: both call the same functions
+before and after the lookup. Repository operations are in-memory (or local SQLite) and
+are called directly on the event loop.
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+# (body, status) as returned by the shared handler functions
+Result = Tuple[Dict, int]
+# Async policy source: insurance_id -> (record, coverage interval) or None
+FetchCoverage = Callable[[str], Awaitable[Optional[Tuple]]]
+
+JSON_CONTENT_TYPE = 'application/json'
+
+
+def json_body(body) -> bytes:
+    # Encoded as Flask's jsonify does, so both apps return identical bytes
+    return (json.dumps(body, separators=(',', ':'), sort_keys=True) + '\n').encode()
+
+
+class Request:
+    """The parts of an HTTP request the handlers use"""
+
+    def __init__(self, scope: Dict, body: bytes):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        self.body = body
+        self.remote_addr = (scope.get('client') or (None, None))[0]
+        # Like Flask's request.args.get, the first value of a repeated parameter
+        self.args: Dict[str, str] = {}
+        for name, value in parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True):
+            self.args.setdefault(name, value)
+
+    def json(self):
+        """The JSON body; raises like Flask's get_json for another content type or invalid JSON"""
+        content_type = self.headers.get('content-type', '').split(';')[0].strip()
+        if content_type != JSON_CONTENT_TYPE and not content_type.endswith('+json'):
+            raise ValueError("Request body is not JSON")
+        return json.loads(self.body)
+
+
+class AsyncServices:
+    """The ASGI application; fetch_coverage defaults to the shared repository's insurance table"""
+
+    def __init__(self, fetch_coverage: Optional[FetchCoverage] = None):
+        # Imported once the repository is configured, as in wsgi.create_app
+        import appointment_scheduling_api as scheduling
+        import idempotency
+        import insurance_verification_api as insurance
+        self.scheduling = scheduling
+        self.idempotency = idempotency
+        self.insurance = insurance
+        self.fetch_coverage = fetch_coverage or self._fetch_local
+        # insurance_id -> fetch in progress, shared by concurrent cache misses
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.routes = {
+            ('GET', '/api/insurance/eligibility'): self.get_eligibility,
+            ('POST', '/api/insurance/eligibility'): self.post_eligibility,
+            ('GET', '/api/availability'): self.get_availability,
+            ('GET', '/api/appointments'): self.list_patient_appointments,
+            ('POST', '/api/appointments'): self.book_appointment,
+        }
+
+    async def _fetch_local(self, insurance_id: str) -> Optional[Tuple]:
+        return self.insurance.fetch_coverage(insurance_id)
+
+    async def _fetch_versioned(self, insurance_id: str) -> Tuple:
+        # The version is read first, so a policy updated during the fetch is not cached as current
+        version = self.insurance.eligibility_cache.version(insurance_id)
+        return version, await self.fetch_coverage(insurance_id)
+
+    async def _fetch_shared(self, insurance_id: str) -> Tuple:
+        """(policy version, coverage), sharing one fetch between concurrent lookups of a policy"""
+        future = self._in_flight.get(insurance_id)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_versioned(insurance_id))
+            self._in_flight[insurance_id] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(insurance_id, None))
+        # A cancelled waiter must not cancel the fetch the others are waiting for
+        return await asyncio.shield(future)
+
+    async def lookup_policy(self, patient_id: str, insurance_id: str, service_date: Optional[str] = None):
+        """insurance_verification_api.lookup_policy, awaiting the policy source on a cache miss"""
+        insurance = self.insurance
+        started = time.perf_counter()
+        cached = insurance.eligibility_cache.get(patient_id, insurance_id, service_date)
+        if cached is not insurance.MISS:
+            insurance.ELIGIBILITY_LATENCY.labels('cache').observe(time.perf_counter() - started)
+            return cached
+
+        version, coverage = await self._fetch_shared(insurance_id)
+        result = insurance.policy_result(patient_id, coverage, service_date)
+        insurance.eligibility_cache.put(patient_id, insurance_id, service_date, result, negative=result[0] is None,
+                                        version=version)
+        insurance.ELIGIBILITY_LATENCY.labels('store').observe(time.perf_counter() - started)
+        return result
+
+    async def get_eligibility(self, request: Request) -> Result:
+        error = self.insurance.eligibility_query_error(request.args)
+        if error:
+            return error
+        result = await self.lookup_policy(request.args.get('patient_id'), request.args.get('insurance_id'),
+                                          request.args.get('service_date'))
+        return self.insurance.eligibility_query_response(request.args, result)
+
+    async def post_eligibility(self, request: Request) -> Result:
+        data = request.json()
+        if not data:
+            return {"error": "Request body is required"}, 400
+        error = self.insurance.eligibility_request_error(data)
+        if error:
+            return error
+        result = await self.lookup_policy(data['patient_id'], data['insurance_id'], data.get('service_date'))
+        return self.insurance.eligibility_request_response(data, result)
+
+    async def get_availability(self, request: Request) -> Result:
+        return self.scheduling.availability_response(request.args)
+
+    async def list_patient_appointments(self, request: Request) -> Result:
+        return self.scheduling.patient_appointments_response(request.args)
+
+    async def book_appointment(self, request: Request) -> Result:
+        data = request.json()
+        if not data:
+            return {"error": "Request body is required"}, 400
+        error = self.scheduling.booking_error(data)
+        if error:
+            return error
+        # Verify insurance eligibility
+        result = await self.lookup_policy(data['patient_id'], data['insurance_id'], data['date'])
+        return self.scheduling.complete_booking(data, *self.scheduling.eligibility_decision(result))
+
+    async def handle(self, request: Request) -> Tuple[int, bytes, Dict[str, str]]:
+        """(status, body, extra headers) for a request"""
+        handler = self.routes.get((request.method, request.path))
+        if handler is None:
+            if any(path == request.path for _, path in self.routes):
+                return 405, json_body({"error": "Method not allowed"}), {}
+            return 404, json_body({"error": "Not found"}), {}
+        if handler == self.book_appointment and 'idempotency-key' in request.headers:
+            return await self._idempotent(handler, request)
+        return await self._respond(handler, request)
+
+    async def _respond(self, handler, request: Request) -> Tuple[int, bytes, Dict[str, str]]:
+        try:
+            body, status = await handler(request)
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            body, status = {"error": "Internal server error"}, 500
+        return status, json_body(body), {}
+
+    async def _idempotent(self, handler, request: Request) -> Tuple[int, bytes, Dict[str, str]]:
+        # The same protocol as idempotency.idempotent; begin() may wait for a repeat still in progress
+        idempotency = self.idempotency
+        key = request.headers['idempotency-key']
+        error = idempotency.key_error(key)
+        if error:
+            return 400, json_body({"error": error}), {}
+        client = idempotency.client_identity(request.headers.get('authorization'), request.remote_addr)
+        scoped_key = (request.method, request.path, client, key)
+        store = idempotency.idempotency_store
+        outcome, stored = await asyncio.to_thread(store.begin, scoped_key, idempotency.fingerprint(request.body))
+        if outcome == idempotency.REPLAY:
+            status, body, _ = stored
+            return status, body, {idempotency.REPLAYED_HEADER: 'true'}
+        if outcome == idempotency.MISMATCH:
+            return 422, json_body({"error": f"{idempotency.HEADER} was already used with a different request"}), {}
+        if outcome == idempotency.IN_PROGRESS:
+            return 409, json_body({"error": f"A request with this {idempotency.HEADER} is still being processed"}), \
+                {'Retry-After': '1'}
+        try:
+            status, body, headers = await self._respond(handler, request)
+        except BaseException:
+            store.finish(scoped_key, None)
+            raise
+        store.finish(scoped_key, None if status >= 500 else (status, body, JSON_CONTENT_TYPE))
+        return status, body, headers
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope['type'] == 'lifespan':
+            while True:
+                message = await receive()
+                if message['type'] == 'lifespan.startup':
+                    await send({'type': 'lifespan.startup.complete'})
+                elif message['type'] == 'lifespan.shutdown':
+                    await send({'type': 'lifespan.shutdown.complete'})
+                    return
+        if scope['type'] != 'http':
+            return
+
+        chunks = []
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                return
+            chunks.append(message.get('body', b''))
+            if not message.get('more_body'):
+                break
+
+        status, body, headers = await self.handle(Request(scope, b''.join(chunks)))
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', JSON_CONTENT_TYPE.encode()),
+                        (b'content-length', str(len(body)).encode())]
+                       + [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        })
+        await send({'type': 'http.response.body', 'body': body})
+
+
+def create_app(config: Optional[Dict] = None, fetch_coverage: Optional[FetchCoverage] = None) -> AsyncServices:
+    """
+    Build the ASGI app over the same repository configuration as wsgi.create_app
+    (DATABASE_PATH and JOURNAL_DIR from the environment or config).
+    """
+    settings = {name: os.environ.get(name) for name in ('DATABASE_PATH', 'JOURNAL_DIR')}
+    settings.update(config or {})
+    from repository import configure_repository
+    configure_repository(settings['DATABASE_PATH'], settings['JOURNAL_DIR'])
+    return AsyncServices(fetch_coverage)
@@ -0,0 +1,154 @@
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, MutableMapping, Optional, Union
+
+from insurance_verification import (
+    InsuranceExpiredError,
+    InsuranceNotFoundError,
+    InsuranceServiceUnavailableError,
+    InsuranceVerificationError,
+    InsuranceVerifier,
+    InvalidInsuranceIdError,
+    logger,
+)
+
+# Errors that are answers from the backend, not failures of it: never retried
+FINAL_ERRORS = (InvalidInsuranceIdError, InsuranceNotFoundError, InsuranceExpiredError)
+
+Lookup = Callable[[str], Awaitable[Optional[Dict]]]
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing backend for a while instead of piling up retries.
+    After failure_threshold consecutive failures the circuit opens and calls are rejected;
+    once reset_timeout has passed a single trial call is let through (half-open), and its
+    outcome closes the circuit again or re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+
+    def allow_request(self) -> bool:
+        if self.state == self.OPEN and self._clock() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self) -> None:
+        self.state = self.CLOSED
+        self.failures = 0
+        self._trial_running = False
+
+    def release_trial(self) -> None:
+        """End a half-open trial that finished without an outcome (e.g. it was cancelled)"""
+        self._trial_running = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        self._trial_running = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning("Insurance backend circuit opened")
+            self.state = self.OPEN
+            self.opened_at = self._clock()
+
+
+class AsyncInsuranceVerifier:
+    """
+    asyncio counterpart of InsuranceVerifier for slow payer backends.
+    Runs up to max_concurrency lookups at a time, enforces a per-call timeout, retries
+    backend failures with exponential backoff and jitter, and sheds load through a
+    circuit breaker while the backend keeps failing. Raises the same exceptions as
+    InsuranceVerifier, plus InsuranceServiceUnavailableError while the circuit is open.
+    """
+
+    def __init__(self, insurance_db: Optional[MutableMapping[str, Dict]] = None, lookup: Optional[Lookup] = None,
+                 max_concurrency: int = 20, max_retries: int = 3, timeout: float = 5.0,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.verifier = InsuranceVerifier(insurance_db)
+        # Async payer lookup: insurance ID -> record or None. Defaults to the local insurance_db.
+        self.lookup = lookup or self._lookup_local
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.circuit_breaker = circuit_breaker or CircuitBreaker()
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _lookup_local(self, insurance_id: str) -> Optional[Dict]:
+        return self.verifier.insurance_db.get(insurance_id)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Delay before retry number attempt (0-based): exponential, capped, with jitter"""
+        ceiling = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    async def verify_insurance(self, insurance_id: str) -> Dict:
+        """Verify one insurance ID. Returns insurance details or raises an InsuranceVerificationError."""
+        self.verifier.check_insurance_id(insurance_id)
+
+        for attempt in range(self.max_retries + 1):
+            if not self.circuit_breaker.allow_request():
+                raise InsuranceServiceUnavailableError(
+                    "Insurance verification is temporarily unavailable. Please try again in a few minutes."
+                )
+            try:
+                async with self._semaphore:
+                    insurance_info = await asyncio.wait_for(self.lookup(insurance_id), self.timeout)
+            except FINAL_ERRORS:
+                # The backend answered
+                self.circuit_breaker.record_success()
+                raise
+            except Exception as e:
+                self.circuit_breaker.record_failure()
+                reason = "timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+                logger.error(f"System error during verification (attempt {attempt + 1}): {reason}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self.backoff_delay(attempt))
+                continue
+            except BaseException:
+                # Cancelled: no outcome, so let the next call be the trial
+                self.circuit_breaker.release_trial()
+                raise
+            self.circuit_breaker.record_success()
+            break
+        else:
+            raise InsuranceVerificationError(
+                "We're experiencing technical difficulties. Please try again later or contact support."
+            )
+
+        # A malformed record is not a backend failure: it is neither retried nor counted by the breaker
+        try:
+            return self.verifier.check_insurance_info(insurance_id, insurance_info)
+        except (KeyError, ValueError) as e:
+            logger.error(f"Invalid insurance record {insurance_id}: {str(e)}")
+            raise InsuranceVerificationError(
+                "Your insurance record could not be read. Please contact support."
+            )
+
+    async def verify_many(self, insurance_ids: Iterable[str]) -> List[Union[Dict, InsuranceVerificationError]]:
+        """Verify many insurance IDs concurrently. Failures are returned in place of results."""
+        async def verify(insurance_id):
+            try:
+                return await self.verify_insurance(insurance_id)
+            except InsuranceVerificationError as e:
+                return e
+
+        return await asyncio.gather(*(verify(insurance_id) for insurance_id in insurance_ids))
@@ -0,0 +1,230 @@
+"""
+A feed of slot availability changes, so scheduling screens can keep their view of a
+doctor's day up to date without polling GET /api/availability.
+
+Every booking, cancellation and reschedule publishes a delta: the times that were
+booked and the times that were released on one doctor's date. A schedule change
+publishes a "schedule" event without a date, after which the doctor's days must be
+fetched again. Events are numbered; a client resumes from the token of the last event it
+saw, either by long-polling or over Server-Sent Events.
+
+With DATABASE_PATH, events are stored in the availability_changes table of the shared
+database, numbered across all workers, so a client sees every change whichever worker
+made it or serves the client. Otherwise recent events are kept per process in a bounded
+ring buffer. A token from another database or process (or from before a restart of an
+in-memory feed), or one older than the events kept, cannot be resumed from: the client
+is told to reset, i.e. fetch availability again and continue from the token returned
+with it.
+"""
+import itertools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from repository import SQLiteDatabase, SQLiteRepository, get_repository
+
+SLOTS = 'slots'
+SCHEDULE = 'schedule'
+
+
+class AvailabilityFeed:
+    """The last max_events availability changes, with blocking reads for new ones"""
+
+    def __init__(self, max_events: int = 10000):
+        self._cond = threading.Condition()
+        self._events: deque = deque(maxlen=max_events)
+        self._seq = 0
+        # Tokens are only valid for this instance of the feed
+        self.epoch = uuid.uuid4().hex[:12]
+
+    @property
+    def last_seq(self) -> int:
+        return self._seq
+
+    def token(self, seq: Optional[int] = None) -> str:
+        """Resume token for the point after event seq (default: the latest event)"""
+        return f"{self.epoch}.{self._seq if seq is None else seq}"
+
+    def parse_token(self, token: str) -> Optional[int]:
+        """The sequence number of a token, or None if it cannot be resumed from"""
+        epoch, _, seq = token.partition('.')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        with self._cond:
+            first = self._seq - len(self._events) + 1
+            if seq > self._seq or seq < first - 1:
+                return None
+        return seq
+
+    def publish(self, doctor_id: str, date: Optional[str], booked: Iterable[str] = (),
+                released: Iterable[str] = (), kind: str = SLOTS) -> int:
+        """Record a change and wake the waiting readers; returns its sequence number"""
+        with self._cond:
+            self._seq += 1
+            self._events.append({
+                "seq": self._seq,
+                "type": kind,
+                "doctor_id": doctor_id,
+                "date": date,
+                "booked": sorted(booked),
+                "released": sorted(released)
+            })
+            self._cond.notify_all()
+            return self._seq
+
+    def publish_schedule(self, doctor_id: str) -> int:
+        return self.publish(doctor_id, None, kind=SCHEDULE)
+
+    def _since(self, seq: int, doctor_id: Optional[str], date: Optional[str]) -> List[Dict]:
+        # Called with the condition held
+        first = self._seq - len(self._events) + 1
+        return [event for event in itertools.islice(self._events, max(seq + 1 - first, 0), None)
+                if (doctor_id is None or event['doctor_id'] == doctor_id)
+                and (date is None or event['date'] in (date, None))]
+
+    def wait(self, seq: int, timeout: float, doctor_id: Optional[str] = None,
+             date: Optional[str] = None) -> Tuple[Optional[List[Dict]], int]:
+        """
+        Events after seq for a doctor and date (None matches any), waiting up to timeout
+        seconds for one if there are none yet. Returns (events, last sequence number
+        examined), or (None, latest) if events after seq have already been dropped.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                first = self._seq - len(self._events) + 1
+                if seq < first - 1:
+                    return None, self._seq
+                events = self._since(seq, doctor_id, date)
+                if events:
+                    return events, self._seq
+                # Nothing relevant up to here: later waits only need to look at newer events
+                seq = self._seq
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return [], seq
+                self._cond.wait(remaining)
+
+
+class SQLiteAvailabilityFeed:
+    """
+    AvailabilityFeed over the availability_changes table of the shared SQLite database.
+    Sequence numbers are the table's row ids, so they are the same in every worker. A
+    wait is woken at once by changes published in this process and polls every
+    poll_interval seconds for those published by other workers.
+    """
+
+    def __init__(self, db: SQLiteDatabase, max_events: int = 10000, poll_interval: float = 0.2):
+        self.db = db
+        self.max_events = max_events
+        self.poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self.epoch = self._load_epoch()
+
+    def _load_epoch(self) -> str:
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT epoch FROM availability_feed_epoch").fetchone()
+            epoch = row[0] if row else uuid.uuid4().hex[:12]
+            if row is None:
+                conn.execute("INSERT INTO availability_feed_epoch (epoch) VALUES (?)", (epoch,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return epoch
+
+    def _bounds(self, conn) -> Tuple[int, int]:
+        # (first kept, latest) sequence numbers; the latest event is never deleted
+        first, last = conn.execute("SELECT MIN(seq), MAX(seq) FROM availability_changes").fetchone()
+        return (first, last) if last is not None else (1, 0)
+
+    @property
+    def last_seq(self) -> int:
+        return self._bounds(self.db.connection())[1]
+
+    def token(self, seq: Optional[int] = None) -> str:
+        """Resume token for the point after event seq (default: the latest event)"""
+        return f"{self.epoch}.{self.last_seq if seq is None else seq}"
+
+    def parse_token(self, token: str) -> Optional[int]:
+        """The sequence number of a token, or None if it cannot be resumed from"""
+        epoch, _, seq = token.partition('.')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        seq = int(seq)
+        first, last = self._bounds(self.db.connection())
+        if seq > last or seq < first - 1:
+            return None
+        return seq
+
+    def publish(self, doctor_id: str, date: Optional[str], booked: Iterable[str] = (),
+                released: Iterable[str] = (), kind: str = SLOTS) -> int:
+        """Record a change and wake the readers waiting in this process; returns its sequence number"""
+        conn = self.db.connection()
+        seq = conn.execute(
+            "INSERT INTO availability_changes (type, doctor_id, date, booked, released) VALUES (?, ?, ?, ?, ?)",
+            (kind, doctor_id, date, json.dumps(sorted(booked)), json.dumps(sorted(released)))).lastrowid
+        if seq > self.max_events:
+            conn.execute("DELETE FROM availability_changes WHERE seq <= ?", (seq - self.max_events,))
+        with self._cond:
+            self._cond.notify_all()
+        return seq
+
+    def publish_schedule(self, doctor_id: str) -> int:
+        return self.publish(doctor_id, None, kind=SCHEDULE)
+
+    def _read(self, seq: int, doctor_id: Optional[str], date: Optional[str]) -> Tuple[Optional[List[Dict]], int]:
+        query = "SELECT seq, type, doctor_id, date, booked, released FROM availability_changes WHERE seq > ?"
+        params: list = [seq]
+        if doctor_id is not None:
+            query += " AND doctor_id = ?"
+            params.append(doctor_id)
+        if date is not None:
+            query += " AND (date = ? OR date IS NULL)"
+            params.append(date)
+        conn = self.db.connection()
+        # One read transaction, so the events and the latest sequence number agree
+        conn.execute("BEGIN")
+        try:
+            first, last = self._bounds(conn)
+            rows = conn.execute(query + " ORDER BY seq", params).fetchall() if seq >= first - 1 else None
+        finally:
+            conn.execute("COMMIT")
+        if rows is None:
+            return None, last
+        return [{"seq": row[0], "type": row[1], "doctor_id": row[2], "date": row[3],
+                 "booked": json.loads(row[4]), "released": json.loads(row[5])} for row in rows], last
+
+    def wait(self, seq: int, timeout: float, doctor_id: Optional[str] = None,
+             date: Optional[str] = None) -> Tuple[Optional[List[Dict]], int]:
+        """See AvailabilityFeed.wait"""
+        deadline = time.monotonic() + timeout
+        while True:
+            events, last = self._read(seq, doctor_id, date)
+            if events is None or events:
+                return events, last
+            # Nothing relevant up to here: later reads only need to look at newer events
+            seq = last
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return [], seq
+            with self._cond:
+                self._cond.wait(min(self.poll_interval, remaining))
+
+
+def create_feed(repository):
+    """A feed next to the repository's data: shared with SQLite, per process otherwise"""
+    max_events = int(os.environ.get('AVAILABILITY_FEED_EVENTS', 10000))
+    if isinstance(repository, SQLiteRepository):
+        return SQLiteAvailabilityFeed(repository.db, max_events)
+    return AvailabilityFeed(max_events)
+
+
+availability_feed = create_feed(get_repository())
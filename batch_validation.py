@@ -0,0 +1,253 @@
+"""
+Columnar validation for large batches of registrations or eligibility requests.
+
+A chunk of records is loaded into one array per schema field, and each Field is
+checked for the whole column at once: dates, times and insurance IDs are checked with
+array arithmetic over their characters, and emails and phone numbers with one regex
+pass over the joined column. The result gives a per-row bitmask of failing fields
+(bit i = schema field i) and reproduces the messages Schema.validate would return.
+
+NumPy is optional; without it the same columns are checked with the scalar validators.
+"""
+import operator
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+
+from validation import (
+    Field,
+    Schema,
+    is_valid_date,
+    is_valid_email,
+    is_valid_insurance_id,
+    is_valid_phone,
+    is_valid_time,
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised only where numpy is missing
+    np = None
+
+# Multiline forms of the email and phone patterns, for matching a whole column joined by
+# newlines: no part of them can match a newline, so every match is exactly one row.
+# The phone form also enforces the 10 to 15 digits that is_valid_phone counts.
+_PHONE_SEPARATOR = r'(?:[^\S\n]|[\-().])'
+COLUMN_EMAIL_PATTERN = re.compile(r'^[^\s@]+@[^\s@]+\.[^\s@]+$', re.MULTILINE)
+COLUMN_PHONE_PATTERN = re.compile(rf'^\+?{_PHONE_SEPARATOR}*(?:\d{_PHONE_SEPARATOR}*){{10,15}}$', re.MULTILINE)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def _characters(text, length):
+    """(rows, length) array of code points, and the mask of rows that have exactly length characters"""
+    rows = np.char.str_len(text) == length
+    codes = np.zeros((len(text), length), dtype=np.uint32)
+    if rows.any():
+        codes[rows] = text[rows].astype(f'<U{length}').view(np.uint32).reshape(-1, length)
+    return codes, rows
+
+
+def _digits(codes, columns):
+    """Values of the ASCII digits in the given character columns, and whether they all are digits"""
+    digits = codes[:, columns].astype(np.int64) - 48
+    return digits, ((digits >= 0) & (digits <= 9)).all(axis=1)
+
+
+def _number(digits):
+    value = np.zeros(len(digits), dtype=np.int64)
+    for column in range(digits.shape[1]):
+        value = value * 10 + digits[:, column]
+    return value
+
+
+def dates_ok(text):
+    """Vector form of is_valid_date for an array of strings"""
+    codes, ok = _characters(text, 10)
+    digits, all_digits = _digits(codes, [0, 1, 2, 3, 5, 6, 8, 9])
+    ok &= all_digits & (codes[:, 4] == ord('-')) & (codes[:, 7] == ord('-'))
+    year, month, day = _number(digits[:, :4]), _number(digits[:, 4:6]), _number(digits[:, 6:])
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0)) & (month == 2)
+    days_in_month = np.asarray(_DAYS_IN_MONTH)[np.clip(month, 1, 12) - 1] + leap
+    return ok & (year >= 1) & (month >= 1) & (month <= 12) & (day >= 1) & (day <= days_in_month)
+
+
+def times_ok(text):
+    """Vector form of is_valid_time for an array of strings"""
+    codes, ok = _characters(text, 5)
+    digits, all_digits = _digits(codes, [0, 1, 3, 4])
+    hours, minutes = _number(digits[:, :2]), _number(digits[:, 2:])
+    return ok & all_digits & (codes[:, 2] == ord(':')) & (hours <= 23) & (minutes <= 59)
+
+
+def insurance_ids_ok(text):
+    """Vector form of is_valid_insurance_id for an array of strings"""
+    codes, ok = _characters(text, 12)
+    letters = codes[:, :3]
+    _, all_digits = _digits(codes, list(range(3, 12)))
+    return ok & ((letters >= ord('A')) & (letters <= ord('Z'))).all(axis=1) & all_digits
+
+
+def _pattern_kernel(pattern: re.Pattern, check: Callable) -> Callable:
+    """Vector form of a regex validator: one pass of pattern over the newline-joined column"""
+    def kernel(text):
+        values = text.tolist()
+        # Values containing newlines cannot be joined; they are checked one at a time
+        multiline = [index for index, value in enumerate(values) if '\n' in value]
+        for index in multiline:
+            values[index] = ''
+        # Matching rows are replaced by nothing; blank rows come out empty too but are never checked
+        remaining = pattern.sub('', '\n'.join(values)).split('\n')
+        ok = np.fromiter(map(operator.not_, remaining), dtype=bool, count=len(values))
+        for index in multiline:
+            ok[index] = check(str(text[index]))
+        return ok
+    return kernel
+
+
+# Column kernels for the validators the schemas use; other checks are applied per value
+COLUMN_CHECKS = {
+    is_valid_date: dates_ok,
+    is_valid_time: times_ok,
+    is_valid_insurance_id: insurance_ids_ok,
+    is_valid_email: _pattern_kernel(COLUMN_EMAIL_PATTERN, is_valid_email),
+    is_valid_phone: _pattern_kernel(COLUMN_PHONE_PATTERN, is_valid_phone),
+}
+
+
+class BatchResult:
+    """
+    Validation result for a batch of rows.
+    missing, too_long and invalid hold one bitmask per row, with bit i set when schema
+    field i is missing, too long, or fails its format check; mask is their union.
+    """
+
+    def __init__(self, schema: Schema, missing, too_long, invalid):
+        self.schema = schema
+        self.missing = missing
+        self.too_long = too_long
+        self.invalid = invalid
+        if np is not None:
+            self.mask = missing | too_long | invalid
+        else:
+            self.mask = [a | b | c for a, b, c in zip(missing, too_long, invalid)]
+
+    def __len__(self) -> int:
+        return len(self.mask)
+
+    @property
+    def valid(self) -> List[bool]:
+        """Whether each row passed validation"""
+        if np is not None:
+            return (self.mask == 0).tolist()
+        return [bits == 0 for bits in self.mask]
+
+    def failed_fields(self, row: int) -> List[str]:
+        bits = int(self.mask[row])
+        return [field.name for bit, field in enumerate(self.schema.fields) if bits >> bit & 1]
+
+    def errors(self, row: int, collect_all: bool = False) -> List[str]:
+        """The error messages Schema.validate returns for the row"""
+        fields = self.schema.fields
+        missing, too_long, invalid = int(self.missing[row]), int(self.too_long[row]), int(self.invalid[row])
+        errors = [field._format(field.required_message) for bit, field in enumerate(fields) if missing >> bit & 1]
+        if errors and not collect_all:
+            return errors
+        for bit, field in enumerate(fields):
+            if too_long >> bit & 1:
+                errors.append(field._format(field.too_long_message))
+            elif invalid >> bit & 1:
+                errors.append(field._format(field.invalid_message))
+            else:
+                continue
+            if not collect_all:
+                break
+        return errors
+
+
+def to_columns(records: Sequence[Dict], names: Iterable[str]) -> Dict[str, list]:
+    """One list of values per field name (None where a record lacks the field)"""
+    return {name: [record.get(name) for record in records] for name in names}
+
+
+def _field_flags(field: Field, values: list):
+    """(missing, too_long, invalid) flags of one field for every row, as boolean arrays"""
+    # Kind of each value: 0 absent, 1 string, 2 anything else. Other values (numbers, lists,
+    # strings with NUL characters, which numpy strings cannot hold) are checked one at a time.
+    kinds = np.array([0 if value is None else 1 if type(value) is str and '\x00' not in value else 2
+                      for value in values], dtype=np.int8)
+    is_str = kinds == 1
+    others = np.flatnonzero(kinds == 2).tolist()
+    text = np.array([value if type(value) is str else '' for value in values], dtype=str)
+    text[others] = ''
+    blank = np.char.str_len(np.char.strip(text)) == 0
+
+    missing = np.zeros(len(values), dtype=bool)
+    if field.required:
+        missing = ~is_str if field.allow_blank else (~is_str | blank)
+    checked = is_str & ~blank
+    too_long = np.zeros(len(values), dtype=bool)
+    if field.max_length is not None:
+        too_long = checked & (np.char.str_len(text) > field.max_length)
+    invalid = np.zeros(len(values), dtype=bool)
+    if field.check is not None:
+        kernel = COLUMN_CHECKS.get(field.check)
+        if kernel is not None:
+            ok = kernel(text)
+        else:
+            ok = np.fromiter(map(field.check, text.tolist()), dtype=bool, count=len(values))
+        invalid = checked & ~too_long & ~ok
+
+    for index, flags in zip(others, zip(*_field_flags_scalar(field, [values[index] for index in others]))):
+        missing[index], too_long[index], invalid[index] = flags
+    return missing, too_long, invalid
+
+
+def _field_flags_scalar(field: Field, values: list):
+    """_field_flags without numpy: the same flags computed with the scalar validators"""
+    missing = [field.required and field.is_missing({field.name: value}) for value in values]
+    too_long = []
+    invalid = []
+    for value in values:
+        error = field.error(value)
+        long_value = (error is not None and field.max_length is not None and isinstance(value, str)
+                      and len(value) > field.max_length)
+        too_long.append(long_value)
+        invalid.append(error is not None and not long_value)
+    return missing, too_long, invalid
+
+
+def validate_columns(schema: Schema, columns: Dict[str, list]) -> BatchResult:
+    """Validate a batch given as columns (see to_columns). Every column must have one value per row."""
+    rows = len(next(iter(columns.values()))) if columns else 0
+    if np is not None:
+        missing = np.zeros(rows, dtype=np.uint64)
+        too_long = np.zeros(rows, dtype=np.uint64)
+        invalid = np.zeros(rows, dtype=np.uint64)
+    else:
+        missing, too_long, invalid = [0] * rows, [0] * rows, [0] * rows
+
+    for bit, field in enumerate(schema.fields):
+        values = columns.get(field.name, [None] * rows)
+        if np is not None:
+            flags = _field_flags(field, values)
+            weight = np.uint64(1 << bit)
+            for mask, flag in zip((missing, too_long, invalid), flags):
+                mask |= flag.astype(np.uint64) * weight
+        else:
+            flags = _field_flags_scalar(field, values)
+            for mask, flag in zip((missing, too_long, invalid), flags):
+                for row, value in enumerate(flag):
+                    if value:
+                        mask[row] |= 1 << bit
+    return BatchResult(schema, missing, too_long, invalid)
+
+
+def validate_batch(schema: Schema, records: Sequence[Dict]) -> BatchResult:
+    """Validate a chunk of records column-wise; equivalent to schema.validate on each record"""
+    return validate_columns(schema, to_columns(records, (field.name for field in schema.fields)))
+
+
+def first_errors(schema: Schema, records: Sequence[Dict]) -> List[Optional[str]]:
+    """The first validation error of each record, or None for valid records"""
+    result = validate_batch(schema, records)
+    return [None if ok else result.errors(row)[0] for row, ok in enumerate(result.valid)]
@@ -0,0 +1,157 @@
+"""
+Sustained request rate of the Flask app (wsgi.create_app) and the ASGI app (asgi.py) when
+every eligibility lookup waits on a slow policy source, as a payer's API would be.
+
+The policy source is the seeded insurance table behind an added delay (--latency,
+default 0.2 s): a time.sleep for the Flask app and an asyncio.sleep for the ASGI app.
+The eligibility cache is cleared before each run, and policies are drawn from a large
+pool, so almost every lookup misses the cache. Both apps are driven in-process with the
+same workload as benchmark_endpoints.py, restricted to the routes asgi.py serves:
+  flask   --threads client threads through the Flask test client, i.e. one gunicorn
+          worker with that many threads (gunicorn.conf.py: GUNICORN_THREADS, default 8)
+  asgi    --concurrency requests in flight on one event loop
+and prints per-endpoint latency and throughput as JSON.
+
+Usage: python benchmark_async.py [--requests N] [--threads N] [--concurrency N] [--latency S]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import urlencode
+
+import benchmark_endpoints as bench
+import wsgi
+
+DEFAULT_MIX = {
+    "GET /api/insurance/eligibility": 50,
+    "POST /api/appointments": 30,
+    "GET /api/availability": 20
+}
+
+
+def asgi_sender(app) -> Callable[[bench.Request], "asyncio.Future"]:
+    """Send a benchmark request to an ASGI app in-process; the coroutine returns the status"""
+    async def send(request: bench.Request) -> int:
+        method, path, data = request
+        query, body, headers = b'', b'', []
+        if method == 'GET':
+            query = urlencode(data).encode()
+        else:
+            body = json.dumps(data).encode()
+            headers = [(b'content-type', b'application/json')]
+        scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': headers}
+        received = False
+        status = []
+
+        async def receive():
+            nonlocal received
+            if received:
+                return {'type': 'http.disconnect'}
+            received = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        async def respond(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await app(scope, receive, respond)
+        return status[0]
+    return send
+
+
+async def run_async_load(app, mix: Dict[str, int], total_requests: int, concurrency: int,
+                         doctors: int, policies: int, seed_value: int) -> Dict:
+    """Send total_requests with up to concurrency in flight and summarize the results"""
+    send = asgi_sender(app)
+    results: Dict[str, Tuple[List[float], List[int]]] = {name: ([], [0]) for name in mix}
+
+    async def worker(index: int, count: int):
+        workload = bench.Workload(mix, doctors, policies, index, seed_value)
+        for _ in range(count):
+            name, request = workload.next()
+            sent = time.perf_counter()
+            try:
+                failed = await send(request) >= 500
+            except Exception:
+                failed = True
+            results[name][0].append(time.perf_counter() - sent)
+            results[name][1][0] += failed
+
+    per_task, extra = divmod(total_requests, concurrency)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n, per_task + (n < extra)) for n in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    report = {name: bench.summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in results.items()}
+    report["overall"] = bench.summarize([latency for latencies, _ in results.values() for latency in latencies],
+                                        sum(errors[0] for _, errors in results.values()), elapsed)
+    return report
+
+
+def run(args) -> Dict:
+    flask_app = wsgi.create_app()
+    bench.seed(0, args.doctors, args.policies, args.appointments, random.Random(args.seed))
+    import insurance_verification_api as insurance
+    from asgi import AsyncServices
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+    local = insurance.fetch_coverage
+
+    def slow_fetch(insurance_id):
+        time.sleep(args.latency)
+        return local(insurance_id)
+
+    async def slow_fetch_async(insurance_id):
+        await asyncio.sleep(args.latency)
+        return local(insurance_id)
+
+    results = {}
+    insurance.fetch_coverage = slow_fetch
+    try:
+        insurance.eligibility_cache.clear()
+        results["flask"] = bench.run_load(bench.in_process_sender(flask_app), mix, args.requests, args.threads, 0,
+                                          args.doctors, args.policies, args.seed)
+    finally:
+        insurance.fetch_coverage = local
+
+    insurance.eligibility_cache.clear()
+    results["asgi"] = asyncio.run(run_async_load(AsyncServices(slow_fetch_async), mix, args.requests,
+                                                 args.concurrency, args.doctors, args.policies, args.seed + 1))
+    flask_rps = results["flask"]["overall"]["throughput_rps"]
+    results["speedup"] = results["asgi"]["overall"]["throughput_rps"] / flask_rps if flask_rps else 0.0
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare the Flask and ASGI apps under a slow policy source")
+    parser.add_argument('--requests', type=int, default=400, help="Requests per app")
+    parser.add_argument('--threads', type=int, default=8, help="Client threads for the Flask app")
+    parser.add_argument('--concurrency', type=int, default=200, help="Requests in flight for the ASGI app")
+    parser.add_argument('--latency', type=float, default=0.2, help="Seconds added to every policy lookup")
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--policies', type=int, default=100000)
+    parser.add_argument('--appointments', type=int, default=2000)
+    parser.add_argument('--mix', help="JSON object of endpoint weights (default: %s)" % json.dumps(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=310)
+    parser.add_argument('--output', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {"config": {key: value for key, value in vars(args).items() if key != 'output'}}
+    results["results"] = run(args)
+    failures = [f"{app}: {stats['overall']['errors']} requests failed"
+                for app, stats in results["results"].items() if isinstance(stats, dict) and stats['overall']['errors']]
+    results["failures"] = failures
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
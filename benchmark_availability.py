@@ -0,0 +1,55 @@
+"""
+Benchmark GET /api/availability latency as the number of stored appointments grows.
+
+Usage: python benchmark_availability.py [sizes...]
+Default sizes: 1000 10000 100000 1000000
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+import appointment_scheduling_api as api
+
+QUERIES = 2000
+
+
+def seed(store, start, count):
+    """Fill the store with synthetic appointments spread over filler doctors and days"""
+    slots = api.default_time_slots
+    first_day = date(2030, 1, 1)
+    for n in range(start, start + count):
+        day, slot = divmod(n, len(slots))
+        doctor, day = divmod(day, 365)
+        store.add({
+            "appointment_id": f"BENCH-{n}",
+            "patient_id": "P123",
+            "doctor_id": f"BENCH{doctor:05d}",
+            "date": (first_day + timedelta(days=day)).isoformat(),
+            "time": slots[slot],
+            "status": "confirmed"
+        })
+
+
+def measure(client):
+    url = "/api/availability?doctor_id=D001&date=2030-06-01"
+    client.get(url)
+    started = time.perf_counter()
+    for _ in range(QUERIES):
+        client.get(url)
+    return (time.perf_counter() - started) / QUERIES * 1e6
+
+
+def main(sizes):
+    api.appointments_db.clear()
+    client = api.app.test_client()
+    stored = 0
+    print(f"{'appointments':>12}  {'us/request':>10}")
+    for size in sizes:
+        seed(api.appointments_db, stored, size - stored)
+        stored = size
+        print(f"{len(api.appointments_db):>12}  {measure(client):>10.1f}")
+    api.appointments_db.clear()
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000, 1000000])
@@ -0,0 +1,326 @@
+"""
+Load test for the HTTP endpoints of the combined app (wsgi.create_app).
+
+Seeds synthetic patients, doctors, policies and appointments, then drives a weighted
+mix of availability lookups, bookings, eligibility checks and registrations, either
+in-process through the Flask test client or over loopback HTTP, and prints per-endpoint
+p50/p95/p99 latency and throughput as JSON.
+
+The run fails (exit status 1) when a threshold is crossed:
+  --thresholds FILE   absolute limits, e.g. {"GET /api/availability": {"p95_ms": 5, "min_rps": 500},
+                      "overall": {"max_error_rate": 0}}; keys are p50_ms, p95_ms, p99_ms,
+                      min_rps and max_error_rate
+  --baseline FILE     results of an earlier run; p95/p99 may grow and throughput may drop
+                      by at most --tolerance (default 0.2 = 20%)
+
+Usage: python benchmark_endpoints.py [--mode inprocess|loopback|both] [--requests N]
+       [--concurrency N] [--rate RPS] [--output results.json] ...
+With --rate the load is open-loop: requests are sent on a fixed schedule and latency is
+measured from the scheduled send time, so queueing delay is included.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+from werkzeug.serving import make_server
+
+import appointment_scheduling_api as scheduling_api
+import wsgi
+from repository import get_repository
+
+# Relative weight of each endpoint in the mixed workload
+DEFAULT_MIX = {
+    "GET /api/availability": 50,
+    "GET /api/insurance/eligibility": 25,
+    "POST /api/appointments": 15,
+    "POST /register": 10
+}
+
+FIRST_DAY = date(2031, 1, 5)
+DAYS = 60
+
+# (method, path, query or JSON body)
+Request = Tuple[str, str, Dict]
+
+
+def seed(patients: int, doctors: int, policies: int, appointments: int, rng: random.Random) -> None:
+    """Add synthetic data to the shared repository and the scheduling doctor list"""
+    repository = get_repository()
+    for n in range(doctors):
+        doctor = {"doctor_id": f"BD{n:05d}", "name": f"Dr. Bench {n}", "specialty": "General Practice"}
+        scheduling_api.doctors_db.add(doctor)
+    for n in range(policies):
+        repository.insurance[f"BIN{n:09d}"] = {
+            "patient_id": f"BP{n}", "first_name": "Bench", "last_name": f"Patient{n}",
+            "date_of_birth": "1980-01-01", "eligibility_status": "active",
+            "coverage_details": {"plan_type": "PPO", "copay": 20.0, "deductible": 1000.0, "coverage_percentage": 80}
+        }
+    batch = []
+    for n in range(patients):
+        batch.append({"first_name": "Bench", "last_name": f"Patient{n}", "id_number": f"BID{n}",
+                      "insurance_number": f"BIN{n:09d}", "contact_info": f"patient{n}@bench.example"})
+        if len(batch) == 1000 or n == patients - 1:
+            repository.patients.add_many(batch)
+            batch = []
+    slots = scheduling_api.default_time_slots
+    for n in range(appointments):
+        repository.appointments.add({
+            "appointment_id": f"BENCH-{n}",
+            "patient_id": f"BP{rng.randrange(max(policies, 1))}",
+            "doctor_id": f"BD{rng.randrange(doctors):05d}",
+            "date": (FIRST_DAY + timedelta(days=rng.randrange(DAYS))).isoformat(),
+            "time": rng.choice(slots),
+            "status": "confirmed"
+        })
+
+
+class Workload:
+    """Produces the next request of the mix; one instance per client thread"""
+
+    def __init__(self, mix: Dict[str, int], doctors: int, policies: int, worker: int, seed_value: int):
+        self.rng = random.Random(seed_value * 1000 + worker)
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.doctors = doctors
+        self.policies = policies
+        self.worker = worker
+        self.registrations = 0
+
+    def _doctor(self) -> str:
+        return f"BD{self.rng.randrange(self.doctors):05d}"
+
+    def _day(self) -> str:
+        return (FIRST_DAY + timedelta(days=self.rng.randrange(DAYS))).isoformat()
+
+    def next(self) -> Tuple[str, Request]:
+        name = self.rng.choices(self.endpoints, self.weights)[0]
+        policy = self.rng.randrange(self.policies)
+        if name == "GET /api/availability":
+            request = ('GET', '/api/availability', {"doctor_id": self._doctor(), "date": self._day()})
+        elif name == "GET /api/insurance/eligibility":
+            request = ('GET', '/api/insurance/eligibility', {"patient_id": f"BP{policy}",
+                                                             "insurance_id": f"BIN{policy:09d}"})
+        elif name == "POST /api/appointments":
+            request = ('POST', '/api/appointments', {
+                "patient_id": f"BP{policy}", "insurance_id": f"BIN{policy:09d}", "doctor_id": self._doctor(),
+                "date": self._day(), "time": self.rng.choice(scheduling_api.default_time_slots)
+            })
+        elif name == "POST /register":
+            self.registrations += 1
+            key = f"{self.worker}-{self.registrations}-{self.rng.randrange(10 ** 9)}"
+            request = ('POST', '/register', {"first_name": "Load", "last_name": f"Test{key}",
+                                             "id_number": f"LID{key}", "insurance_number": f"LIN{key}",
+                                             "contact_info": f"load{key}@bench.example"})
+        else:
+            raise ValueError(f"Unknown endpoint in mix: {name}")
+        return name, request
+
+
+def in_process_sender(app) -> Callable[[], Callable[[Request], int]]:
+    def new_sender():
+        client = app.test_client()
+
+        def send(request: Request) -> int:
+            method, path, data = request
+            if method == 'GET':
+                return client.get(path, query_string=data).status_code
+            return client.post(path, json=data).status_code
+        return send
+    return new_sender
+
+
+def loopback_sender(base_url: str) -> Callable[[], Callable[[Request], int]]:
+    def new_sender():
+        session = requests.Session()
+
+        def send(request: Request) -> int:
+            method, path, data = request
+            if method == 'GET':
+                return session.get(base_url + path, params=data).status_code
+            return session.post(base_url + path, json=data).status_code
+        return send
+    return new_sender
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, int(fraction * len(sorted_values) + 0.5) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    count = len(latencies)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0
+    }
+
+
+def run_load(new_sender, mix: Dict[str, int], total_requests: int, concurrency: int, rate: float,
+             doctors: int, policies: int, seed_value: int) -> Dict:
+    """Send total_requests spread over concurrency client threads and summarize the results"""
+    results: Dict[str, Tuple[List[float], List[int]]] = {name: ([], [0]) for name in mix}
+    lock = threading.Lock()
+    # Open-loop pacing: each thread sends every concurrency / rate seconds
+    interval = concurrency / rate if rate else 0.0
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index: int, count: int):
+        send = new_sender()
+        workload = Workload(mix, doctors, policies, index, seed_value)
+        samples = []
+        barrier.wait()
+        started = time.perf_counter() + index * interval / concurrency
+        for n in range(count):
+            name, request = workload.next()
+            scheduled = started + n * interval
+            if interval:
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            sent = scheduled if interval else time.perf_counter()
+            try:
+                failed = send(request) >= 500
+            except Exception:
+                failed = True
+            samples.append((name, time.perf_counter() - sent, failed))
+        with lock:
+            for name, latency, failed in samples:
+                results[name][0].append(latency)
+                results[name][1][0] += failed
+
+    per_thread, extra = divmod(total_requests, concurrency)
+    threads = [threading.Thread(target=worker, args=(n, per_thread + (n < extra))) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    report = {name: summarize(latencies, errors[0], elapsed) for name, (latencies, errors) in results.items()}
+    report["overall"] = summarize([latency for latencies, _ in results.values() for latency in latencies],
+                                  sum(errors[0] for _, errors in results.values()), elapsed)
+    return report
+
+
+def check_thresholds(results: Dict, thresholds: Dict) -> List[str]:
+    """Violations of absolute thresholds, for every mode in results"""
+    failures = []
+    for mode, endpoints in results.items():
+        for name, limits in thresholds.items():
+            stats = endpoints.get(name)
+            if stats is None:
+                continue
+            for key, limit in limits.items():
+                if key == 'min_rps':
+                    if stats['throughput_rps'] < limit:
+                        failures.append(f"{mode} {name}: throughput {stats['throughput_rps']:.1f} rps < {limit}")
+                elif key == 'max_error_rate':
+                    if stats['error_rate'] > limit:
+                        failures.append(f"{mode} {name}: error rate {stats['error_rate']:.4f} > {limit}")
+                elif stats[key] > limit:
+                    failures.append(f"{mode} {name}: {key} {stats[key]:.3f} > {limit}")
+    return failures
+
+
+def check_baseline(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions against an earlier run: slower p95/p99 or lower throughput beyond tolerance"""
+    failures = []
+    for mode, endpoints in results.items():
+        for name, stats in endpoints.items():
+            previous = baseline.get(mode, {}).get(name)
+            if previous is None:
+                continue
+            for key in ('p95_ms', 'p99_ms'):
+                if previous[key] and stats[key] > previous[key] * (1 + tolerance):
+                    failures.append(f"{mode} {name}: {key} {stats[key]:.3f} vs baseline {previous[key]:.3f}")
+            if stats['throughput_rps'] < previous['throughput_rps'] * (1 - tolerance):
+                failures.append(f"{mode} {name}: throughput {stats['throughput_rps']:.1f} rps "
+                                f"vs baseline {previous['throughput_rps']:.1f}")
+    return failures
+
+
+def run(args) -> Dict:
+    app = wsgi.create_app()
+    rng = random.Random(args.seed)
+    seed(args.patients, args.doctors, args.policies, args.appointments, rng)
+    mix = json.loads(args.mix) if args.mix else DEFAULT_MIX
+
+    results = {}
+    modes = ['inprocess', 'loopback'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        server: Optional[object] = None
+        if mode == 'inprocess':
+            new_sender = in_process_sender(app)
+        else:
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            new_sender = loopback_sender(f"http://127.0.0.1:{server.server_port}")
+        try:
+            run_load(new_sender, mix, min(args.requests, 200), args.concurrency, 0,
+                     args.doctors, args.policies, args.seed + 1)  # warm-up
+            results[mode] = run_load(new_sender, mix, args.requests, args.concurrency, args.rate,
+                                     args.doctors, args.policies, args.seed)
+        finally:
+            if server is not None:
+                server.shutdown()
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load test the HTTP endpoints")
+    parser.add_argument('--mode', choices=['inprocess', 'loopback', 'both'], default='both')
+    parser.add_argument('--requests', type=int, default=5000, help="Requests per mode")
+    parser.add_argument('--concurrency', type=int, default=8, help="Client threads")
+    parser.add_argument('--rate', type=float, default=0, help="Target requests per second (0: as fast as possible)")
+    parser.add_argument('--patients', type=int, default=10000)
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--policies', type=int, default=10000)
+    parser.add_argument('--appointments', type=int, default=20000)
+    parser.add_argument('--mix', help="JSON object of endpoint weights (default: %s)" % json.dumps(DEFAULT_MIX))
+    parser.add_argument('--seed', type=int, default=310)
+    parser.add_argument('--output', help="Also write the results to this file")
+    parser.add_argument('--thresholds', help="JSON file of absolute limits per endpoint")
+    parser.add_argument('--baseline', help="Results file of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = {"config": {key: value for key, value in vars(args).items()
+                          if key not in ('output', 'thresholds', 'baseline')}}
+    results["results"] = run(args)
+
+    failures = []
+    if args.thresholds:
+        with open(args.thresholds) as f:
+            failures += check_thresholds(results["results"], json.load(f))
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures += check_baseline(results["results"], json.load(f)["results"], args.tolerance)
+    results["failures"] = failures
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Cold start of the journaled in-memory stores (JOURNAL_DIR): how long JournaledRepository
+takes to load a snapshot of --patients patients and --appointments appointments and
+replay --tail journal entries written after it.
+
+The snapshot is written directly from filled in-memory tables, the tail through the
+journal, then the directory is opened again and timed. Prints the snapshot read time
+(decoding only), the total cold start and whether it is under --target seconds, as JSON.
+
+Usage: python benchmark_recovery.py [--patients N] [--appointments N] [--tail N] [--target S]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Dict
+
+from journal import SNAPSHOT_FILE, read_snapshot, write_snapshot
+from repository import InMemoryRepository, JournaledRepository
+
+SLOTS = [f"{hour:02d}:{minute:02d}" for hour in range(9, 17) for minute in (0, 30)]
+
+
+def appointment(n: int) -> Dict:
+    day, slot = divmod(n, len(SLOTS))
+    doctor, day = divmod(day, 365)
+    return {
+        "appointment_id": f"BENCH-{n}",
+        "patient_id": str(n % 1000 + 1),
+        "doctor_id": f"BENCH{doctor:05d}",
+        "date": (date(2030, 1, 1) + timedelta(days=day)).isoformat(),
+        "time": SLOTS[slot],
+        "status": "confirmed"
+    }
+
+
+def write_journal_dir(directory: str, patients: int, appointments: int, tail: int) -> None:
+    """A snapshot of the given sizes, then tail journaled bookings after it"""
+    repo = InMemoryRepository()
+    for n in range(patients):
+        repo.patients.add({"first_name": f"First{n}", "last_name": f"Last{n}", "date_of_birth": "1980-01-01",
+                           "email": f"patient{n}@example.com", "id_number": f"ID{n:09d}",
+                           "insurance_number": f"INS{n:09d}"})
+    for n in range(appointments):
+        repo.appointments.add(appointment(n))
+    write_snapshot(os.path.join(directory, SNAPSHOT_FILE), 0,
+                   {name: getattr(repo, name).dump() for name in JournaledRepository.TABLES})
+    del repo
+    gc.collect()
+
+    journaled = JournaledRepository(directory, snapshot_every=tail + 1, sync=False)
+    for n in range(appointments, appointments + tail):
+        journaled.appointments.add(appointment(n))
+    journaled.close()
+
+
+def run(args) -> Dict:
+    with tempfile.TemporaryDirectory() as directory:
+        write_journal_dir(directory, args.patients, args.appointments, args.tail)
+        gc.collect()
+
+        started = time.perf_counter()
+        read_snapshot(os.path.join(directory, SNAPSHOT_FILE))
+        snapshot_read = time.perf_counter() - started
+        gc.collect()
+
+        started = time.perf_counter()
+        repo = JournaledRepository(directory, sync=False)
+        cold_start = time.perf_counter() - started
+        counts = {"patients": len(repo.patients), "appointments": len(repo.appointments)}
+        repo.close()
+
+    return {
+        "records": counts,
+        "snapshot_read_seconds": round(snapshot_read, 3),
+        "cold_start_seconds": round(cold_start, 3),
+        "meets_target": cold_start < args.target
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time the cold start of the journaled in-memory stores")
+    parser.add_argument('--patients', type=int, default=1_000_000)
+    parser.add_argument('--appointments', type=int, default=1_000_000)
+    parser.add_argument('--tail', type=int, default=10_000, help="Journal entries written after the snapshot")
+    parser.add_argument('--target', type=float, default=1.0, help="Cold start target in seconds")
+    parser.add_argument('--output', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    results = {"config": {key: value for key, value in vars(args).items() if key != 'output'},
+               "results": run(args)}
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Benchmark columnar batch validation against per-record Schema.validate.
+
+Usage: python benchmark_validation.py [rows] [chunk size]
+Default: 200000 rows validated in chunks of 10000.
+"""
+import random
+import sys
+import time
+
+from batch_validation import first_errors
+from validation import ELIGIBILITY_REQUEST_SCHEMA, PATIENT_SCHEMA
+
+
+def patient(n, rng):
+    """Synthetic PatientRegistration input; roughly one in ten rows has a bad field"""
+    record = {
+        "first_name": "John",
+        "last_name": f"Doe{n}",
+        "email": f"patient{n}@example.com",
+        "dob": f"{rng.randint(1930, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "phone": f"+1-555-{n % 1000:03d}-{n % 10000:04d}"
+    }
+    broken = rng.random()
+    if broken < 0.03:
+        record["dob"] = "1990-02-30"
+    elif broken < 0.06:
+        record["email"] = "not-an-email"
+    elif broken < 0.1:
+        del record["last_name"]
+    return record
+
+
+def eligibility_request(n, rng):
+    """Synthetic eligibility batch item; roughly one in ten rows has a bad field"""
+    record = {
+        "patient_id": f"P{n}",
+        "insurance_id": f"INS{n:09d}",
+        "first_name": "Jane",
+        "last_name": "Smith",
+        "date_of_birth": f"{rng.randint(1930, 2020)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        "service_date": "2025-06-01"
+    }
+    if rng.random() < 0.1:
+        record["service_date"] = "06/01/2025"
+    return record
+
+
+def per_record(schema, records):
+    return [(schema.validate(record) or [None])[0] for record in records]
+
+
+def columnar(schema, records, chunk_size):
+    errors = []
+    for start in range(0, len(records), chunk_size):
+        errors.extend(first_errors(schema, records[start:start + chunk_size]))
+    return errors
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - started
+
+
+def main(rows, chunk_size):
+    rng = random.Random(310)
+    print(f"{'batch':>12}  {'rows':>8}  {'per-record s':>12}  {'columnar s':>10}  {'speedup':>7}")
+    for name, schema, make in (("registration", PATIENT_SCHEMA, patient),
+                               ("eligibility", ELIGIBILITY_REQUEST_SCHEMA, eligibility_request)):
+        records = [make(n, rng) for n in range(rows)]
+        expected, scalar_time = timed(per_record, schema, records)
+        result, column_time = timed(columnar, schema, records, chunk_size)
+        if result != expected:
+            raise SystemExit(f"{name}: columnar errors differ from per-record errors")
+        print(f"{name:>12}  {rows:>8}  {scalar_time:>12.3f}  {column_time:>10.3f}  {scalar_time / column_time:>6.1f}x")
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    main(*(args + [200000, 10000][len(args):]))
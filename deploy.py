@@ -1,37 +1,208 @@
+import argparse
+import hashlib
+import json
 import os
-import paramiko
-import boto3
+import posixpath
+import queue
+import shlex
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def deploy():
-    # Server details from environment variables
-    server_host = os.environ.get('SERVER_HOST')
-    ssh_key_path = 'ssh_key'
-    app_path = '/home/ubuntu/app'
+APP_PATH = '/home/ubuntu/app'
+SSH_KEY_PATH = 'ssh_key'
+BUILD_DIR = 'build'
 
-    # SSH client setup
+# Content hashes of the files deployed last, kept on each server next to the app
+MANIFEST_NAME = '.deploy-manifest.json'
+REQUIREMENTS = 'requirements.txt'
+
+# Concurrent SFTP channels per host (all over the host's one SSH connection)
+DEFAULT_CHANNELS = 4
+# Hosts deployed to at the same time
+DEFAULT_PARALLEL_HOSTS = 16
+
+_print_lock = threading.Lock()
+
+
+def log(host, message):
+    with _print_lock:
+        print(f'[{host}] {message}', flush=True)
+
+
+def file_hashes(build_dir):
+    """SHA-256 of every file under build_dir, keyed by its path relative to build_dir"""
+    hashes = {}
+    for path in sorted(Path(build_dir).rglob('*')):
+        if path.is_file():
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            hashes[path.relative_to(build_dir).as_posix()] = digest.hexdigest()
+    return hashes
+
+
+def read_manifest(sftp, app_path):
+    """The hashes recorded by the last successful deploy, or {} for a first deploy"""
+    try:
+        with sftp.open(f'{app_path}/{MANIFEST_NAME}') as f:
+            return json.loads(f.read())
+    except (IOError, ValueError):
+        return {}
+
+
+def write_manifest(sftp, app_path, hashes):
+    # Written to a temporary file and renamed, so an interrupted deploy leaves the old manifest
+    tmp_path = f'{app_path}/{MANIFEST_NAME}.tmp'
+    with sftp.open(tmp_path, 'w') as f:
+        f.write(json.dumps(hashes, indent=1, sort_keys=True))
+    sftp.posix_rename(tmp_path, f'{app_path}/{MANIFEST_NAME}')
+
+
+def run(ssh, host, cmd):
+    """Run a command, print its output and raise if it fails"""
+    channel = ssh.get_transport().open_session()
+    # stderr is merged into stdout: reading one stream to the end cannot stall on the other filling up
+    channel.set_combine_stderr(True)
+    channel.exec_command(cmd)
+    with channel.makefile('rb') as f:
+        output = f.read().decode()
+    status = channel.recv_exit_status()
+    channel.close()
+    if output.strip():
+        log(host, output.strip() if status == 0 else f'Error: {output.strip()}')
+    if status != 0:
+        raise RuntimeError(f'{cmd!r} exited with status {status}')
+
+
+def remove(sftp, app_path, names):
+    """Delete files that are no longer in the build; ones already gone are skipped"""
+    for name in names:
+        try:
+            sftp.remove(f'{app_path}/{name}')
+        except IOError:
+            pass
+
+
+def connect(host):
+    """An SSH connection to host as ubuntu with the deploy key"""
+    # Imported here so the deploy logic can be exercised with another client (see test_deploy.py)
+    import paramiko
     ssh = paramiko.SSHClient()
     ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    ssh.connect(server_host, username='ubuntu', key_filename=ssh_key_path)
-
-    # SCP files to server
-    sftp = ssh.open_sftp()
-    for file in Path('build').glob('*'):
-        sftp.put(str(file), f'{app_path}/{file.name}')
-    sftp.close()
-
-    # Install dependencies and restart service
-    commands = [
-        f'cd {app_path} && python3 -m pip install -r requirements.txt',
-        'sudo systemctl restart myapp.service'
-    ]
-    for cmd in commands:
-        stdin, stdout, stderr = ssh.exec_command(cmd)
-        print(stdout.read().decode())
-        if stderr.read():
-            print(f'Error: {stderr.read().decode()}')
-
-    ssh.close()
+    ssh.connect(host, username='ubuntu', key_filename=SSH_KEY_PATH)
+    return ssh
+
+
+def upload(ssh, build_dir, app_path, names, channels):
+    """Upload files over up to `channels` SFTP channels in parallel"""
+    pending = queue.Queue()
+    for name in names:
+        pending.put(name)
+
+    def worker():
+        sftp = ssh.open_sftp()
+        try:
+            while True:
+                try:
+                    name = pending.get_nowait()
+                except queue.Empty:
+                    return
+                sftp.put(str(Path(build_dir) / name), f'{app_path}/{name}')
+        finally:
+            sftp.close()
+
+    workers = max(1, min(channels, len(names)))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for future in [pool.submit(worker) for _ in range(workers)]:
+            future.result()
+
+
+def deploy_host(host, hashes, build_dir=BUILD_DIR, app_path=APP_PATH, channels=DEFAULT_CHANNELS, force=False,
+                connect=connect):
+    """
+    Deploy the changed files to one host and delete the files removed from the build since
+    the last deploy (directories they leave empty are kept). Returns the number of files uploaded.
+    """
+    started = time.perf_counter()
+    ssh = connect(host)
+    try:
+        sftp = ssh.open_sftp()
+        previous = read_manifest(sftp, app_path)
+        deployed = {} if force else previous
+        changed = [name for name, digest in hashes.items() if deployed.get(name) != digest]
+        removed = sorted(name for name in previous if name not in hashes)
+        log(host, f'{len(changed)} of {len(hashes)} files changed, {len(removed)} removed')
+
+        if changed:
+            directories = sorted({posixpath.dirname(f'{app_path}/{name}') for name in changed})
+            run(ssh, host, 'mkdir -p ' + ' '.join(shlex.quote(d) for d in directories))
+            upload(ssh, build_dir, app_path, changed, channels)
+            log(host, f'uploaded {len(changed)} files in {time.perf_counter() - started:.1f}s')
+
+        # Dependencies only need installing when requirements.txt changed
+        if REQUIREMENTS in changed:
+            run(ssh, host, f'cd {app_path} && python3 -m pip install -r {REQUIREMENTS}')
+            log(host, f'installed dependencies at {time.perf_counter() - started:.1f}s')
+        else:
+            log(host, 'requirements unchanged, skipping install')
+
+        if changed or removed:
+            run(ssh, host, 'sudo systemctl restart myapp.service')
+            # Removed files are deleted once the code that no longer uses them is running
+            remove(sftp, app_path, removed)
+            # Recorded only once the new code is running, so a failed deploy (or restart) is retried in full
+            write_manifest(sftp, app_path, hashes)
+        sftp.close()
+    finally:
+        ssh.close()
+    log(host, f'done in {time.perf_counter() - started:.1f}s')
+    return len(changed)
+
+
+def deploy(hosts=None, build_dir=BUILD_DIR, channels=DEFAULT_CHANNELS, force=False,
+           parallel_hosts=DEFAULT_PARALLEL_HOSTS):
+    """
+    Deploy build_dir to every host in parallel. Hosts default to SERVER_HOSTS (comma-separated)
+    or SERVER_HOST. Returns the hosts that failed.
+    """
+    if hosts is None:
+        hosts = os.environ.get('SERVER_HOSTS') or os.environ.get('SERVER_HOST') or ''
+        hosts = [host.strip() for host in hosts.split(',') if host.strip()]
+    if not hosts:
+        raise ValueError('No hosts to deploy to: set SERVER_HOSTS or SERVER_HOST')
+
+    started = time.perf_counter()
+    hashes = file_hashes(build_dir)
+    failed = []
+    with ThreadPoolExecutor(max_workers=min(parallel_hosts, len(hosts))) as pool:
+        futures = {host: pool.submit(deploy_host, host, hashes, build_dir, channels=channels, force=force)
+                   for host in hosts}
+        for host, future in futures.items():
+            try:
+                future.result()
+            except Exception as e:
+                log(host, f'Error: {str(e)}')
+                failed.append(host)
+    print(f'Deployed to {len(hosts) - len(failed)} of {len(hosts)} hosts in {time.perf_counter() - started:.1f}s')
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Deploy the build directory to the app servers')
+    parser.add_argument('hosts', nargs='*', help='hosts to deploy to (default: SERVER_HOSTS or SERVER_HOST)')
+    parser.add_argument('--build-dir', default=BUILD_DIR)
+    parser.add_argument('--channels', type=int, default=DEFAULT_CHANNELS, help='parallel SFTP channels per host')
+    parser.add_argument('--parallel-hosts', type=int, default=DEFAULT_PARALLEL_HOSTS,
+                        help='hosts deployed to at the same time')
+    parser.add_argument('--force', action='store_true', help='upload every file and reinstall dependencies')
+    args = parser.parse_args(argv)
+    failed = deploy(args.hosts or None, args.build_dir, args.channels, args.force, args.parallel_hosts)
+    return 1 if failed else 0
+
 
 if __name__ == '__main__':
-    deploy()
\ No newline at end of file
+    sys.exit(main())
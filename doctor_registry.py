@@ -0,0 +1,72 @@
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
+
+from doctor_schedule import Schedule
+
+
+class DoctorRegistry:
+    """
+    Doctors indexed by doctor_id and by specialty, with their working schedules.
+    Lookups are dict reads; changes are made under a lock and keep registration order.
+    Doctors without a schedule of their own work the default schedule.
+    on_schedule_change(doctor_id) is called after a doctor's schedule is set.
+    """
+
+    def __init__(self, doctors=(), default_schedule: Optional[Schedule] = None):
+        self._lock = threading.Lock()
+        self._by_id: Dict[str, Dict] = {}
+        self._by_specialty: Dict[str, Dict[str, Dict]] = {}
+        self._schedules: Dict[str, Schedule] = {}
+        self.default_schedule = default_schedule
+        self.on_schedule_change: Optional[Callable[[str], None]] = None
+        for doctor in doctors:
+            self.add(doctor)
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(list(self._by_id.values()))
+
+    def __contains__(self, doctor_id: str) -> bool:
+        return doctor_id in self._by_id
+
+    def get(self, doctor_id: str) -> Optional[Dict]:
+        return self._by_id.get(doctor_id)
+
+    def add(self, doctor: Dict) -> None:
+        """Add a doctor, or replace the one with the same doctor_id"""
+        with self._lock:
+            self._remove(doctor['doctor_id'])
+            self._by_id[doctor['doctor_id']] = doctor
+            self._by_specialty.setdefault(doctor['specialty'], {})[doctor['doctor_id']] = doctor
+
+    def remove(self, doctor_id: str) -> Optional[Dict]:
+        with self._lock:
+            return self._remove(doctor_id)
+
+    def _remove(self, doctor_id: str) -> Optional[Dict]:
+        self._schedules.pop(doctor_id, None)
+        doctor = self._by_id.pop(doctor_id, None)
+        if doctor is not None:
+            doctors = self._by_specialty[doctor['specialty']]
+            del doctors[doctor_id]
+            if not doctors:
+                del self._by_specialty[doctor['specialty']]
+        return doctor
+
+    def for_specialty(self, specialty: str) -> List[Dict]:
+        return list(self._by_specialty.get(specialty, {}).values())
+
+    def specialties(self) -> List[str]:
+        return sorted(self._by_specialty)
+
+    def schedule(self, doctor_id: str) -> Optional[Schedule]:
+        return self._schedules.get(doctor_id, self.default_schedule)
+
+    def set_schedule(self, doctor_id: str, schedule: Schedule) -> None:
+        if doctor_id not in self._by_id:
+            raise KeyError(doctor_id)
+        self._schedules[doctor_id] = schedule
+        if self.on_schedule_change is not None:
+            self.on_schedule_change(doctor_id)
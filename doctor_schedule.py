@@ -0,0 +1,136 @@
+"""
+Per-doctor working schedules as slot bitmaps.
+
+A schedule holds one bitmap per weekday with a bit set for every bookable slot start
+(bit = minutes since midnight // SLOT_RESOLUTION_MINUTES, as in appointment_store), plus
+holidays and per-date overrides. The free slots of a day are then one bitwise operation:
+schedule.day_mask(day) & ~booked_mask.
+
+Schedules can be loaded from JSON configuration, one object per doctor:
+    {"slot_minutes": 15,
+     "hours": {"mon": [["08:00", "12:00"], ["13:00", "17:00"]], "tue": [["08:00", "12:00"]]},
+     "breaks": [["10:00", "10:15"]],
+     "holidays": ["2025-12-25"],
+     "overrides": {"2025-12-24": [["08:00", "11:00"]]}}
+"""
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Tuple
+
+from appointment_store import SLOT_RESOLUTION_MINUTES, slot_time
+from validation import is_valid_time, parse_date
+
+WEEKDAYS = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+
+# (start, end) in minutes since midnight
+Interval = Tuple[int, int]
+
+
+def minutes(time_str: str) -> int:
+    """Minutes since midnight of an HH:MM time"""
+    if not is_valid_time(time_str):
+        raise ValueError(f"Invalid time: {time_str!r}")
+    return int(time_str[:2]) * 60 + int(time_str[3:])
+
+
+def slot_mask(hours: Iterable[Interval], slot_minutes: int, breaks: Iterable[Interval] = ()) -> int:
+    """Bitmap of the slot starts that fit entirely inside hours without overlapping a break"""
+    if slot_minutes <= 0 or slot_minutes % SLOT_RESOLUTION_MINUTES:
+        raise ValueError(f"Slot length must be a positive multiple of {SLOT_RESOLUTION_MINUTES} minutes")
+    breaks = list(breaks)
+    mask = 0
+    for start, end in hours:
+        for minute in range(start, end - slot_minutes + 1, slot_minutes):
+            if not any(break_start < minute + slot_minutes and minute < break_end
+                       for break_start, break_end in breaks):
+                mask |= 1 << (minute // SLOT_RESOLUTION_MINUTES)
+    return mask
+
+
+@lru_cache(maxsize=4096)
+def slot_times(mask: int) -> Tuple[str, ...]:
+    """HH:MM start times of the slots set in mask, in order"""
+    times = []
+    while mask:
+        lowest = mask & -mask
+        times.append(slot_time(lowest.bit_length() - 1))
+        mask ^= lowest
+    return tuple(times)
+
+
+class Schedule:
+    """A recurring weekly template of bookable slots, with holidays and per-date overrides"""
+
+    def __init__(self, week_masks: Sequence[int], holidays: Iterable[date] = (),
+                 overrides: Optional[Mapping[date, int]] = None):
+        if len(week_masks) != 7:
+            raise ValueError("A schedule needs one slot mask per weekday")
+        self.week_masks = tuple(week_masks)
+        # Stored by ordinal so day_mask only does integer lookups
+        self.holidays = frozenset(day.toordinal() for day in holidays)
+        self.overrides = {day.toordinal(): mask for day, mask in (overrides or {}).items()}
+
+    @classmethod
+    def weekly(cls, hours: Mapping[int, Iterable[Interval]], slot_minutes: int = 30,
+               breaks: Iterable[Interval] = (), holidays: Iterable[date] = ()) -> 'Schedule':
+        """Schedule from working hours per weekday (0 = Monday) in minutes since midnight"""
+        breaks = list(breaks)
+        return cls([slot_mask(hours.get(weekday, ()), slot_minutes, breaks) for weekday in range(7)], holidays)
+
+    @classmethod
+    def office_hours(cls, start: str, end: str, slot_minutes: int = 30, weekdays: Iterable[int] = range(5),
+                     breaks: Sequence[Tuple[str, str]] = (), holidays: Iterable[date] = ()) -> 'Schedule':
+        """The same hours (HH:MM) on each of weekdays"""
+        interval = (minutes(start), minutes(end))
+        return cls.weekly({weekday: [interval] for weekday in weekdays}, slot_minutes,
+                          [(minutes(a), minutes(b)) for a, b in breaks], holidays)
+
+    @classmethod
+    def from_config(cls, config: Mapping, default: Optional['Schedule'] = None) -> 'Schedule':
+        """Schedule from a JSON-style configuration (see the module docstring)"""
+        slot_minutes = int(config.get('slot_minutes', 30))
+        breaks = [(minutes(a), minutes(b)) for a, b in config.get('breaks', ())]
+        if 'hours' in config:
+            hours = {}
+            for name, intervals in config['hours'].items():
+                if name not in WEEKDAYS:
+                    raise ValueError(f"Unknown weekday: {name!r}")
+                hours[WEEKDAYS.index(name)] = [(minutes(a), minutes(b)) for a, b in intervals]
+            week_masks = [slot_mask(hours.get(weekday, ()), slot_minutes, breaks) for weekday in range(7)]
+        elif default is not None:
+            week_masks = default.week_masks
+        else:
+            raise ValueError("A schedule needs hours or a default template")
+
+        def parse_day(value):
+            day = parse_date(value)
+            if day is None:
+                raise ValueError(f"Invalid date: {value!r}")
+            return day
+
+        overrides = {}
+        for day, intervals in config.get('overrides', {}).items():
+            overrides[parse_day(day)] = slot_mask([(minutes(a), minutes(b)) for a, b in intervals], slot_minutes, breaks)
+        return cls(week_masks, [parse_day(day) for day in config.get('holidays', ())], overrides)
+
+    def with_holidays(self, holidays: Iterable[date]) -> 'Schedule':
+        """The same template with additional holidays (e.g. one doctor's leave)"""
+        return Schedule(self.week_masks, [date.fromordinal(day) for day in self.holidays] + list(holidays),
+                        {date.fromordinal(day): mask for day, mask in self.overrides.items()})
+
+    def day_mask(self, day: date) -> int:
+        """Bitmap of the bookable slot starts on day"""
+        ordinal = day.toordinal()
+        if ordinal in self.holidays:
+            return 0
+        mask = self.overrides.get(ordinal)
+        return self.week_masks[day.weekday()] if mask is None else mask
+
+    def is_bookable(self, day: date, index: int) -> bool:
+        return bool(self.day_mask(day) >> index & 1)
+
+
+def load_schedules(config: Mapping[str, Mapping], default: Optional[Schedule] = None) -> Dict[str, Schedule]:
+    """Schedules by doctor_id from a mapping of doctor_id to configuration"""
+    return {doctor_id: Schedule.from_config(entry, default) for doctor_id, entry in config.items()}
+
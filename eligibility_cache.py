@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+CacheKey = Tuple[str, str, Optional[str]]
+
+# Returned by get() when there is no usable entry, so that None can be cached
+MISS = object()
+
+
+class EligibilityCache:
+    """
+    Bounded cache of eligibility results keyed by (patient_id, insurance_id, service_date).
+    Entries expire after a TTL and the least recently used entry is evicted when full.
+    Negative results (e.g. policy not found) are cached with their own, usually shorter, TTL.
+
+    invalidate() only reaches this process's cache. When policies are written by other
+    processes too, pass version(insurance_id), e.g. SQLiteInsuranceTable.version: an
+    entry is only used while the policy's version is the one read before it was fetched.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, negative_ttl: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic, version: Optional[Callable[[str], Any]] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._clock = clock
+        self._version = version
+        self._lock = threading.Lock()
+        # key -> (expires_at, value, policy version), in least- to most-recently-used order
+        self._entries: "OrderedDict[CacheKey, Tuple[float, Any, Any]]" = OrderedDict()
+        # insurance_id / patient_id -> keys, for invalidation without a scan
+        self._by_insurance: Dict[str, Set[CacheKey]] = {}
+        self._by_patient: Dict[str, Set[CacheKey]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def version(self, insurance_id: str) -> Any:
+        """The policy's current version, to read before fetching it and pass to put(); None if untracked"""
+        return self._version(insurance_id) if self._version is not None else None
+
+    def get(self, patient_id: str, insurance_id: str, service_date: Optional[str] = None) -> Any:
+        """Return the cached value, or MISS if absent, expired or (with versions) stale"""
+        key = (patient_id, insurance_id, service_date)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            if entry[0] <= self._clock():
+                self._discard(key)
+                self.expirations += 1
+                self.misses += 1
+                return MISS
+        # Read outside the lock: it may be a database query
+        if self._version is not None and self._version(insurance_id) != entry[2]:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    self._discard(key)
+                    self.invalidations += 1
+                self.misses += 1
+            return MISS
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry[1]
+
+    def put(self, patient_id: str, insurance_id: str, service_date: Optional[str], value: Any,
+            negative: bool = False, version: Any = None) -> None:
+        key = (patient_id, insurance_id, service_date)
+        expires_at = self._clock() + (self.negative_ttl if negative else self.ttl)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (expires_at, value, version)
+            self._by_insurance.setdefault(insurance_id, set()).add(key)
+            self._by_patient.setdefault(patient_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, insurance_id: Optional[str] = None, patient_id: Optional[str] = None) -> int:
+        """Drop every entry for an insurance policy and/or patient. Returns the number dropped."""
+        with self._lock:
+            keys = set()
+            if insurance_id is not None:
+                keys |= self._by_insurance.get(insurance_id, set())
+            if patient_id is not None:
+                keys |= self._by_patient.get(patient_id, set())
+            for key in keys:
+                self._discard(key)
+            self.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_insurance.clear()
+            self._by_patient.clear()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _discard(self, key: CacheKey) -> None:
+        self._entries.pop(key, None)
+        patient_id, insurance_id, _ = key
+        for index, value in ((self._by_insurance, insurance_id), (self._by_patient, patient_id)):
+            keys = index.get(value)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del index[value]
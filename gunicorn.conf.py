@@ -0,0 +1,29 @@
+# Gunicorn settings for the combined service: gunicorn -c gunicorn.conf.py
+# More than one worker needs DATABASE_PATH: the in-memory stores (appointments, the
+# availability feed, the waitlist, idempotency keys) are per process, and a JOURNAL_DIR can only be
+# written by one of them.
+import gc
+import multiprocessing
+import os
+
+wsgi_app = 'wsgi:create_app()'
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY',
+                             multiprocessing.cpu_count() * 2 + 1 if os.environ.get('DATABASE_PATH') else 1))
+# Threaded workers: a long-poll or SSE subscriber to /api/availability/changes or /stream
+# holds a thread rather than a whole worker, and does not stop the worker's heartbeat
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+if os.environ.get('JOURNAL_DIR') and workers > 1:
+    raise RuntimeError("JOURNAL_DIR can only be written by one worker: set WEB_CONCURRENCY=1")
+if not os.environ.get('DATABASE_PATH') and workers > 1:
+    raise RuntimeError("Workers only share state through DATABASE_PATH: set it, or WEB_CONCURRENCY=1")
+
+# Import and initialize everything once in the master; workers are forked ready to serve
+preload_app = True
+
+
+def when_ready(server):
+    # Objects created while preloading are never freed; keeping them out of the garbage
+    # collector stops it from touching (and so copying) their memory pages in every worker
+    gc.freeze()
@@ -0,0 +1,321 @@
+"""
+Idempotency-Key support for POST endpoints that clients retry.
+
+A request carrying an Idempotency-Key header is run once; repeating it with the same key
+and body replays the stored response (marked with an Idempotent-Replayed header) instead
+of registering or booking again. Reusing a key with a different body is rejected with 422.
+A repeat that arrives while the original is still running waits for its response.
+Server errors (5xx) are not stored, so the request can be retried.
+
+Keys are scoped to the client that sent them (its Authorization credential, or its address
+without one), so a key chosen by another client never replays someone else's response.
+With DATABASE_PATH the keys are kept in the shared SQLite database, so a retry reaching
+another worker is still replayed; otherwise they are kept in a bounded in-process store.
+Entries expire after a TTL.
+"""
+import functools
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Response, jsonify, make_response, request
+
+from metrics import register_cache
+from repository import SQLiteDatabase, SQLiteRepository, get_repository
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# Results of IdempotencyStore.begin
+NEW = 'new'
+REPLAY = 'replay'
+MISMATCH = 'mismatch'
+IN_PROGRESS = 'in_progress'
+
+# A request still running after this many seconds is presumed lost (e.g. its worker was
+# killed), and its key can be claimed again
+IN_PROGRESS_LEASE = 300.0
+
+# (method, route, client, key)
+ScopedKey = Tuple[str, str, str, str]
+# (status code, body, content type)
+StoredResponse = Tuple[int, bytes, str]
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'expires_at', 'response', 'done')
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.expires_at = expires_at
+        self.response: Optional[StoredResponse] = None
+        self.done = threading.Event()
+
+
+class IdempotencyStore:
+    """
+    Responses by idempotency key, bounded by max_entries and expired after ttl seconds.
+    A request in progress holds its key; repeats wait up to wait_timeout seconds for it.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400.0, wait_timeout: float = 10.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> entry, in least- to most-recently-used order
+        self._entries: "OrderedDict[ScopedKey, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def begin(self, key: ScopedKey, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        """
+        Claim key for a new request, or find the request that used it before.
+        Returns (NEW, None), (REPLAY, response), (MISMATCH, None) if the key was used with
+        another fingerprint, or (IN_PROGRESS, None) if the earlier request is still running.
+        """
+        deadline = self._clock() + self.wait_timeout
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.response is not None and entry.expires_at <= self._clock():
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+                if entry is None:
+                    self._entries[key] = _Entry(fingerprint, self._clock() + self.ttl)
+                    self.misses += 1
+                    self._evict()
+                    return NEW, None
+                if entry.fingerprint != fingerprint:
+                    return MISMATCH, None
+                if entry.response is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return REPLAY, entry.response
+            remaining = deadline - self._clock()
+            if remaining <= 0 or not entry.done.wait(remaining):
+                return IN_PROGRESS, None
+
+    def finish(self, key: ScopedKey, response: Optional[StoredResponse]) -> None:
+        """Store the response of a claimed key, or release the key (response None) so it can be retried"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.response is not None:
+                return
+            if response is None:
+                del self._entries[key]
+                self.invalidations += 1
+            else:
+                entry.response = response
+                entry.expires_at = self._clock() + self.ttl
+        entry.done.set()
+
+    def clear(self) -> None:
+        with self._lock:
+            entries = list(self._entries.values())
+            self._entries.clear()
+        for entry in entries:
+            entry.done.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations
+            }
+
+    def _evict(self) -> None:
+        # Keys of requests still running are kept, so that their repeats cannot run again
+        skipped = 0
+        while len(self._entries) > self.max_entries and skipped < len(self._entries):
+            key, entry = next(iter(self._entries.items()))
+            if entry.response is None:
+                self._entries.move_to_end(key)
+                skipped += 1
+                continue
+            del self._entries[key]
+            self.evictions += 1
+
+
+class SQLiteIdempotencyStore:
+    """
+    IdempotencyStore over the idempotency_keys table of the shared SQLite database, so
+    every worker sees every key. A repeat of a request running in another worker polls
+    for its response. Expired rows are deleted when new keys are claimed.
+    """
+
+    _where = "method = ? AND route = ? AND client = ? AND key = ?"
+
+    def __init__(self, db: SQLiteDatabase, ttl: float = 86400.0, wait_timeout: float = 10.0,
+                 lease: float = IN_PROGRESS_LEASE, poll_interval: float = 0.05,
+                 clock: Callable[[], float] = time.time):
+        self.db = db
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._clock = clock
+        # Counted per process
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM idempotency_keys").fetchone()[0]
+
+    def _claim(self, key: ScopedKey, fingerprint: str):
+        # The stored row for key, or None after claiming key for a new request
+        conn = self.db.connection()
+        now = self._clock()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                f"SELECT fingerprint, status, body, content_type, expires_at FROM idempotency_keys WHERE {self._where}",
+                key).fetchone()
+            if row is not None and row[4] <= now:
+                self.expirations += 1
+                row = None
+            if row is None:
+                conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+                conn.execute("INSERT INTO idempotency_keys (method, route, client, key, fingerprint, expires_at)"
+                             " VALUES (?, ?, ?, ?, ?, ?)", (*key, fingerprint, now + self.lease))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return row
+
+    def begin(self, key: ScopedKey, fingerprint: str) -> Tuple[str, Optional[StoredResponse]]:
+        """See IdempotencyStore.begin"""
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            row = self._claim(key, fingerprint)
+            if row is None:
+                self.misses += 1
+                return NEW, None
+            stored_fingerprint, status, body, content_type, _ = row
+            if stored_fingerprint != fingerprint:
+                return MISMATCH, None
+            if status is not None:
+                self.hits += 1
+                return REPLAY, (status, bytes(body), content_type)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return IN_PROGRESS, None
+            time.sleep(min(self.poll_interval, remaining))
+
+    def finish(self, key: ScopedKey, response: Optional[StoredResponse]) -> None:
+        """See IdempotencyStore.finish"""
+        conn = self.db.connection()
+        if response is None:
+            cursor = conn.execute(f"DELETE FROM idempotency_keys WHERE {self._where} AND status IS NULL", key)
+            self.invalidations += cursor.rowcount
+        else:
+            status, body, content_type = response
+            conn.execute(f"UPDATE idempotency_keys SET status = ?, body = ?, content_type = ?, expires_at = ?"
+                         f" WHERE {self._where} AND status IS NULL",
+                         (status, body, content_type, self._clock() + self.ttl, *key))
+
+    def clear(self) -> None:
+        self.db.connection().execute("DELETE FROM idempotency_keys")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": 0,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations
+        }
+
+
+def create_store(repository):
+    """An idempotency store next to the repository's data: shared with SQLite, per process otherwise"""
+    ttl = float(os.environ.get('IDEMPOTENCY_KEY_TTL', 86400))
+    if isinstance(repository, SQLiteRepository):
+        return SQLiteIdempotencyStore(repository.db, ttl=ttl)
+    return IdempotencyStore(max_entries=int(os.environ.get('IDEMPOTENCY_KEYS_MAX', 10000)), ttl=ttl)
+
+
+idempotency_store = create_store(get_repository())
+register_cache('idempotency_keys', idempotency_store)
+
+
+def key_error(key: str) -> Optional[str]:
+    """Why an Idempotency-Key header value is not acceptable, or None"""
+    if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+        return f"{HEADER} must be 1-{MAX_KEY_LENGTH} printable characters"
+    return None
+
+
+def fingerprint(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def client_identity(authorization: Optional[str], remote_addr: Optional[str]) -> str:
+    """The client part of a scoped key: a digest of its credential, or its address without one"""
+    if authorization:
+        return 'auth:' + hashlib.sha256(authorization.encode()).hexdigest()
+    return f'addr:{remote_addr or ""}'
+
+
+def _replay(response: StoredResponse) -> Response:
+    status, body, content_type = response
+    replayed = Response(body, status=status, content_type=content_type)
+    replayed.headers[REPLAYED_HEADER] = 'true'
+    return replayed
+
+
+def idempotent(view):
+    """Make a Flask view replay its response for requests repeating an Idempotency-Key"""
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        error = key_error(key)
+        if error:
+            return jsonify({"error": error}), 400
+
+        client = client_identity(request.headers.get('Authorization'), request.remote_addr)
+        scoped_key = (request.method, request.url_rule.rule, client, key)
+        outcome, stored = idempotency_store.begin(scoped_key, fingerprint(request.get_data()))
+        if outcome == REPLAY:
+            return _replay(stored)
+        if outcome == MISMATCH:
+            return jsonify({"error": f"{HEADER} was already used with a different request"}), 422
+        if outcome == IN_PROGRESS:
+            response = jsonify({"error": f"A request with this {HEADER} is still being processed"})
+            response.headers['Retry-After'] = '1'
+            return response, 409
+
+        try:
+            response = make_response(view(*args, **kwargs))
+        except BaseException:
+            idempotency_store.finish(scoped_key, None)
+            raise
+        if response.status_code >= 500 or response.is_streamed:
+            idempotency_store.finish(scoped_key, None)
+        else:
+            idempotency_store.finish(scoped_key, (response.status_code, response.get_data(), response.content_type))
+        return response
+    return wrapper
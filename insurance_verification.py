@@ -1,7 +1,8 @@
 import logging
-import re
-from typing import Optional, Dict
-from datetime import datetime
+from typing import Callable, Optional, Dict, List, MutableMapping
+from datetime import date
+from policy_coverage import coverage_dates, date_ordinal
+from validation import INSURANCE_UPDATE_SCHEMA, is_valid_insurance_id
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -23,15 +24,60 @@ class InsuranceExpiredError(InsuranceVerificationError):
     """Raised when insurance is expired"""
     pass
 
+class InsuranceServiceUnavailableError(InsuranceVerificationError):
+    """Raised when the insurance backend is failing and requests are being shed"""
+    pass
+
 class InsuranceVerifier:
-    def __init__(self):
+    def __init__(self, insurance_db: Optional[MutableMapping[str, Dict]] = None):
         self.max_retries = 3
-        self.insurance_db: Dict[str, Dict] = {}  # Simulated database
+        # Any mapping of insurance ID -> record, e.g. get_repository().insurance
+        self.insurance_db: MutableMapping[str, Dict] = {} if insurance_db is None else insurance_db
+        # Called with the insurance ID after every update, e.g. EligibilityCache.invalidate
+        self.invalidation_hooks: List[Callable[[str], object]] = []
+
+    def add_invalidation_hook(self, hook: Callable[[str], object]) -> None:
+        """Register a callback to run whenever an insurance record changes"""
+        self.invalidation_hooks.append(hook)
 
     def validate_insurance_id_format(self, insurance_id: str) -> bool:
         """Validate insurance ID format (e.g., ABC123456789)"""
-        pattern = r'^[A-Z]{3}\d{9}$'
-        return bool(re.match(pattern, insurance_id))
+        return is_valid_insurance_id(insurance_id)
+
+    def check_insurance_id(self, insurance_id: str) -> None:
+        """Raise InvalidInsuranceIdError if the insurance ID format is invalid"""
+        if not self.validate_insurance_id_format(insurance_id):
+            logger.error(f"Invalid insurance ID format: {insurance_id}")
+            raise InvalidInsuranceIdError(
+                "The insurance ID format is incorrect. Please check and enter a valid ID (e.g., ABC123456789)."
+            )
+
+    def check_insurance_info(self, insurance_id: str, insurance_info: Optional[Dict]) -> Dict:
+        """
+        Check a looked-up insurance record
+        Returns the record or raises InsuranceNotFoundError / InsuranceExpiredError
+        """
+        # Check if insurance exists
+        if not insurance_info:
+            logger.warning(f"Insurance not found: {insurance_id}")
+            raise InsuranceNotFoundError(
+                "We couldn't find your insurance information. Would you like to update your details?"
+            )
+
+        # Check expiration: expiry_date, or the expiration date of a policy record written by the
+        # eligibility API (date_ordinal caches parsed dates, so repeated checks do not re-parse)
+        expiry_value = coverage_dates(insurance_info)[1]
+        expiry_date = date_ordinal(expiry_value) if expiry_value is not None else None
+        if expiry_value is not None and expiry_date is None:
+            raise ValueError(f"Invalid expiry date: {expiry_value!r}")
+        if expiry_date is not None and expiry_date < date.today().toordinal():
+            logger.warning(f"Insurance expired: {insurance_id}")
+            raise InsuranceExpiredError(
+                "Your insurance policy has expired. Please provide updated insurance information."
+            )
+
+        logger.info(f"Insurance verified successfully: {insurance_id}")
+        return insurance_info
 
     def verify_insurance(self, insurance_id: str, retry_count: int = 0) -> Dict[str, str]:
         """
@@ -39,34 +85,17 @@ class InsuranceVerifier:
         Returns insurance details or raises appropriate exception
         """
         try:
-            # Validate ID format
-            if not self.validate_insurance_id_format(insurance_id):
-                logger.error(f"Invalid insurance ID format: {insurance_id}")
-                raise InvalidInsuranceIdError(
-                    "The insurance ID format is incorrect. Please check and enter a valid ID (e.g., ABC123456789)."
-                )
-
-            # Check if insurance exists
-            insurance_info = self.insurance_db.get(insurance_id)
-            if not insurance_info:
-                logger.warning(f"Insurance not found: {insurance_id}")
-                raise InsuranceNotFoundError(
-                    "We couldn't find your insurance information. Would you like to update your details?"
-                )
-
-            # Check expiration
-            expiry_date = datetime.strptime(insurance_info['expiry_date'], '%Y-%m-%d')
-            if expiry_date < datetime.now():
-                logger.warning(f"Insurance expired: {insurance_id}")
-                raise InsuranceExpiredError(
-                    "Your insurance policy has expired. Please provide updated insurance information."
-                )
-
-            logger.info(f"Insurance verified successfully: {insurance_id}")
-            return insurance_info
+            self.check_insurance_id(insurance_id)
+            return self.check_insurance_info(insurance_id, self.insurance_db.get(insurance_id))
 
         except (InvalidInsuranceIdError, InsuranceNotFoundError, InsuranceExpiredError) as e:
             raise e
+        except (KeyError, ValueError) as e:
+            # A malformed record is not a system error: retrying would read the same record
+            logger.error(f"Invalid insurance record {insurance_id}: {str(e)}")
+            raise InsuranceVerificationError(
+                "Your insurance record could not be read. Please contact support."
+            )
         except Exception as e:
             logger.error(f"System error during verification: {str(e)}")
             if retry_count < self.max_retries:
@@ -75,6 +104,20 @@ class InsuranceVerifier:
                 "We're experiencing technical difficulties. Please try again later or contact support."
             )
 
+    def policy_record(self, current: Optional[Dict], new_info: Dict) -> Dict:
+        """
+        The record to store for an update: new_info merged into the current policy record,
+        with expiry_date as its coverage expiration date, so the eligibility API reads the
+        update. A policy not yet linked to a patient (no patient_id) stays not found there.
+        """
+        record = dict(current) if isinstance(current, dict) else {}
+        record.update(new_info)
+        details = record.get('coverage_details')
+        record['coverage_details'] = {**(details if isinstance(details, dict) else {}),
+                                      'expiration_date': new_info['expiry_date']}
+        record.setdefault('eligibility_status', 'active')
+        return record
+
     def update_insurance_info(self, insurance_id: str, new_info: Dict) -> bool:
         """
         Update insurance information after verification failure
@@ -87,14 +130,15 @@ class InsuranceVerifier:
                 )
 
             # Validate required fields
-            required_fields = ['provider', 'expiry_date', 'member_name']
-            if not all(field in new_info for field in required_fields):
+            if INSURANCE_UPDATE_SCHEMA.missing_fields(new_info):
                 raise InsuranceVerificationError(
                     "Missing required insurance information. Please provide all required fields."
                 )
 
             # Update database
-            self.insurance_db[insurance_id] = new_info
+            self.insurance_db[insurance_id] = self.policy_record(self.insurance_db.get(insurance_id), new_info)
+            for hook in self.invalidation_hooks:
+                hook(insurance_id)
             logger.info(f"Insurance information updated: {insurance_id}")
             return True
 
@@ -104,8 +148,19 @@ class InsuranceVerifier:
                 f"Failed to update insurance information: {str(e)}. Please try again or contact support."
             )
 
+def shared_verifier() -> InsuranceVerifier:
+    """
+    An InsuranceVerifier over the shared repository's insurance table. Its updates
+    invalidate the eligibility cache of insurance_verification_api.
+    """
+    from repository import get_repository
+    from insurance_verification_api import eligibility_cache
+    verifier = InsuranceVerifier(get_repository().insurance)
+    verifier.add_invalidation_hook(eligibility_cache.invalidate)
+    return verifier
+
 def main():
-    verifier = InsuranceVerifier()
+    verifier = shared_verifier()
     
     while True:
         try:
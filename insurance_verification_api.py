@@ -1,147 +1,297 @@
-from flask import Flask, request, jsonify
-from datetime import datetime
+from flask import Blueprint, Flask, Response, request, jsonify, stream_with_context
+import json
+import os
+import time
 import uuid
+from policy_coverage import coverage_decision
+from eligibility_cache import EligibilityCache, MISS
+from metrics import ELIGIBILITY_LATENCY, STORE_LATENCY, register_cache, timed
+from repository import SQLiteInsuranceTable, get_repository
+from validation import ELIGIBILITY_QUERY_SCHEMA, ELIGIBILITY_REQUEST_SCHEMA, parse_date
 
-app = Flask(__name__)
+insurance = Blueprint('insurance', __name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Largest batch answered as a single JSON document; bigger batches must be streamed
+MAX_BATCH_SIZE = 10000
+
+# Insurance policies from the shared repository
+repository = get_repository()
+insurance_db = repository.insurance
+
+# Eligibility lookups are cached per (patient_id, insurance_id, service_date). Policies in the
+# shared database can be updated by other workers, so hits are checked against their version.
+eligibility_cache = EligibilityCache(
+    max_entries=int(os.environ.get('ELIGIBILITY_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('ELIGIBILITY_CACHE_TTL', 300)),
+    negative_ttl=float(os.environ.get('ELIGIBILITY_CACHE_NEGATIVE_TTL', 60)),
+    version=insurance_db.version if isinstance(insurance_db, SQLiteInsuranceTable) else None
+)
+register_cache('eligibility_cache', eligibility_cache)
+
+POLICY_NOT_FOUND = "Insurance policy not found"
+
+# Where policies are read on a cache miss: insurance_id -> (record, coverage interval) or None.
+# A payer backend would be plugged in here; asgi.py takes an async counterpart.
+fetch_coverage = insurance_db.coverage
 
-# Simulated insurance database (in-memory)
-insurance_db = {
-    "INS456": {
-        "patient_id": "P123",
-        "first_name": "John",
-        "last_name": "Doe",
-        "date_of_birth": "1980-01-01",
-        "eligibility_status": "active",
-        "coverage_details": {
-            "plan_name": "Gold Plan",
-            "effective_date": "2024-01-01",
-            "expiration_date": "2025-12-31",
-            "copay": 20,
-            "deductible": 500
-        }
-    },
-    "INS789": {
-        "patient_id": "P456",
-        "first_name": "Jane",
-        "last_name": "Smith",
-        "date_of_birth": "1990-05-15",
-        "eligibility_status": "inactive",
-        "coverage_details": {
-            "plan_name": "Silver Plan",
-            "effective_date": "2023-01-01",
-            "expiration_date": "2024-06-30",
-            "copay": 30,
-            "deductible": 1000
-        }
+def is_policy_record(record):
+    """Whether a stored record has the fields eligibility answers are built from"""
+    return (isinstance(record, dict) and 'patient_id' in record and 'eligibility_status' in record
+            and isinstance(record.get('coverage_details'), dict))
+
+def policy_result(patient_id, coverage, service_date):
+    """(record, covered, reason) for a fetched policy, as returned by lookup_policy"""
+    # A malformed record (e.g. one not linked to a patient) answers like a missing one
+    if coverage is None or not is_policy_record(coverage[0]):
+        return (None, False, POLICY_NOT_FOUND)
+    if coverage[0]['patient_id'] != patient_id:
+        return (None, False, "Patient ID does not match insurance record")
+    record, interval = coverage
+    return (record, *coverage_decision(record, interval, parse_date(service_date)))
+
+def lookup_policy(patient_id, insurance_id, service_date=None):
+    """
+    Look up the insurance record for a patient and whether it covers service_date (YYYY-MM-DD),
+    going through the eligibility cache. Without a service_date only the policy's
+    eligibility_status is checked. Returns (record, covered, reason); record is None if there
+    is no matching policy.
+    """
+    started = time.perf_counter()
+    cached = eligibility_cache.get(patient_id, insurance_id, service_date)
+    if cached is not MISS:
+        ELIGIBILITY_LATENCY.labels('cache').observe(time.perf_counter() - started)
+        return cached
+
+    with timed(STORE_LATENCY, 'insurance', 'get'):
+        version = eligibility_cache.version(insurance_id)
+        coverage = fetch_coverage(insurance_id)
+    result = policy_result(patient_id, coverage, service_date)
+    eligibility_cache.put(patient_id, insurance_id, service_date, result, negative=result[0] is None,
+                          version=version)
+    ELIGIBILITY_LATENCY.labels('store').observe(time.perf_counter() - started)
+    return result
+
+def eligibility_response(patient_id, insurance_id, record, covered, reason, service_date):
+    """Response body for a policy that was found"""
+    if not is_policy_record(record):
+        return not_found_response(patient_id, insurance_id, POLICY_NOT_FOUND)
+    status = record['eligibility_status']
+    # An active policy does not cover days outside its coverage window
+    if service_date and not covered and status == 'active':
+        status = 'inactive'
+    return {
+        "patient_id": patient_id,
+        "insurance_id": insurance_id,
+        "eligibility_status": status,
+        "covered": covered,
+        "coverage_details": record['coverage_details'],
+        "message": reason if service_date and not covered else "Eligibility verified successfully"
     }
-}
 
-def validate_date(date_str):
-    try:
-        if date_str:
-            datetime.strptime(date_str, '%Y-%m-%d')
-        return True
-    except ValueError:
-        return False
+def update_insurance_record(insurance_id, record):
+    """Store an insurance record and drop any cached eligibility results for it"""
+    insurance_db[insurance_id] = record
+    eligibility_cache.invalidate(insurance_id)
 
-@app.route('/api/insurance/eligibility', methods=['GET'])
-def get_eligibility():
-    try:
-        patient_id = request.args.get('patient_id')
-        insurance_id = request.args.get('insurance_id')
-        service_date = request.args.get('service_date')
+def not_found_response(patient_id, insurance_id, message):
+    return {
+        "patient_id": patient_id,
+        "insurance_id": insurance_id,
+        "eligibility_status": "not_found",
+        "coverage_details": {},
+        "message": message
+    }
 
-        if not patient_id or not insurance_id:
-            return jsonify({"error": "patient_id and insurance_id are required"}), 400
+def eligibility_query_error(args):
+    """(body, status) if the GET query string is invalid, else None"""
+    if ELIGIBILITY_QUERY_SCHEMA.missing_fields(args):
+        return {"error": "patient_id and insurance_id are required"}, 400
+    errors = ELIGIBILITY_QUERY_SCHEMA.validate(args)
+    if errors:
+        return {"error": errors[0]}, 400
+    return None
 
-        if service_date and not validate_date(service_date):
-            return jsonify({"error": "Invalid service_date format. Use YYYY-MM-DD"}), 400
+def eligibility_query_response(args, result):
+    """(body, status) of a valid GET query, given the lookup_policy result"""
+    patient_id = args.get('patient_id')
+    insurance_id = args.get('insurance_id')
+    record, covered, reason = result
+    if record is None:
+        return not_found_response(patient_id, insurance_id, reason), 200
+    return eligibility_response(patient_id, insurance_id, record, covered, reason, args.get('service_date')), 200
 
-        if insurance_id not in insurance_db:
-            return jsonify({
-                "patient_id": patient_id,
-                "insurance_id": insurance_id,
-                "eligibility_status": "not_found",
-                "coverage_details": {},
-                "message": "Insurance policy not found"
-            }), 200
-
-        record = insurance_db[insurance_id]
-        if record['patient_id'] != patient_id:
-            return jsonify({
-                "patient_id": patient_id,
-                "insurance_id": insurance_id,
-                "eligibility_status": "not_found",
-                "coverage_details": {},
-                "message": "Patient ID does not match insurance record"
-            }), 200
+@insurance.route('/api/insurance/eligibility', methods=['GET'])
+def get_eligibility():
+    try:
+        error = eligibility_query_error(request.args)
+        if error:
+            return jsonify(error[0]), error[1]
 
-        return jsonify({
-            "patient_id": patient_id,
-            "insurance_id": insurance_id,
-            "eligibility_status": record['eligibility_status'],
-            "coverage_details": record['coverage_details'],
-            "message": "Eligibility verified successfully"
-        }), 200
+        result = lookup_policy(request.args.get('patient_id'), request.args.get('insurance_id'),
+                               request.args.get('service_date'))
+        body, status = eligibility_query_response(request.args, result)
+        return jsonify(body), status
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/api/insurance/eligibility', methods=['POST'])
+def eligibility_request_error(data):
+    """(body, status) if a POST request body is invalid, else None"""
+    missing_fields = ELIGIBILITY_REQUEST_SCHEMA.missing_fields(data)
+    if missing_fields:
+        return {"error": f"Missing required fields: {', '.join(missing_fields)}"}, 400
+
+    errors = ELIGIBILITY_REQUEST_SCHEMA.validate(data)
+    if errors:
+        return {"error": errors[0]}, 400
+    return None
+
+def eligibility_request_response(data, result):
+    """(body, status) of a valid POST request body, given the lookup_policy result"""
+    patient_id = data['patient_id']
+    insurance_id = data['insurance_id']
+    record, covered, reason = result
+    if reason == POLICY_NOT_FOUND:
+        return not_found_response(patient_id, insurance_id, POLICY_NOT_FOUND), 200
+
+    if (record is None or
+        str(record.get('first_name', '')).lower() != data['first_name'].lower() or
+        str(record.get('last_name', '')).lower() != data['last_name'].lower() or
+        record.get('date_of_birth') != data['date_of_birth']):
+        return not_found_response(patient_id, insurance_id, "Patient information does not match insurance record"), 200
+
+    return eligibility_response(patient_id, insurance_id, record, covered, reason, data.get('service_date')), 200
+
+def verify_eligibility_request(data):
+    """
+    Verify one eligibility request body (POST semantics).
+    Returns the response body and HTTP status code.
+    """
+    error = eligibility_request_error(data)
+    if error:
+        return error
+    result = lookup_policy(data['patient_id'], data['insurance_id'], data.get('service_date'))
+    return eligibility_request_response(data, result)
+
+@insurance.route('/api/insurance/eligibility', methods=['POST'])
 def post_eligibility():
     try:
         data = request.get_json()
         if not data:
             return jsonify({"error": "Request body is required"}), 400
 
-        required_fields = ['patient_id', 'insurance_id', 'first_name', 'last_name', 'date_of_birth']
-        missing_fields = [field for field in required_fields if field not in data or not data[field]]
-        if missing_fields:
-            return jsonify({"error": f"Missing required fields: {', '.join(missing_fields)}"}), 400
+        body, status = verify_eligibility_request(data)
+        return jsonify(body), status
 
-        patient_id = data['patient_id']
-        insurance_id = data['insurance_id']
-        service_date = data.get('service_date')
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        if not validate_date(data['date_of_birth']):
-            return jsonify({"error": "Invalid date_of_birth format. Use YYYY-MM-DD"}), 400
-        if service_date and not validate_date(service_date):
+@insurance.route('/api/insurance/coverage', methods=['GET'])
+def get_coverage():
+    try:
+        patient_id = request.args.get('patient_id')
+        service_date = request.args.get('service_date')
+        if not patient_id or not service_date:
+            return jsonify({"error": "patient_id and service_date are required"}), 400
+        day = parse_date(service_date)
+        if day is None:
             return jsonify({"error": "Invalid service_date format. Use YYYY-MM-DD"}), 400
 
-        if insurance_id not in insurance_db:
-            return jsonify({
-                "patient_id": patient_id,
-                "insurance_id": insurance_id,
-                "eligibility_status": "not_found",
-                "coverage_details": {},
-                "message": "Insurance policy not found"
-            }), 200
-
-        record = insurance_db[insurance_id]
-        if (record['patient_id'] != patient_id or
-            record['first_name'].lower() != data['first_name'].lower() or
-            record['last_name'].lower() != data['last_name'].lower() or
-            record['date_of_birth'] != data['date_of_birth']):
-            return jsonify({
-                "patient_id": patient_id,
-                "insurance_id": insurance_id,
-                "eligibility_status": "not_found",
-                "coverage_details": {},
-                "message": "Patient information does not match insurance record"
-            }), 200
-
+        # The patient's policies in force on the day, primary coverage first
+        policies = []
+        with timed(STORE_LATENCY, 'insurance', 'policies_for'):
+            for insurance_id, record, interval in insurance_db.policies_for(patient_id):
+                if coverage_decision(record, interval, day)[0]:
+                    policies.append({
+                        "insurance_id": insurance_id,
+                        "coverage_level": record.get('coverage_level', 'primary'),
+                        "coverage_details": record.get('coverage_details', {})
+                    })
         return jsonify({
             "patient_id": patient_id,
-            "insurance_id": insurance_id,
-            "eligibility_status": record['eligibility_status'],
-            "coverage_details": record['coverage_details'],
-            "message": "Eligibility verified successfully"
+            "service_date": service_date,
+            "covered": bool(policies),
+            "policies": policies
         }), 200
 
     except Exception as e:
         print(f"Error: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
 
+def iter_ndjson(stream):
+    """Yield one parsed object per NDJSON line, or None for lines that are not valid JSON"""
+    # Read line by line so large uploads are never held in memory at once
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None
+
+def read_batch_items():
+    """Return an iterator over the batch items of the current request (JSON array or NDJSON)"""
+    if request.mimetype == NDJSON_MIMETYPE:
+        return iter_ndjson(request.stream)
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        raise ValueError("Request body must be a JSON array of eligibility requests")
+    return iter(data)
+
+def verify_batch_item(index, item):
+    """Verify one batch item, reporting failures as a per-item error instead of aborting the batch"""
+    try:
+        if not isinstance(item, dict):
+            return {"index": index, "status": 400, "error": "Each request must be a JSON object"}
+        body, status = verify_eligibility_request(item)
+        return {"index": index, "status": status, **body}
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return {"index": index, "status": 500, "error": "Internal server error"}
+
+@insurance.route('/api/insurance/eligibility/batch', methods=['POST'])
+def post_eligibility_batch():
+    try:
+        items = read_batch_items()
+        streamed = request.args.get('stream') == 'true' or request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+        if streamed:
+            # One result per line, written as soon as each item is verified
+            def generate():
+                for index, item in enumerate(items):
+                    yield json.dumps(verify_batch_item(index, item)) + "\n"
+            return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+        results = []
+        for index, item in enumerate(items):
+            if index >= MAX_BATCH_SIZE:
+                return jsonify({
+                    "error": f"Batch exceeds {MAX_BATCH_SIZE} requests. Use ?stream=true for larger batches"
+                }), 413
+            results.append(verify_batch_item(index, item))
+
+        failed = sum(1 for result in results if result['status'] != 200)
+        return jsonify({
+            "results": results,
+            "total": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed
+        }), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+# Standalone insurance service; wsgi.create_app serves every service from one app
+app = Flask(__name__)
+app.register_blueprint(insurance)
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
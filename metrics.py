@@ -0,0 +1,265 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters, gauges and histograms are kept per label set; recording a sample takes one
+dict lookup and one uncontended lock, so it is cheap enough for every request. init_app
+adds request latency, in-flight and error metrics to a Flask app and serves /metrics.
+
+Each process keeps its own metrics: under several gunicorn workers a scrape of
+/metrics reports the worker that answered it.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from flask import Blueprint, Flask, Response, g, request
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds, from cached lookups up to slow upstream calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (sample name suffix, labels, value) as produced by the metric children
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+    def samples(self) -> List[Sample]:
+        return [('', (), self.value)]
+
+
+class _GaugeChild(_CounterChild):
+    def dec(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self._lock = threading.Lock()
+        self.buckets = buckets
+        # Per-bucket counts (not cumulative); the last one counts values above every bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        samples = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + [float('inf')], counts):
+            cumulative += count
+            samples.append(('_bucket', (('le', _format_value(bound)),), cumulative))
+        samples.append(('_sum', (), total))
+        samples.append(('_count', (), cumulative))
+        return samples
+
+
+class Metric:
+    """A named metric with one child per combination of label values"""
+
+    def __init__(self, kind: str, name: str, documentation: str, labelnames: Sequence[str], new_child: Callable):
+        self.kind = kind
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._new_child = new_child
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = new_child()
+
+    def labels(self, *values: str):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def expose(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for values, child in sorted(self._children.copy().items()):
+            for suffix, extra, value in child.samples():
+                labels = tuple(zip(self.labelnames, values)) + extra
+                text = ','.join(f'{key}="{_escape(str(label))}"' for key, label in labels)
+                yield f"{self.name}{suffix}{{{text}}} {_format_value(value)}" if text else \
+                    f"{self.name}{suffix} {_format_value(value)}"
+
+
+class Registry:
+    """The metrics of one process, plus collectors that read values kept elsewhere at scrape time"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[str]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Modules that are imported again (e.g. by tests) get the metric they created before
+                if existing.kind != metric.kind or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered differently")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(Metric('counter', name, documentation, labelnames, _CounterChild))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Metric:
+        return self._register(Metric('gauge', name, documentation, labelnames, _GaugeChild))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Metric:
+        buckets = tuple(sorted(buckets))
+        return self._register(Metric('histogram', name, documentation, labelnames,
+                                     lambda: _HistogramChild(buckets)))
+
+    def add_collector(self, collector: Callable[[], Iterable[str]]) -> None:
+        """collector() returns exposition lines; it runs on every scrape"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def get(self, name: str) -> Metric:
+        return self._metrics[name]
+
+    def exposition(self) -> str:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self._collectors)
+        lines = [line for metric in metrics for line in metric.expose()]
+        for collector in collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'http_request_duration_seconds', "Time spent handling requests", ('method', 'endpoint'))
+REQUESTS = REGISTRY.counter(
+    'http_requests_total', "Requests handled, by status code", ('method', 'endpoint', 'status'))
+REQUEST_ERRORS = REGISTRY.counter(
+    'http_request_errors_total', "Requests that failed with a 5xx status or an unhandled exception",
+    ('method', 'endpoint'))
+REQUESTS_IN_FLIGHT = REGISTRY.gauge(
+    'http_requests_in_flight', "Requests currently being handled", ('method', 'endpoint'))
+STORE_LATENCY = REGISTRY.histogram(
+    'store_operation_duration_seconds', "Time spent in repository operations", ('store', 'operation'))
+ELIGIBILITY_LATENCY = REGISTRY.histogram(
+    'eligibility_check_duration_seconds', "Time spent checking eligibility, by where the result came from",
+    ('source',))
+
+
+def timed(metric: Metric, *labels: str):
+    """Context manager recording the duration of its block in a histogram"""
+    return metric.labels(*labels).time()
+
+
+def register_cache(name: str, cache) -> None:
+    """Expose a cache with a stats() method (e.g. EligibilityCache) as <name>_* metrics"""
+    def collect() -> List[str]:
+        stats = cache.stats()
+        lookups = stats['hits'] + stats['misses']
+        lines = []
+        for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+            lines += [f"# TYPE {name}_{key}_total counter", f"{name}_{key}_total {stats[key]}"]
+        lines += [f"# TYPE {name}_entries gauge", f"{name}_entries {stats['size']}",
+                  f"# TYPE {name}_hit_ratio gauge",
+                  f"{name}_hit_ratio {_format_value(stats['hits'] / lookups if lookups else 0.0)}"]
+        return lines
+    REGISTRY.add_collector(collect)
+
+
+metrics_blueprint = Blueprint('metrics', __name__)
+
+
+@metrics_blueprint.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(REGISTRY.exposition(), content_type=CONTENT_TYPE)
+
+
+def _endpoint() -> str:
+    # The route pattern (e.g. /api/availability) keeps the number of label values bounded
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+def _before_request() -> None:
+    g.metrics_started = time.perf_counter()
+    g.metrics_labels = (request.method, _endpoint())
+    REQUESTS_IN_FLIGHT.labels(*g.metrics_labels).inc()
+
+
+def _record(status: int) -> None:
+    labels = g.metrics_labels
+    REQUEST_LATENCY.labels(*labels).observe(time.perf_counter() - g.pop('metrics_started'))
+    REQUESTS.labels(*labels, str(status)).inc()
+    if status >= 500:
+        REQUEST_ERRORS.labels(*labels).inc()
+
+
+def _after_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(error) -> None:
+    labels = g.pop('metrics_labels', None)
+    if labels is None:
+        return
+    # after_request does not run when an exception propagates out of the app
+    if 'metrics_started' in g:
+        g.metrics_labels = labels
+        _record(500)
+    REQUESTS_IN_FLIGHT.labels(*labels).dec()
+
+
+def init_app(app: Flask) -> None:
+    """Record request metrics for every route of app and serve them at /metrics"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(metrics_blueprint)
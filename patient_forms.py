@@ -1,9 +1,9 @@
 from flask import Flask, request, jsonify
 import tkinter as tk
 from tkinter import messagebox
-import requests
 import threading
-import json
+from api_client import ApiClient
+from validation import INSURANCE_FORM_SCHEMA, PATIENT_FORM_SCHEMA
 
 app = Flask(__name__)
 
@@ -11,7 +11,7 @@ app = Flask(__name__)
 @app.route('/api/patient/register', methods=['POST'])
 def register_patient():
     data = request.get_json()
-    if not all(key in data for key in ['first_name', 'last_name', 'dob', 'email']):
+    if PATIENT_FORM_SCHEMA.missing_fields(data):
         return jsonify({'error': 'Missing required fields'}), 400
     # Mock successful registration
     return jsonify({'message': 'Patient registered successfully', 'patient_id': '12345'}), 201
@@ -19,7 +19,7 @@ def register_patient():
 @app.route('/api/insurance/verify', methods=['POST'])
 def verify_insurance():
     data = request.get_json()
-    if not all(key in data for key in ['provider', 'policy_number']):
+    if INSURANCE_FORM_SCHEMA.missing_fields(data):
         return jsonify({'error': 'Missing required fields'}), 400
     # Mock insurance verification
     if data['policy_number'].startswith('POL'):
@@ -32,6 +32,9 @@ class PatientApp:
         self.root = root
         self.root.title("Patient Management System")
         self.base_url = "http://localhost:5000/api"
+        # Pooled keep-alive session; requests run off the UI thread
+        self.client = ApiClient(self.base_url, root)
+        self.root.protocol("WM_DELETE_WINDOW", self.close)
 
         # Patient Registration Form
         tk.Label(root, text="Patient Registration").grid(row=0, column=0, columnspan=2, pady=10)
@@ -66,34 +69,39 @@ class PatientApp:
             'dob': self.dob.get(),
             'email': self.email.get()
         }
-        if not all(data.values()):
+        if PATIENT_FORM_SCHEMA.missing_fields(data):
             messagebox.showerror("Error", "All fields are required")
             return
-        try:
-            response = requests.post(f"{self.base_url}/patient/register", json=data)
-            if response.status_code == 201:
-                messagebox.showinfo("Success", response.json()['message'])
-            else:
-                messagebox.showerror("Error", response.json().get('error', 'Registration failed'))
-        except requests.RequestException as e:
-            messagebox.showerror("Error", f"Network error: {str(e)}")
+        self.client.post("/patient/register", self.on_registration_response, self.on_network_error, json=data)
+
+    def on_registration_response(self, response):
+        if response.status_code == 201:
+            messagebox.showinfo("Success", response.json()['message'])
+        else:
+            messagebox.showerror("Error", response.json().get('error', 'Registration failed'))
 
     def verify_insurance(self):
         data = {
             'provider': self.provider.get(),
             'policy_number': self.policy_number.get()
         }
-        if not all(data.values()):
+        if INSURANCE_FORM_SCHEMA.missing_fields(data):
             messagebox.showerror("Error", "All fields are required")
             return
-        try:
-            response = requests.post(f"{self.base_url}/insurance/verify", json=data)
-            if response.status_code == 200:
-                messagebox.showinfo("Success", response.json()['message'])
-            else:
-                messagebox.showerror("Error", response.json().get('error', 'Verification failed'))
-        except requests.RequestException as e:
-            messagebox.showerror("Error", f"Network error: {str(e)}")
+        self.client.post("/insurance/verify", self.on_verification_response, self.on_network_error, json=data)
+
+    def on_verification_response(self, response):
+        if response.status_code == 200:
+            messagebox.showinfo("Success", response.json()['message'])
+        else:
+            messagebox.showerror("Error", response.json().get('error', 'Verification failed'))
+
+    def on_network_error(self, error):
+        messagebox.showerror("Error", f"Network error: {str(error)}")
+
+    def close(self):
+        self.client.close()
+        self.root.destroy()
 
 # Run Flask server in a separate thread
 def run_flask():
@@ -0,0 +1,145 @@
+"""
+Bulk patient import from CSV or NDJSON files.
+
+Records are streamed in batches, validated column-wise against the same schema as
+POST /register and written batch by batch, so memory use stays constant regardless of
+file size. Rows that fail validation or duplicate an existing patient are reported and
+skipped without aborting the import.
+
+Usage: DATABASE_PATH=hospital.db python patient_import.py FILE [--format csv|ndjson] [--batch-size N]
+(without DATABASE_PATH the patients only live in memory for the duration of the run)
+"""
+import argparse
+import csv
+import io
+import json
+import sys
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+from validation import REGISTRATION_SCHEMA
+
+REQUIRED_FIELDS = REGISTRATION_SCHEMA.required_names
+
+DEFAULT_BATCH_SIZE = 500
+
+# Only the first errors are kept in the report; the rest are just counted
+MAX_REPORTED_ERRORS = 1000
+
+Row = Tuple[int, Optional[Dict], Optional[str]]
+
+
+def registration_error(data: Dict) -> Optional[str]:
+    """Return the first registration validation error for data, if any"""
+    errors = REGISTRATION_SCHEMA.validate(data)
+    return errors[0] if errors else None
+
+
+def build_patient_record(data: Dict) -> Dict:
+    return {field: data[field] for field in REQUIRED_FIELDS}
+
+
+def iter_ndjson_rows(lines: Iterable) -> Iterator[Row]:
+    """Yield (row number, record, error) for each non-empty line of an NDJSON stream"""
+    for number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield number, None, "Invalid JSON"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "Each line must be a JSON object"
+        else:
+            yield number, record, None
+
+
+def iter_csv_rows(text_stream: Iterable[str]) -> Iterator[Row]:
+    """Yield (row number, record, error) for each data row of a CSV stream with a header row"""
+    reader = csv.DictReader(text_stream)
+    for number, record in enumerate(reader, start=2):
+        # Columns missing from a short row count as missing fields, like absent JSON keys
+        yield number, {key: value for key, value in record.items() if key is not None and value is not None}, None
+
+
+def import_patients(rows: Iterable[Row], patients, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict:
+    """
+    Validate rows and store valid patients through patients.add_many_if_unique in batches.
+    Each batch of rows is validated column-wise (see batch_validation); rows duplicating a
+    registered patient's email, id_number or insurance_number are reported as errors.
+    Returns a report with imported/failed counts and per-row errors.
+    """
+    # Imported here so services that never import files do not load numpy
+    from batch_validation import first_errors
+
+    report = {"imported": 0, "failed": 0, "errors": []}
+    chunk = []
+
+    def fail(number, error):
+        report["failed"] += 1
+        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+            report["errors"].append({"row": number, "error": error})
+
+    def flush():
+        errors = iter(first_errors(REGISTRATION_SCHEMA, [record for _, record, error in chunk if error is None]))
+        batch, numbers, failures = [], [], []
+        for number, record, error in chunk:
+            if error is None:
+                error = next(errors)
+            if error is not None:
+                failures.append((number, error))
+            else:
+                batch.append(build_patient_record(record))
+                numbers.append(number)
+        if batch:
+            # Rows matching an existing patient (or an earlier row) are rejected like POST /register does
+            for number, (patient_id, duplicates) in zip(numbers, patients.add_many_if_unique(batch)):
+                if duplicates:
+                    failures.append((number, "Patient already registered "
+                                             f"(duplicate fields: {', '.join(sorted(duplicates))})"))
+                else:
+                    report["imported"] += 1
+        for number, error in sorted(failures):
+            fail(number, error)
+        chunk.clear()
+
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= batch_size:
+            flush()
+    if chunk:
+        flush()
+    return report
+
+
+def iter_rows(binary_stream, file_format: str) -> Iterator[Row]:
+    """Rows from a binary stream in 'csv' or 'ndjson' format"""
+    if file_format == 'csv':
+        return iter_csv_rows(io.TextIOWrapper(binary_stream, encoding='utf-8', newline=''))
+    if file_format == 'ndjson':
+        return iter_ndjson_rows(binary_stream)
+    raise ValueError(f"Unsupported format: {file_format}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import patients from a CSV or NDJSON file")
+    parser.add_argument('file', help="CSV file with a header row, or NDJSON file with one patient per line")
+    parser.add_argument('--format', choices=['csv', 'ndjson'],
+                        help="File format (default: guessed from the file extension)")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    from repository import get_repository
+
+    file_format = args.format or ('csv' if args.file.lower().endswith('.csv') else 'ndjson')
+    with open(args.file, 'rb') as f:
+        report = import_patients(iter_rows(f, file_format), get_repository().patients, args.batch_size)
+    print(json.dumps(report, indent=2))
+    return 0 if report["failed"] == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""
+Hash indexes for patient duplicate detection.
+
+Exact duplicates are found by normalized email, id_number and insurance_number.
+Near-duplicates are found through a blocking key built from the normalized name and
+date of birth: records sharing a key are candidates for review, found without a scan.
+"""
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Set
+
+UNIQUE_FIELDS = ('email', 'id_number', 'insurance_number')
+INDEXED_FIELDS = UNIQUE_FIELDS + ('name_key',)
+
+_NON_LETTERS = re.compile(r'[^a-z]+')
+_REPEATED_LETTERS = re.compile(r'(.)\1+')
+_IDENTIFIER_SEPARATORS = re.compile(r'[\s\-./]+')
+
+
+def normalize_email(value: Optional[str]) -> Optional[str]:
+    if not value or '@' not in value:
+        return None
+    return value.strip().lower()
+
+
+def normalize_identifier(value: Optional[str]) -> Optional[str]:
+    """Identifiers compare without case, whitespace or separators (e.g. "ab-123 4" == "AB1234")"""
+    if value is None:
+        return None
+    value = _IDENTIFIER_SEPARATORS.sub('', str(value)).upper()
+    return value or None
+
+
+def normalize_name(value: Optional[str]) -> str:
+    """Lowercase ASCII letters only, with accents dropped and repeated letters collapsed"""
+    if not value:
+        return ''
+    value = unicodedata.normalize('NFKD', value).encode('ascii', 'ignore').decode('ascii').lower()
+    return _REPEATED_LETTERS.sub(r'\1', _NON_LETTERS.sub('', value))
+
+
+def blocking_key(record: Dict) -> Optional[str]:
+    """Key shared by records that are likely the same person (name order does not matter)"""
+    names = sorted(filter(None, (normalize_name(record.get('first_name')), normalize_name(record.get('last_name')))))
+    if not names:
+        return None
+    date_of_birth = record.get('date_of_birth', record.get('dob')) or ''
+    return f"{' '.join(names)}|{date_of_birth}"
+
+
+def index_keys(record: Dict) -> Dict[str, Optional[str]]:
+    """Normalized values of the indexed fields of a patient record"""
+    # Registrations without an email field may carry one in contact_info
+    email = record.get('email') or record.get('contact_info')
+    return {
+        'email': normalize_email(email if isinstance(email, str) else None),
+        'id_number': normalize_identifier(record.get('id_number')),
+        'insurance_number': normalize_identifier(record.get('insurance_number')),
+        'name_key': blocking_key(record)
+    }
+
+
+class PatientIndex:
+    """In-memory hash indexes from normalized field values to patient_ids"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._indexes: Dict[str, Dict[str, Set[str]]] = {field: {} for field in INDEXED_FIELDS}
+
+    def add(self, patient_id: str, record: Dict) -> None:
+        for field, key in index_keys(record).items():
+            if key is not None:
+                self._indexes[field].setdefault(key, set()).add(patient_id)
+
+    def load(self, patient_ids: List[str], keys: Dict[str, List[Optional[str]]]) -> None:
+        """Index many records from precomputed keys: keys[field][n] is the key of patient_ids[n]"""
+        for field, column in keys.items():
+            index = self._indexes[field]
+            for patient_id, key in zip(patient_ids, column):
+                if key is not None:
+                    ids = index.get(key)
+                    if ids is None:
+                        index[key] = {patient_id}
+                    else:
+                        ids.add(patient_id)
+
+    def remove(self, patient_id: str, record: Dict) -> None:
+        for field, key in index_keys(record).items():
+            ids = self._indexes[field].get(key)
+            if ids is not None:
+                ids.discard(patient_id)
+                if not ids:
+                    del self._indexes[field][key]
+
+    def duplicates(self, record: Dict, exclude: Iterable[str] = ()) -> Dict[str, str]:
+        """Map each unique field of record that is already in use to a patient_id using it"""
+        keys = index_keys(record)
+        found = {}
+        for field in UNIQUE_FIELDS:
+            ids = self._indexes[field].get(keys[field], set()) - set(exclude)
+            if ids:
+                found[field] = min(ids)
+        return found
+
+    def similar(self, record: Dict) -> List[str]:
+        """patient_ids sharing the record's name and date of birth blocking key"""
+        key = blocking_key(record)
+        return sorted(self._indexes['name_key'].get(key, ())) if key else []
+
+    def clear(self) -> None:
+        for index in self._indexes.values():
+            index.clear()
@@ -1,6 +1,33 @@
 import tkinter as tk
 from tkinter import messagebox
-import re
+from repository import get_repository
+from validation import PATIENT_SCHEMA, REGISTRATION_FORM_SCHEMA
+
+class PatientRegistration:
+    """Registration logic behind the form: validation, duplicate checks and saving"""
+    def __init__(self, patients=None):
+        self.patients = patients if patients is not None else get_repository().patients
+
+    def check_email_exists(self, email):
+        """Constant-time lookup in the normalized email index"""
+        return 'email' in self.patients.find_duplicates({'email': email})
+
+    def validate(self, data):
+        """Return an error message for the patient data, or None if it is valid"""
+        errors = PATIENT_SCHEMA.validate(data)
+        return " ".join(errors) if errors else None
+
+    def register_patient(self, data):
+        error = self.validate(data)
+        if error:
+            return {"success": False, "message": error}
+        if self.check_email_exists(data['email']):
+            return {"success": False, "message": "Email already in use."}
+        # add_if_unique re-checks atomically in case another registration raced this one
+        patient_id, duplicates = self.patients.add_if_unique(dict(data))
+        if duplicates:
+            return {"success": False, "message": "Email already in use."}
+        return {"success": True, "message": "Patient registered successfully.", "patient_id": patient_id}
 
 class PatientRegistrationApp:
     def __init__(self, root):
@@ -52,7 +79,7 @@ class PatientRegistrationApp:
         tk.Entry(main_frame, textvariable=self.form_data['email']).pack(fill="x", pady=2)
         
         # Phone
-        tk.Label(main_frame, text="Phone Number (10 digits) *").pack(anchor="w")
+        tk.Label(main_frame, text="Phone Number (10-15 digits) *").pack(anchor="w")
         tk.Entry(main_frame, textvariable=self.form_data['phone']).pack(fill="x", pady=2)
         
         # Address
@@ -78,31 +105,14 @@ class PatientRegistrationApp:
         tk.Button(main_frame, text="Submit Registration", command=self.validate_and_submit, bg="#4f46e5", fg="white", pady=5).pack(pady=20)
     
     def validate_and_submit(self):
-        errors = []
-        
-        # Validation rules
-        if not self.form_data['first_name'].get().strip():
-            errors.append("First Name is required")
-        if not self.form_data['last_name'].get().strip():
-            errors.append("Last Name is required")
-        if not re.match(r"^\d{4}-\d{2}-\d{2}$", self.form_data['dob'].get()):
-            errors.append("Date of Birth must be in YYYY-MM-DD format")
-        if not re.match(r"^[^\s@]+@[^\s@]+\.[^\s@]+$", self.form_data['email'].get()):
-            errors.append("Valid Email is required")
-        if not re.match(r"^\d{10}$", self.form_data['phone'].get()):
-            errors.append("Phone Number must be 10 digits")
-        if not self.form_data['address'].get().strip():
-            errors.append("Address is required")
-        if not self.form_data['insurance_provider'].get().strip():
-            errors.append("Insurance Provider is required")
-        if not self.form_data['policy_number'].get().strip():
-            errors.append("Policy Number is required")
+        data = {key: var.get() for key, var in self.form_data.items()}
+        errors = REGISTRATION_FORM_SCHEMA.validate(data, collect_all=True)
         
         if errors:
             messagebox.showerror("Validation Error", "\n".join(errors))
         else:
             messagebox.showinfo("Success", "Registration submitted successfully!")
-            print("Form Data:", {key: var.get() for key, var in self.form_data.items()})
+            print("Form Data:", data)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,115 @@
+"""
+Insurance coverage windows as ordinal date intervals.
+
+A policy covers the days from its effective date through its expiration date, both
+inclusive. The dates are parsed once into date ordinals, so "is the policy in force on
+day D" is two integer comparisons. Records may give the window as
+coverage_details.effective_date/expiration_date, as start_date/end_date (see
+Database-Schema.markdown) or as expiry_date (InsuranceVerifier records); a missing bound
+leaves that side of the window open.
+
+A patient can hold a primary and a secondary policy; coverage_level in the record
+("primary" or "secondary", primary by default) orders them.
+"""
+from datetime import date
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from appointment_store import CANCELLED
+from validation import parse_date
+
+# (first covered day, last covered day) as date ordinals
+Interval = Tuple[int, int]
+
+OPEN_START = date.min.toordinal()
+OPEN_END = date.max.toordinal()
+
+COVERAGE_LEVELS = ('primary', 'secondary')
+
+NOT_ACTIVE = "Insurance is not active"
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(value: Optional[str]) -> Optional[int]:
+    """Ordinal of a YYYY-MM-DD date, or None if value is missing or not a date"""
+    day = parse_date(value)
+    return day.toordinal() if day is not None else None
+
+
+def coverage_dates(record: Dict) -> Tuple[Optional[str], Optional[str]]:
+    """The (effective, expiration) dates a policy record gives, as stored; None if it gives none"""
+    details = record.get('coverage_details')
+    if not isinstance(details, dict):
+        details = {}
+    return (details.get('effective_date', record.get('start_date')),
+            details.get('expiration_date', record.get('end_date', record.get('expiry_date'))))
+
+
+def coverage_interval(record: Dict) -> Interval:
+    """The days a policy record covers"""
+    start, end = (date_ordinal(value) for value in coverage_dates(record))
+    return (OPEN_START if start is None else start, OPEN_END if end is None else end)
+
+
+def coverage_rank(record: Dict) -> int:
+    """0 for primary, 1 for secondary coverage"""
+    level = record.get('coverage_level', 'primary')
+    return COVERAGE_LEVELS.index(level) if level in COVERAGE_LEVELS else len(COVERAGE_LEVELS)
+
+
+def coverage_decision(record: Dict, interval: Interval, day: Optional[date]) -> Tuple[bool, str]:
+    """
+    (covered, reason) for a policy on day. Without a day only the stored
+    eligibility_status is checked, as before service dates were evaluated.
+    """
+    if record.get('eligibility_status') != 'active':
+        return False, NOT_ACTIVE
+    if day is None:
+        return True, "Insurance is active"
+    ordinal = day.toordinal()
+    start, end = interval
+    if ordinal < start:
+        return False, f"Coverage starts on {date.fromordinal(start).isoformat()}"
+    if ordinal > end:
+        return False, f"Coverage ended on {date.fromordinal(end).isoformat()}"
+    return True, f"Covered on {day.isoformat()}"
+
+
+def lapsed_appointments(appointments: Iterable[Dict], insurance, start: date) -> List[Dict]:
+    """
+    Active appointments on or after start whose insurance does not cover their date, in one pass.
+    An appointment is checked against the policy it was booked with (insurance_id), or
+    against all of the patient's policies if it has none. insurance is an insurance table
+    (see repository.py). Returns one entry per lapsed appointment, ordered by date and time.
+    """
+    first = start.toordinal()
+    lapsed = []
+    for appointment in appointments:
+        if appointment.get('status') == CANCELLED:
+            continue
+        ordinal = date_ordinal(appointment['date'])
+        if ordinal is None or ordinal < first:
+            continue
+        day = date.fromordinal(ordinal)
+        insurance_id = appointment.get('insurance_id')
+        if insurance_id is not None:
+            found = insurance.coverage(insurance_id)
+            candidates = [found] if found is not None else []
+        else:
+            candidates = [(record, interval) for _, record, interval in insurance.policies_for(appointment['patient_id'])]
+        reason = "Insurance policy not found"
+        for record, interval in candidates:
+            covered, reason = coverage_decision(record, interval, day)
+            if covered:
+                break
+        else:
+            lapsed.append({
+                "appointment_id": appointment['appointment_id'],
+                "patient_id": appointment['patient_id'],
+                "insurance_id": insurance_id,
+                "date": appointment['date'],
+                "time": appointment['time'],
+                "reason": reason
+            })
+    lapsed.sort(key=lambda entry: (entry['date'], entry['time']))
+    return lapsed
@@ -0,0 +1,898 @@
+"""
+Shared storage for patients, insurance policies and appointments.
+
+Every service reads and writes through a Repository, so all of them see the same data.
+The in-memory backend is used by default and in tests; setting DATABASE_PATH switches to
+a SQLite database in WAL mode that several worker processes can share. Setting JOURNAL_DIR
+keeps the in-memory backend but makes it durable with a write-ahead journal and snapshots
+(see journal.py), for a single worker process.
+"""
+import gc
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from appointment_store import CANCELLED, AppointmentStore, slot_index, slot_time
+from policy_coverage import Interval, coverage_interval, coverage_rank
+from journal import (DEFAULT_SNAPSHOT_EVERY, SNAPSHOT_FILE, Journal, TableJournal, read_snapshot, replay,
+                     write_snapshot)
+from patient_index import INDEXED_FIELDS, UNIQUE_FIELDS, PatientIndex, index_keys
+
+# Sample policies loaded into an empty store (previously duplicated in each API module)
+SAMPLE_INSURANCE = {
+    "INS456": {
+        "patient_id": "P123",
+        "first_name": "John",
+        "last_name": "Doe",
+        "date_of_birth": "1980-01-01",
+        "eligibility_status": "active",
+        "coverage_details": {
+            "plan_name": "Gold Plan",
+            "effective_date": "2024-01-01",
+            "expiration_date": "2025-12-31",
+            "copay": 20,
+            "deductible": 500
+        }
+    },
+    "INS789": {
+        "patient_id": "P456",
+        "first_name": "Jane",
+        "last_name": "Smith",
+        "date_of_birth": "1990-05-15",
+        "eligibility_status": "inactive",
+        "coverage_details": {
+            "plan_name": "Silver Plan",
+            "effective_date": "2023-01-01",
+            "expiration_date": "2024-06-30",
+            "copay": 30,
+            "deductible": 1000
+        }
+    }
+}
+
+# Tables from Database-Schema.markdown. IDs are TEXT because the services use string IDs
+# (e.g. "P123", "INS456"), and the full record is kept as JSON next to the indexed columns.
+# Patient email, id_number and insurance_number columns hold normalized values (see patient_index).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    patient_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    first_name TEXT,
+    last_name TEXT,
+    date_of_birth TEXT,
+    email TEXT,
+    id_number TEXT,
+    insurance_number TEXT,
+    name_key TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_patients_email ON patients (email);
+CREATE INDEX IF NOT EXISTS idx_patients_id_number ON patients (id_number);
+CREATE INDEX IF NOT EXISTS idx_patients_insurance_number ON patients (insurance_number);
+CREATE INDEX IF NOT EXISTS idx_patients_name_key ON patients (name_key);
+
+-- coverage_start/coverage_end: the policy's coverage window as date ordinals (see policy_coverage.py)
+CREATE TABLE IF NOT EXISTS insurance (
+    policy_number TEXT PRIMARY KEY,
+    patient_id TEXT,
+    record TEXT NOT NULL,
+    coverage_start INTEGER,
+    coverage_end INTEGER,
+    -- Changes on every write, so other workers can tell their cached eligibility is stale
+    version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_insurance_patient ON insurance (patient_id);
+
+CREATE TABLE IF NOT EXISTS appointments (
+    appointment_id TEXT PRIMARY KEY,
+    patient_id TEXT NOT NULL,
+    doctor_id TEXT NOT NULL,
+    appointment_date TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_appointments_patient ON appointments (patient_id);
+-- Cancelled appointments keep their row but not their slot (replaces idx_appointments_doctor_date)
+DROP INDEX IF EXISTS idx_appointments_doctor_date;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_appointments_slot ON appointments (doctor_id, appointment_date, slot)
+    WHERE status != 'cancelled';
+
+-- Idempotency-Key responses shared by all workers (see idempotency.py); status is NULL while running
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    method TEXT NOT NULL,
+    route TEXT NOT NULL,
+    client TEXT NOT NULL,
+    key TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status INTEGER,
+    body BLOB,
+    content_type TEXT,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (method, route, client, key)
+);
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys (expires_at);
+
+-- Slot availability changes published by every worker (see availability_feed.py); booked and
+-- released are JSON arrays of times, date is NULL for schedule changes
+CREATE TABLE IF NOT EXISTS availability_changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    doctor_id TEXT NOT NULL,
+    date TEXT,
+    booked TEXT NOT NULL,
+    released TEXT NOT NULL
+);
+-- Tokens of the feed are only valid for this database
+CREATE TABLE IF NOT EXISTS availability_feed_epoch (
+    epoch TEXT NOT NULL
+);
+
+-- Waitlist entries (see waitlist.py); first_day and last_day are date ordinals, and an
+-- entry is being offered a slot by some worker until offered_until
+CREATE TABLE IF NOT EXISTS waitlist (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    waitlist_id TEXT NOT NULL UNIQUE,
+    patient_id TEXT NOT NULL,
+    doctor_id TEXT,
+    specialty TEXT,
+    first_day INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    priority INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    offered_until REAL,
+    appointment_id TEXT,
+    last_skipped TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_waitlist_doctor ON waitlist (doctor_id, status, priority DESC, seq);
+CREATE INDEX IF NOT EXISTS idx_waitlist_specialty ON waitlist (specialty, status, priority DESC, seq);
+"""
+
+
+class InMemoryPatientTable:
+    """
+    Patient records keyed by a generated patient_id, with duplicate-detection indexes.
+    With a journal, changes are recorded under the table lock and are durable before returning.
+    """
+
+    def __init__(self, journal=None):
+        self._index = PatientIndex()
+        self._lock = self._index.lock
+        self._ids = itertools.count(1)
+        self._records: Dict[str, Dict] = {}
+        self.journal = journal
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self) -> Iterator[Dict]:
+        return iter(list(self._records.values()))
+
+    def _record(self, *entry) -> Optional[int]:
+        return self.journal.record(*entry) if self.journal is not None else None
+
+    def _commit(self, seq: Optional[int]) -> None:
+        if seq is not None:
+            self.journal.commit(seq)
+
+    def _insert(self, record: Dict) -> Tuple[str, Optional[int]]:
+        patient_id = str(next(self._ids))
+        record = {**record, "patient_id": patient_id}
+        seq = self._record('put', patient_id, record)
+        self._records[patient_id] = record
+        self._index.add(patient_id, record)
+        return patient_id, seq
+
+    def add(self, record: Dict) -> str:
+        """Store a new patient and return its patient_id"""
+        with self._lock:
+            patient_id, seq = self._insert(record)
+        self._commit(seq)
+        return patient_id
+
+    def add_many(self, records: List[Dict]) -> List[str]:
+        """Store several new patients in one batch and return their patient_ids"""
+        with self._lock:
+            inserted = [self._insert(record) for record in records]
+        # One commit makes the whole batch durable
+        if inserted:
+            self._commit(inserted[-1][1])
+        return [patient_id for patient_id, _ in inserted]
+
+    def add_if_unique(self, record: Dict) -> Tuple[Optional[str], Dict[str, str]]:
+        """
+        Atomically store a patient unless its email, id_number or insurance_number is in use.
+        Returns (patient_id, {}) on success or (None, {field: existing patient_id}).
+        """
+        with self._lock:
+            duplicates = self._index.duplicates(record)
+            if duplicates:
+                return None, duplicates
+            patient_id, seq = self._insert(record)
+        self._commit(seq)
+        return patient_id, {}
+
+    def add_many_if_unique(self, records: List[Dict]) -> List[Tuple[Optional[str], Dict[str, str]]]:
+        """add_if_unique for each record of a batch, under one lock and one commit"""
+        results = []
+        seq = None
+        with self._lock:
+            for record in records:
+                duplicates = self._index.duplicates(record)
+                if duplicates:
+                    results.append((None, duplicates))
+                    continue
+                patient_id, seq = self._insert(record)
+                results.append((patient_id, {}))
+        self._commit(seq)
+        return results
+
+    def find_duplicates(self, record: Dict, exclude_id: Optional[str] = None) -> Dict[str, str]:
+        with self._lock:
+            return self._index.duplicates(record, exclude=[exclude_id] if exclude_id else [])
+
+    def find_similar(self, record: Dict) -> List[Dict]:
+        """Possible duplicates of record: patients with the same normalized name and date of birth"""
+        with self._lock:
+            return [self._records[patient_id] for patient_id in self._index.similar(record)]
+
+    def get(self, patient_id: str) -> Optional[Dict]:
+        return self._records.get(patient_id)
+
+    def update(self, patient_id: str, record: Dict) -> bool:
+        with self._lock:
+            if patient_id not in self._records:
+                return False
+            record = {**record, "patient_id": patient_id}
+            seq = self._record('put', patient_id, record)
+            self._put(patient_id, record)
+        self._commit(seq)
+        return True
+
+    def delete(self, patient_id: str) -> Optional[Dict]:
+        with self._lock:
+            if patient_id not in self._records:
+                return None
+            seq = self._record('del', patient_id)
+            record = self._records.pop(patient_id)
+            self._index.remove(patient_id, record)
+        self._commit(seq)
+        return record
+
+    def clear(self) -> None:
+        with self._lock:
+            seq = self._record('clear')
+            self._records.clear()
+            self._index.clear()
+        self._commit(seq)
+
+    def _put(self, patient_id: str, record: Dict) -> None:
+        previous = self._records.get(patient_id)
+        if previous is not None:
+            self._index.remove(patient_id, previous)
+        self._records[patient_id] = record
+        self._index.add(patient_id, record)
+
+    def dump(self) -> Dict:
+        """Every patient and its index keys (one list per indexed field), for a snapshot"""
+        with self._lock:
+            records = list(self._records.values())
+            # Kept so that the ids of deleted patients are not handed out again
+            next_id = next(self._ids)
+            self._ids = itertools.count(next_id)
+        # Normalizing here (outside the lock) saves loading the snapshot from doing it
+        keys = [index_keys(record) for record in records]
+        return {"records": records, "keys": {field: [k[field] for k in keys] for field in INDEXED_FIELDS},
+                "next_id": next_id}
+
+    def load(self, snapshot: Dict) -> None:
+        """Fill an empty table from a snapshot"""
+        with self._lock:
+            patient_ids = [record['patient_id'] for record in snapshot["records"]]
+            self._records.update(zip(patient_ids, snapshot["records"]))
+            self._index.load(patient_ids, snapshot["keys"])
+            ids = [int(patient_id) for patient_id in self._records if patient_id.isdigit()]
+            self._ids = itertools.count(max(max(ids, default=0) + 1, snapshot["next_id"]))
+
+    def apply(self, op: str, patient_id: Optional[str] = None, record: Optional[Dict] = None) -> None:
+        """Redo a journaled change during recovery; new patient_ids continue after the recovered ones"""
+        with self._lock:
+            if op == 'put':
+                self._put(patient_id, record)
+                if patient_id.isdigit():
+                    self._ids = itertools.count(max(int(patient_id) + 1, next(self._ids)))
+            elif op == 'del':
+                previous = self._records.pop(patient_id, None)
+                if previous is not None:
+                    self._index.remove(patient_id, previous)
+            elif op == 'clear':
+                self._records.clear()
+                self._index.clear()
+            else:
+                raise ValueError(f"Unknown journal operation: {op}")
+
+
+class InMemoryInsuranceTable(MutableMapping):
+    """
+    Insurance records keyed by policy number, indexed by patient_id.
+    Each policy's coverage window is parsed when it is stored (see policy_coverage.py).
+    """
+
+    def __init__(self, journal=None):
+        self._records: Dict[str, Dict] = {}
+        self._by_patient: Dict[str, set] = {}
+        # policy_number -> (coverage interval, coverage rank)
+        self._coverage: Dict[str, Tuple[Interval, int]] = {}
+        self._lock = threading.Lock()
+        self.journal = journal
+
+    def __getitem__(self, policy_number: str) -> Dict:
+        return self._records[policy_number]
+
+    def __setitem__(self, policy_number: str, record: Dict) -> None:
+        with self._lock:
+            seq = self.journal.record('put', policy_number, record) if self.journal is not None else None
+            self._put(policy_number, record)
+        if seq is not None:
+            self.journal.commit(seq)
+
+    def __delitem__(self, policy_number: str) -> None:
+        with self._lock:
+            if policy_number not in self._records:
+                raise KeyError(policy_number)
+            seq = self.journal.record('del', policy_number) if self.journal is not None else None
+            self._unindex(policy_number)
+            del self._records[policy_number]
+        if seq is not None:
+            self.journal.commit(seq)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._records))
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def for_patient(self, patient_id: str) -> List[Dict]:
+        """All policies held by a patient"""
+        return [self._records[number] for number in sorted(self._by_patient.get(patient_id, ()))]
+
+    def coverage(self, policy_number: str) -> Optional[Tuple[Dict, Interval]]:
+        """(record, coverage interval) of a policy, or None if there is no such policy"""
+        record = self._records.get(policy_number)
+        coverage = self._coverage.get(policy_number)
+        if record is None or coverage is None:
+            return None
+        return record, coverage[0]
+
+    def policies_for(self, patient_id: str) -> List[Tuple[str, Dict, Interval]]:
+        """(policy_number, record, coverage interval) of a patient's policies, primary coverage first"""
+        numbers = sorted(self._by_patient.get(patient_id, ()),
+                         key=lambda number: (self._coverage[number][1], number))
+        return [(number, self._records[number], self._coverage[number][0]) for number in numbers]
+
+    def clear(self) -> None:
+        with self._lock:
+            seq = self.journal.record('clear') if self.journal is not None else None
+            self._records.clear()
+            self._by_patient.clear()
+            self._coverage.clear()
+        if seq is not None:
+            self.journal.commit(seq)
+
+    def _put(self, policy_number: str, record: Dict) -> None:
+        if policy_number in self._records:
+            self._unindex(policy_number)
+        self._records[policy_number] = record
+        self._by_patient.setdefault(record.get('patient_id'), set()).add(policy_number)
+        self._coverage[policy_number] = (coverage_interval(record), coverage_rank(record))
+
+    def _unindex(self, policy_number: str) -> None:
+        self._coverage.pop(policy_number, None)
+        patient_id = self._records[policy_number].get('patient_id')
+        numbers = self._by_patient.get(patient_id, set())
+        numbers.discard(policy_number)
+        if not numbers:
+            self._by_patient.pop(patient_id, None)
+
+    def dump(self) -> List[list]:
+        """[policy_number, record] pairs, for a snapshot"""
+        with self._lock:
+            return [[policy_number, record] for policy_number, record in self._records.items()]
+
+    def load(self, rows: List[list]) -> None:
+        """Add the policies of a snapshot"""
+        with self._lock:
+            for policy_number, record in rows:
+                self._put(policy_number, record)
+
+    def apply(self, op: str, policy_number: Optional[str] = None, record: Optional[Dict] = None) -> None:
+        """Redo a journaled change during recovery"""
+        with self._lock:
+            if op == 'put':
+                self._put(policy_number, record)
+            elif op == 'del':
+                if policy_number in self._records:
+                    self._unindex(policy_number)
+                    del self._records[policy_number]
+            elif op == 'clear':
+                self._records.clear()
+                self._by_patient.clear()
+                self._coverage.clear()
+            else:
+                raise ValueError(f"Unknown journal operation: {op}")
+
+
+class SQLiteDatabase:
+    """A SQLite database in WAL mode with one connection per thread (and per process)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        # A connection inherited from the parent of a forked worker must not be reused
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+
+class SQLitePatientTable:
+    """Patient records stored in the patients table, with indexed normalized duplicate keys"""
+
+    _insert = ("INSERT INTO patients (first_name, last_name, date_of_birth, email, id_number, insurance_number,"
+               " name_key, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?)")
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    def __len__(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM patients").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        for patient_id, record in self.db.connection().execute(
+                "SELECT patient_id, record FROM patients ORDER BY patient_id"):
+            yield {**json.loads(record), "patient_id": str(patient_id)}
+
+    def add(self, record: Dict) -> str:
+        cursor = self.db.connection().execute(self._insert, self._columns(record))
+        return str(cursor.lastrowid)
+
+    def add_many(self, records: List[Dict]) -> List[str]:
+        """Insert several patients in a single transaction"""
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            patient_ids = [str(conn.execute(self._insert, self._columns(record)).lastrowid) for record in records]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return patient_ids
+
+    def add_if_unique(self, record: Dict) -> Tuple[Optional[str], Dict[str, str]]:
+        """Check for duplicates and insert in one write transaction, so concurrent workers cannot race"""
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            duplicates = self.find_duplicates(record)
+            patient_id = None if duplicates else str(conn.execute(self._insert, self._columns(record)).lastrowid)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return patient_id, duplicates
+
+    def add_many_if_unique(self, records: List[Dict]) -> List[Tuple[Optional[str], Dict[str, str]]]:
+        """add_if_unique for each record of a batch, in a single write transaction"""
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            results = []
+            for record in records:
+                duplicates = self.find_duplicates(record)
+                if duplicates:
+                    results.append((None, duplicates))
+                else:
+                    results.append((str(conn.execute(self._insert, self._columns(record)).lastrowid), {}))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return results
+
+    def find_duplicates(self, record: Dict, exclude_id: Optional[str] = None) -> Dict[str, str]:
+        keys = index_keys(record)
+        duplicates = {}
+        for field in UNIQUE_FIELDS:
+            if keys[field] is None:
+                continue
+            row = self.db.connection().execute(
+                f"SELECT patient_id FROM patients WHERE {field} = ? AND patient_id IS NOT ? LIMIT 1",
+                (keys[field], exclude_id)).fetchone()
+            if row:
+                duplicates[field] = str(row[0])
+        return duplicates
+
+    def find_similar(self, record: Dict) -> List[Dict]:
+        key = index_keys(record)['name_key']
+        if key is None:
+            return []
+        return [{**json.loads(data), "patient_id": str(patient_id)} for patient_id, data in self.db.connection().execute(
+            "SELECT patient_id, record FROM patients WHERE name_key = ? ORDER BY patient_id", (key,))]
+
+    def get(self, patient_id: str) -> Optional[Dict]:
+        row = self.db.connection().execute(
+            "SELECT record FROM patients WHERE patient_id = ?", (patient_id,)).fetchone()
+        return {**json.loads(row[0]), "patient_id": str(patient_id)} if row else None
+
+    def update(self, patient_id: str, record: Dict) -> bool:
+        cursor = self.db.connection().execute(
+            "UPDATE patients SET first_name = ?, last_name = ?, date_of_birth = ?, email = ?, id_number = ?,"
+            " insurance_number = ?, name_key = ?, record = ? WHERE patient_id = ?",
+            (*self._columns(record), patient_id)
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, patient_id: str) -> Optional[Dict]:
+        record = self.get(patient_id)
+        if record is not None:
+            self.db.connection().execute("DELETE FROM patients WHERE patient_id = ?", (patient_id,))
+        return record
+
+    def clear(self) -> None:
+        self.db.connection().execute("DELETE FROM patients")
+
+    @staticmethod
+    def _columns(record: Dict) -> tuple:
+        record = {k: v for k, v in record.items() if k != 'patient_id'}
+        keys = index_keys(record)
+        return (record.get('first_name'), record.get('last_name'), record.get('date_of_birth', record.get('dob')),
+                keys['email'], keys['id_number'], keys['insurance_number'], keys['name_key'], json.dumps(record))
+
+
+class SQLiteInsuranceTable(MutableMapping):
+    """
+    Insurance records stored in the insurance table, keyed by policy number. The coverage
+    window is parsed when a record is written and stored next to it, with a new version.
+    """
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+        self._add_columns()
+
+    def _add_columns(self) -> None:
+        # Databases created before the windows (or versions) were stored get the columns
+        conn = self.db.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(insurance)")}
+            if 'coverage_start' not in columns:
+                conn.execute("ALTER TABLE insurance ADD COLUMN coverage_start INTEGER")
+                conn.execute("ALTER TABLE insurance ADD COLUMN coverage_end INTEGER")
+                for policy_number, data in conn.execute("SELECT policy_number, record FROM insurance").fetchall():
+                    conn.execute("UPDATE insurance SET coverage_start = ?, coverage_end = ? WHERE policy_number = ?",
+                                 (*coverage_interval(json.loads(data)), policy_number))
+            if 'version' not in columns:
+                conn.execute("ALTER TABLE insurance ADD COLUMN version TEXT")
+                conn.execute("UPDATE insurance SET version = lower(hex(randomblob(16)))")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def __getitem__(self, policy_number: str) -> Dict:
+        row = self.db.connection().execute(
+            "SELECT record FROM insurance WHERE policy_number = ?", (policy_number,)).fetchone()
+        if row is None:
+            raise KeyError(policy_number)
+        return json.loads(row[0])
+
+    def __setitem__(self, policy_number: str, record: Dict) -> None:
+        self.db.connection().execute(
+            "INSERT OR REPLACE INTO insurance (policy_number, patient_id, record, coverage_start, coverage_end, version)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (policy_number, record.get('patient_id'), json.dumps(record), *coverage_interval(record), uuid.uuid4().hex)
+        )
+
+    def version(self, policy_number: str) -> Optional[str]:
+        """Changes whenever the record is written or deleted; None if there is no record"""
+        row = self.db.connection().execute(
+            "SELECT version FROM insurance WHERE policy_number = ?", (policy_number,)).fetchone()
+        return row[0] if row is not None else None
+
+    def __delitem__(self, policy_number: str) -> None:
+        cursor = self.db.connection().execute("DELETE FROM insurance WHERE policy_number = ?", (policy_number,))
+        if cursor.rowcount == 0:
+            raise KeyError(policy_number)
+
+    def __contains__(self, policy_number: object) -> bool:
+        return self.db.connection().execute(
+            "SELECT 1 FROM insurance WHERE policy_number = ?", (policy_number,)).fetchone() is not None
+
+    def __iter__(self) -> Iterator[str]:
+        rows = self.db.connection().execute("SELECT policy_number FROM insurance").fetchall()
+        return (policy_number for (policy_number,) in rows)
+
+    def __len__(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM insurance").fetchone()[0]
+
+    def for_patient(self, patient_id: str) -> List[Dict]:
+        return [json.loads(record) for (record,) in self.db.connection().execute(
+            "SELECT record FROM insurance WHERE patient_id = ? ORDER BY policy_number", (patient_id,))]
+
+    def coverage(self, policy_number: str) -> Optional[Tuple[Dict, Interval]]:
+        row = self.db.connection().execute(
+            "SELECT record, coverage_start, coverage_end FROM insurance WHERE policy_number = ?",
+            (policy_number,)).fetchone()
+        return (json.loads(row[0]), (row[1], row[2])) if row is not None else None
+
+    def policies_for(self, patient_id: str) -> List[Tuple[str, Dict, Interval]]:
+        policies = [(number, json.loads(data), (start, end)) for number, data, start, end in self.db.connection().execute(
+            "SELECT policy_number, record, coverage_start, coverage_end FROM insurance WHERE patient_id = ?",
+            (patient_id,))]
+        return sorted(policies, key=lambda policy: (coverage_rank(policy[1]), policy[0]))
+
+    def clear(self) -> None:
+        self.db.connection().execute("DELETE FROM insurance")
+
+
+class SQLiteAppointmentStore:
+    """
+    Appointments stored in the appointments table, with the same interface as AppointmentStore.
+    The unique (doctor_id, appointment_date, slot) index makes add() a compare-and-set across
+    every process using the database.
+    """
+
+    def __init__(self, db: SQLiteDatabase):
+        self.db = db
+
+    def __len__(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM appointments").fetchone()[0]
+
+    def __iter__(self) -> Iterator[Dict]:
+        rows = self.db.connection().execute("SELECT record FROM appointments").fetchall()
+        return (json.loads(record) for (record,) in rows)
+
+    def __contains__(self, appointment_id: str) -> bool:
+        return self.get(appointment_id) is not None
+
+    def get(self, appointment_id: str) -> Optional[Dict]:
+        row = self.db.connection().execute(
+            "SELECT record FROM appointments WHERE appointment_id = ?", (appointment_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def booked_mask(self, doctor_id: str, date: str) -> int:
+        mask = 0
+        for (index,) in self.db.connection().execute(
+                "SELECT slot FROM appointments WHERE doctor_id = ? AND appointment_date = ? AND status != ?",
+                (doctor_id, date, CANCELLED)):
+            mask |= 1 << index
+        return mask
+
+    def is_booked(self, doctor_id: str, date: str, time: str) -> bool:
+        return bool(self.booked_mask(doctor_id, date) >> slot_index(time) & 1)
+
+    def booked_times(self, doctor_id: str, date: str) -> List[str]:
+        return [slot_time(index) for (index,) in self.db.connection().execute(
+            "SELECT slot FROM appointments WHERE doctor_id = ? AND appointment_date = ? AND status != ? ORDER BY slot",
+            (doctor_id, date, CANCELLED))]
+
+    def for_patient(self, patient_id: str) -> List[Dict]:
+        rows = self.db.connection().execute(
+            "SELECT record FROM appointments WHERE patient_id = ?", (patient_id,)).fetchall()
+        return sorted((json.loads(record) for (record,) in rows), key=lambda a: (a['date'], a['time']))
+
+    def day_appointments(self, doctor_id: str, date: str, after: int = -1,
+                         limit: Optional[int] = None) -> List[Dict]:
+        rows = self.db.connection().execute(
+            "SELECT record FROM appointments WHERE doctor_id = ? AND appointment_date = ? AND status != ?"
+            " AND slot > ? ORDER BY slot LIMIT ?",
+            (doctor_id, date, CANCELLED, after, -1 if limit is None else limit)).fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def add(self, appointment: Dict) -> bool:
+        try:
+            self.db.connection().execute(
+                "INSERT INTO appointments VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (appointment['appointment_id'], appointment['patient_id'], appointment['doctor_id'],
+                 appointment['date'], slot_index(appointment['time']), appointment['status'],
+                 json.dumps(appointment))
+            )
+            return True
+        except sqlite3.IntegrityError:
+            return False
+
+    def _replace(self, current: Dict, updated: Dict) -> bool:
+        # Compare-and-set on the stored record, so a concurrent change is never overwritten
+        cursor = self.db.connection().execute(
+            "UPDATE appointments SET doctor_id = ?, appointment_date = ?, slot = ?, status = ?, record = ?"
+            " WHERE appointment_id = ? AND record = ?",
+            (updated['doctor_id'], updated['date'], slot_index(updated['time']), updated['status'],
+             json.dumps(updated), current['appointment_id'], json.dumps(current))
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, appointment_id: str) -> Optional[Dict]:
+        while True:
+            appointment = self.get(appointment_id)
+            if appointment is None or appointment.get('status') == CANCELLED:
+                return None
+            cancelled = {**appointment, 'status': CANCELLED}
+            if self._replace(appointment, cancelled):
+                return cancelled
+
+    def reschedule(self, appointment_id: str, doctor_id: str, date: str, time: str) -> Optional[Dict]:
+        # One UPDATE moves the row, so the unique slot index claims the new slot and frees the old one together
+        while True:
+            appointment = self.get(appointment_id)
+            if appointment is None or appointment.get('status') == CANCELLED:
+                raise KeyError(appointment_id)
+            updated = {**appointment, 'doctor_id': doctor_id, 'date': date, 'time': time}
+            try:
+                if self._replace(appointment, updated):
+                    return updated
+            except sqlite3.IntegrityError:
+                return None
+
+    def remove(self, appointment_id: str) -> Optional[Dict]:
+        appointment = self.get(appointment_id)
+        if appointment is None:
+            return None
+        cursor = self.db.connection().execute(
+            "DELETE FROM appointments WHERE appointment_id = ?", (appointment_id,))
+        return appointment if cursor.rowcount == 1 else None
+
+    def clear(self) -> None:
+        self.db.connection().execute("DELETE FROM appointments")
+
+
+class Repository:
+    """Patients, insurance policies and appointments behind one storage backend"""
+
+    def __init__(self, patients, insurance, appointments):
+        self.patients = patients
+        self.insurance = insurance
+        self.appointments = appointments
+
+    def clear(self) -> None:
+        self.patients.clear()
+        self.insurance.clear()
+        self.appointments.clear()
+
+    def seed_sample_data(self) -> None:
+        """Load the sample insurance policies if no policies are stored yet"""
+        if len(self.insurance) == 0:
+            for policy_number, record in SAMPLE_INSURANCE.items():
+                self.insurance[policy_number] = record
+
+
+class InMemoryRepository(Repository):
+    """Stores kept in this process's memory: a single worker's, lost on restart"""
+
+    def __init__(self):
+        super().__init__(InMemoryPatientTable(), InMemoryInsuranceTable(), AppointmentStore())
+
+
+class JournaledRepository(InMemoryRepository):
+    """
+    In-memory stores made durable by a write-ahead journal and snapshots kept in directory.
+    Opening it loads the latest snapshot and replays the journal written after it; a new
+    snapshot is taken in the background every snapshot_every journal entries.
+    """
+
+    TABLES = ('patients', 'insurance', 'appointments')
+
+    def __init__(self, directory: str, snapshot_every: int = DEFAULT_SNAPSHOT_EVERY, sync: bool = True):
+        super().__init__()
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self._snapshot_lock = threading.Lock()
+        last_seq = self._recover()
+        self.journal = Journal(directory, last_seq, sync=sync, snapshot_every=snapshot_every,
+                               on_snapshot=self.snapshot)
+        for name in self.TABLES:
+            getattr(self, name).journal = TableJournal(self.journal, name)
+
+    def _recover(self) -> int:
+        # Recovery only allocates objects that stay alive; collecting while it runs just repeatedly
+        # scans the growing tables (about a third of the load time at a million records)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            last_seq, sections = read_snapshot(os.path.join(self.directory, SNAPSHOT_FILE))
+            for name, rows in sections.items():
+                getattr(self, name).load(rows)
+            for last_seq, (name, *change) in replay(self.directory, after=last_seq):
+                getattr(self, name).apply(*change)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        return last_seq
+
+    def snapshot(self) -> int:
+        """
+        Write a snapshot of every table and delete the journal segments it replaces.
+        Writers are not blocked: changes made while the tables are copied are also in the
+        new journal segment, and replaying them over the snapshot gives the same state.
+        """
+        with self._snapshot_lock:
+            seq = self.journal.rotate()
+            sections = {name: getattr(self, name).dump() for name in self.TABLES}
+            # Whatever the copies saw must be durable before the snapshot can replace the journal
+            self.journal.commit(self.journal.last_seq)
+            write_snapshot(os.path.join(self.directory, SNAPSHOT_FILE), seq, sections)
+            self.journal.discard_through(seq)
+        return seq
+
+    def close(self) -> None:
+        self.journal.close()
+
+
+class SQLiteRepository(Repository):
+    def __init__(self, path: str):
+        self.db = SQLiteDatabase(path)
+        super().__init__(SQLitePatientTable(self.db), SQLiteInsuranceTable(self.db), SQLiteAppointmentStore(self.db))
+
+
+def create_repository(database_path: Optional[str] = None, journal_dir: Optional[str] = None) -> Repository:
+    """
+    Create a SQLite repository if a database path is given, otherwise an in-memory one,
+    journaled to journal_dir if it is given
+    """
+    if database_path:
+        if journal_dir:
+            raise ValueError("A journal directory is only used with the in-memory stores")
+        return SQLiteRepository(database_path)
+    if journal_dir:
+        return JournaledRepository(journal_dir)
+    return InMemoryRepository()
+
+
+_repository: Optional[Repository] = None
+_repository_settings: Optional[Tuple[Optional[str], Optional[str]]] = None
+_repository_lock = threading.Lock()
+
+
+def configure_repository(database_path: Optional[str] = None, journal_dir: Optional[str] = None) -> Repository:
+    """
+    Create the process-wide repository from explicit settings (see create_repository).
+    Calling it again with the same settings returns the existing repository.
+    """
+    global _repository, _repository_settings
+    settings = (database_path or None, journal_dir or None)
+    with _repository_lock:
+        if _repository is None:
+            _repository = create_repository(*settings)
+            _repository.seed_sample_data()
+            if isinstance(_repository, JournaledRepository):
+                # Under preload_app this is the gunicorn master: seeding took the journal, and
+                # workers forked while it holds the lock could never write
+                _repository.journal.close()
+            _repository_settings = settings
+        elif settings != _repository_settings:
+            raise RuntimeError("The repository has already been created with different settings")
+        return _repository
+
+
+def get_repository() -> Repository:
+    """
+    The process-wide repository shared by all services.
+    Unless configure_repository ran first, it is configured by DATABASE_PATH (SQLite, shared
+    by all workers) and JOURNAL_DIR (durable in-memory); without either it is in memory.
+    """
+    with _repository_lock:
+        if _repository is not None:
+            return _repository
+    return configure_repository(os.environ.get('DATABASE_PATH'), os.environ.get('JOURNAL_DIR'))
@@ -0,0 +1,47 @@
+"""
+Earliest free appointment slots across many doctors.
+
+Each doctor's free slots are produced in time order from per-day slot bitmaps (lowest
+set bit first, so fully booked days cost one mask check), and the doctors' streams are
+merged through a heap. Finding the first N openings therefore only looks at as many
+days and slots as it needs, however many doctors and days are searched.
+"""
+import heapq
+from datetime import date, timedelta
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+# (day, slot index, doctor_id)
+Opening = Tuple[date, int, str]
+
+
+def iter_free_slots(free_mask: Callable[[date], int], start: date, end: date,
+                    first_index: int = 0) -> Iterator[Tuple[date, int]]:
+    """(day, slot index) of every free slot from start (at or after first_index) to end, in time order"""
+    day = start
+    allowed = -1 << first_index
+    while day <= end:
+        mask = free_mask(day) & allowed
+        while mask:
+            lowest = mask & -mask
+            yield day, lowest.bit_length() - 1
+            mask ^= lowest
+        day += timedelta(days=1)
+        allowed = -1
+
+
+def _openings(doctor_id: str, free_mask: Callable[[str, date], int], start: date, end: date,
+              first_index: int) -> Iterator[Opening]:
+    for day, index in iter_free_slots(lambda d: free_mask(doctor_id, d), start, end, first_index):
+        yield day, index, doctor_id
+
+
+def earliest_openings(doctor_ids: Iterable[str], free_mask: Callable[[str, date], int], start: date, end: date,
+                      first_index: int = 0, limit: int = 5) -> List[Opening]:
+    """
+    The first limit free slots over all doctors between start (from slot first_index) and end.
+    free_mask(doctor_id, day) returns the bitmap of free slots of that doctor on that day.
+    Ties at the same time are ordered by doctor_id.
+    """
+    streams = [_openings(doctor_id, free_mask, start, end, first_index) for doctor_id in doctor_ids]
+    return list(islice(heapq.merge(*streams), limit))
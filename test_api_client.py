@@ -0,0 +1,73 @@
+import threading
+import unittest
+from werkzeug.serving import make_server
+import patient_forms
+from api_client import ApiClient
+
+class TestApiClient(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = make_server('127.0.0.1', 0, patient_forms.app, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/api"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.client = ApiClient(self.base_url)
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_callbacks_run_on_calling_thread(self):
+        results = []
+        record = lambda response: results.append((response.status_code, threading.current_thread()))
+        data = {'first_name': 'John', 'last_name': 'Doe', 'dob': '1990-01-01', 'email': 'john@example.com'}
+        futures = [self.client.post("/patient/register", record, json=data) for _ in range(5)]
+        for future in futures:
+            future.result(timeout=10)
+        # Nothing runs until the owner thread drains the queue
+        self.assertEqual(results, [])
+        self.assertEqual(self.client.process_completed(), 5)
+        self.assertEqual(results, [(201, threading.current_thread())] * 5)
+
+    def test_failing_callback_does_not_drop_later_ones(self):
+        results = []
+
+        def fail(response):
+            raise ValueError("not JSON")
+
+        for callback in (fail, lambda response: results.append(response.status_code)):
+            self.client.get("/doctors", callback).result(timeout=10)
+        with self.assertLogs('api_client', level='ERROR'):
+            self.assertEqual(self.client.process_completed(), 2)
+        self.assertEqual(len(results), 1)
+
+    def test_poller_reschedules_after_errors(self):
+        class Root:
+            scheduled = []
+
+            def after(self, delay, callback):
+                self.scheduled.append(callback)
+
+        client = ApiClient(self.base_url, root=Root())
+        client.process_completed = lambda: 1 / 0
+        with self.assertRaises(ZeroDivisionError):
+            client._poll()
+        self.assertEqual(len(Root.scheduled), 2)
+        client.close()
+
+    def test_network_errors_reach_error_callback(self):
+        client = ApiClient("http://127.0.0.1:9", retries=0)
+        errors = []
+        future = client.get("/doctors", lambda response: None, errors.append)
+        with self.assertRaises(Exception):
+            future.result(timeout=10)
+        client.process_completed()
+        self.assertEqual(len(errors), 1)
+        client.close()
+
+if __name__ == '__main__':
+    unittest.main()
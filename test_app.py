@@ -0,0 +1,41 @@
+import unittest
+import app
+
+PATIENT = {
+    "first_name": "John",
+    "last_name": "Doe",
+    "id_number": "1001",
+    "insurance_number": "INS456",
+    "contact_info": "john@example.com"
+}
+
+class TestRegisterPatient(unittest.TestCase):
+    def setUp(self):
+        app.patients_db.clear()
+        self.client = app.app.test_client()
+
+    def tearDown(self):
+        app.patients_db.clear()
+
+    def test_register_and_reject_duplicate(self):
+        response = self.client.post('/register', json=PATIENT)
+        self.assertEqual(response.status_code, 201)
+        response = self.client.post('/register', json={**PATIENT, "id_number": "1002",
+                                                       "contact_info": " JOHN@example.com"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.get_json()["duplicate_fields"], ["email", "insurance_number"])
+
+    def test_near_duplicate_is_flagged(self):
+        first = self.client.post('/register', json=PATIENT).get_json()
+        second = self.client.post('/register', json={**PATIENT, "first_name": "john ", "id_number": "1002",
+                                                     "insurance_number": "INS789", "contact_info": "555-0100"})
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.get_json()["possible_duplicates"], [first["patient_id"]])
+
+    def test_missing_field(self):
+        response = self.client.post('/register', json={"first_name": "John"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Missing field: last_name")
+
+if __name__ == '__main__':
+    unittest.main()
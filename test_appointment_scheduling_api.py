@@ -0,0 +1,270 @@
+import threading
+from datetime import date
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import appointment_scheduling_api as api
+from doctor_schedule import Schedule
+from insurance_verification_api import update_insurance_record
+from waitlist import Waitlist
+
+BOOKING = {
+    "patient_id": "P123",
+    "insurance_id": "INS456",
+    "doctor_id": "D001",
+    "date": "2025-06-02",
+    "time": "09:00"
+}
+
+class TestAppointmentSchedulingApi(unittest.TestCase):
+    def setUp(self):
+        api.appointments_db.clear()
+        # The sample policy ends in 2025, so waitlist entries are dated then and must not expire
+        api.waitlist = Waitlist(today=lambda: date(2025, 6, 1))
+        self.client = api.app.test_client()
+
+    def tearDown(self):
+        api.appointments_db.clear()
+        api.doctors_db.set_schedule("D002", api.default_schedule)
+
+    def set_d002_schedule(self):
+        api.doctors_db.set_schedule("D002", Schedule.from_config({
+            "slot_minutes": 15,
+            "hours": {"mon": [["08:00", "09:00"]]},
+            "holidays": ["2025-06-09"]
+        }))
+
+    def test_availability_follows_doctor_schedule(self):
+        self.set_d002_schedule()
+        response = self.client.get('/api/availability?doctor_id=D002&date=2025-06-02')
+        self.assertEqual(response.get_json()["available_slots"], ["08:00", "08:15", "08:30", "08:45"])
+        response = self.client.get('/api/availability?doctor_id=D002&date=2025-06-09')
+        self.assertEqual(response.get_json()["available_slots"], [])
+
+        response = self.client.post('/api/appointments', json=dict(BOOKING, doctor_id="D002", time="09:00"))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()["error"], "Invalid time slot")
+        response = self.client.post('/api/appointments', json=dict(BOOKING, doctor_id="D002", time="08:15"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_availability_range_unions_schedules(self):
+        self.set_d002_schedule()
+        response = self.client.get('/api/availability/range?doctor_ids=D001,D002&start=2025-06-02&end=2025-06-02')
+        body = response.get_json()
+        self.assertEqual(body["slots"][:5], ["08:00", "08:15", "08:30", "08:45", "09:00"])
+        self.assertEqual(body["availability"]["D001"][0], "0000" + "1" * 16)
+        self.assertEqual(body["availability"]["D002"][0], "1111" + "0" * 16)
+
+    def test_booked_slot_is_unavailable(self):
+        response = self.client.post('/api/appointments', json=BOOKING)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/api/availability?doctor_id=D001&date=2025-06-02')
+        self.assertNotIn("09:00", response.get_json()["available_slots"])
+        self.assertIn("09:30", response.get_json()["available_slots"])
+
+    def test_availability_range_grid(self):
+        self.client.post('/api/appointments', json=BOOKING)
+        response = self.client.get(
+            '/api/availability/range?doctor_ids=D001,D002&start=2025-06-01&end=2025-06-03')
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual(body["dates"], ["2025-06-01", "2025-06-02", "2025-06-03"])
+        self.assertEqual(sorted(body["availability"]), ["D001", "D002"])
+        self.assertEqual(body["availability"]["D001"][1], "0" + "1" * 15)
+        self.assertEqual(body["availability"]["D002"][1], "1" * 16)
+        self.assertIsNone(body["next_start"])
+
+    def test_availability_range_pages_and_filters(self):
+        response = self.client.get(
+            '/api/availability/range?specialty=Cardiology&start=2025-06-01&end=2025-06-10&page_days=7')
+        body = response.get_json()
+        self.assertEqual(list(body["availability"]), ["D002"])
+        self.assertEqual(len(body["dates"]), 7)
+        self.assertEqual(body["next_start"], "2025-06-08")
+
+    def test_availability_range_rejects_unknown_doctor(self):
+        response = self.client.get('/api/availability/range?doctor_ids=D999&start=2025-06-01&end=2025-06-01')
+        self.assertEqual(response.status_code, 400)
+
+    def test_next_available_skips_booked_and_past_slots(self):
+        for time in ("16:00", "16:30"):
+            self.client.post('/api/appointments', json={**BOOKING, "doctor_id": "D002", "time": time})
+        response = self.client.get(
+            '/api/appointments/next-available?specialty=Cardiology&after=2025-06-02T15:45&limit=2')
+        self.assertEqual(response.status_code, 200)
+        openings = [(o["doctor_id"], o["date"], o["time"]) for o in response.get_json()["openings"]]
+        self.assertEqual(openings, [("D002", "2025-06-03", "09:00"), ("D002", "2025-06-03", "09:30")])
+
+    def test_next_available_merges_doctors_in_time_order(self):
+        response = self.client.get('/api/appointments/next-available?after=2025-06-02T16:10&limit=4')
+        openings = [(o["doctor_id"], o["date"], o["time"]) for o in response.get_json()["openings"]]
+        self.assertEqual(openings, [("D001", "2025-06-02", "16:30"), ("D002", "2025-06-02", "16:30"),
+                                    ("D003", "2025-06-02", "16:30"), ("D001", "2025-06-03", "09:00")])
+        response = self.client.get('/api/appointments/next-available?specialty=Dermatology')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/appointments/next-available?after=2025-06-02T9:00')
+        self.assertEqual(response.status_code, 400)
+
+    def test_coverage_lapses(self):
+        booked = self.client.post('/api/appointments', json=BOOKING).get_json()
+        original = api.insurance_db["INS456"]
+        try:
+            update_insurance_record("INS456", {**original, "coverage_details": {
+                **original["coverage_details"], "expiration_date": "2025-05-31"}})
+            body = self.client.get('/api/appointments/coverage-lapses?start=2025-01-01').get_json()
+            self.assertEqual([(a["appointment_id"], a["reason"]) for a in body["lapsed"]],
+                             [(booked["appointment_id"], "Coverage ended on 2025-05-31")])
+            body = self.client.get('/api/appointments/coverage-lapses?start=2025-07-01').get_json()
+            self.assertEqual(body["lapsed"], [])
+        finally:
+            update_insurance_record("INS456", original)
+
+    def test_cancel_releases_slot_and_keeps_history(self):
+        booked = self.client.post('/api/appointments', json=BOOKING).get_json()
+        response = self.client.post(f'/api/appointments/{booked["appointment_id"]}/cancel')
+        self.assertEqual((response.status_code, response.get_json()["status"]), (200, "cancelled"))
+        self.assertEqual(self.client.post(f'/api/appointments/{booked["appointment_id"]}/cancel').status_code, 409)
+        self.assertEqual(self.client.post('/api/appointments/missing/cancel').status_code, 404)
+
+        self.assertEqual(self.client.post('/api/appointments', json=BOOKING).status_code, 200)
+        body = self.client.get('/api/appointments?patient_id=P123').get_json()
+        self.assertCountEqual([a["status"] for a in body["appointments"]], ["cancelled", "confirmed"])
+        body = self.client.get('/api/appointments?patient_id=P123&status=cancelled').get_json()
+        self.assertEqual([a["appointment_id"] for a in body["appointments"]], [booked["appointment_id"]])
+
+    def test_reschedule_moves_slot(self):
+        booked = self.client.post('/api/appointments', json=BOOKING).get_json()
+        other = self.client.post('/api/appointments', json=dict(BOOKING, time="10:00")).get_json()
+        url = f'/api/appointments/{booked["appointment_id"]}/reschedule'
+
+        response = self.client.post(url, json={"date": "2025-06-02", "time": "10:00"})
+        self.assertEqual(response.status_code, 409)
+        response = self.client.post(url, json={"date": "2026-06-02", "time": "09:00"})
+        self.assertEqual(response.get_json()["error"], "Coverage ended on 2025-12-31")
+        response = self.client.post(url, json={"date": "2025-06-03", "time": "11:00", "doctor_id": "D002"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f'/api/appointments/{booked["appointment_id"]}').get_json()["doctor_id"], "D002")
+
+        response = self.client.get('/api/availability?doctor_id=D001&date=2025-06-02')
+        self.assertIn("09:00", response.get_json()["available_slots"])
+        self.assertTrue(api.appointments_db.is_booked("D002", "2025-06-03", "11:00"))
+
+        self.client.post(f'/api/appointments/{other["appointment_id"]}/cancel')
+        response = self.client.post(f'/api/appointments/{other["appointment_id"]}/reschedule',
+                                    json={"date": "2025-06-02", "time": "11:00"})
+        self.assertEqual(response.status_code, 409)
+
+    def test_day_listing_pages_with_cursor(self):
+        for time in ("09:00", "09:30", "10:00", "10:30", "11:00"):
+            self.client.post('/api/appointments', json=dict(BOOKING, time=time))
+        url = '/api/appointments/day?doctor_id=D001&date=2025-06-02&limit=2'
+        times, cursor = [], None
+        while True:
+            body = self.client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+            times.append([a["time"] for a in body["appointments"]])
+            cursor = body["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(times, [["09:00", "09:30"], ["10:00", "10:30"], ["11:00"]])
+        self.assertEqual(self.client.get(url + '&cursor=9am').status_code, 400)
+
+    def test_changes_feed_publishes_bookings_and_cancellations(self):
+        token = self.client.get('/api/availability?doctor_id=D001&date=2025-06-02').get_json()["feed_token"]
+        booked = self.client.post('/api/appointments', json=BOOKING).get_json()
+        self.client.post('/api/appointments', json=dict(BOOKING, doctor_id="D002"))
+        self.client.post(f'/api/appointments/{booked["appointment_id"]}/reschedule',
+                         json={"date": "2025-06-02", "time": "10:00"})
+        self.client.post(f'/api/appointments/{booked["appointment_id"]}/cancel')
+
+        url = '/api/availability/changes?doctor_id=D001&date=2025-06-02&timeout=0&since='
+        body = self.client.get(url + token).get_json()
+        self.assertEqual([(c["booked"], c["released"]) for c in body["changes"]],
+                         [(["09:00"], []), (["10:00"], ["09:00"]), ([], ["10:00"])])
+        self.assertEqual(self.client.get(url + body["next"]).get_json()["changes"], [])
+        self.assertTrue(self.client.get(url + "stale.1").get_json()["reset"])
+
+        self.set_d002_schedule()
+        body = self.client.get('/api/availability/changes?doctor_id=D002&timeout=0&since=' + token).get_json()
+        self.assertEqual([c["type"] for c in body["changes"]], ["slots", "schedule"])
+
+    def test_changes_stream_resumes_from_last_event_id(self):
+        token = api.availability_feed.token()
+        self.client.post('/api/appointments', json=BOOKING)
+        response = self.client.get('/api/availability/stream?doctor_id=D001&date=2025-06-02',
+                                   headers={"Last-Event-ID": token})
+        self.assertEqual(response.mimetype, "text/event-stream")
+        chunks = iter(response.response)
+        self.assertEqual(next(chunks).decode(), "retry: 1000\n\n")
+        event = next(chunks).decode()
+        self.assertTrue(event.startswith(f"id: {api.availability_feed.token()}\nevent: availability\n"))
+        self.assertIn('"booked": ["09:00"]', event)
+        response.close()
+
+        response = self.client.get('/api/availability/stream?doctor_id=D001', headers={"Last-Event-ID": "stale.1"})
+        chunks = iter(response.response)
+        next(chunks).decode()
+        self.assertIn("event: reset", next(chunks).decode())
+        response.close()
+        self.assertEqual(self.client.get('/api/availability/stream?doctor_id=D999').status_code, 400)
+
+    def join_waitlist(self, **fields):
+        entry = {"patient_id": "P123", "insurance_id": "INS456", "doctor_id": "D001",
+                 "start_date": "2025-06-01", "end_date": "2025-06-30", **fields}
+        return self.client.post('/api/waitlist', json={k: v for k, v in entry.items() if v is not None})
+
+    def test_cancellation_backfills_from_waitlist(self):
+        original = api.insurance_db["INS456"]
+        update_insurance_record("INS900", {**original, "patient_id": "P900"})
+        update_insurance_record("INS901", {**original, "patient_id": "P901",
+                                               "coverage_details": {"expiration_date": "2025-05-31"}})
+        try:
+            booked = self.client.post('/api/appointments', json=BOOKING).get_json()
+            self.assertEqual(self.client.post('/api/appointments', json=dict(BOOKING, patient_id="P900", insurance_id="INS900")).status_code, 409)
+
+            response = self.join_waitlist(patient_id="P900", insurance_id="INS900", doctor_id=None,
+                                          specialty="General Practice")
+            self.assertEqual(response.status_code, 201)
+            waiting = response.get_json()
+            # Joining needs an active policy; the expired one is only caught when a slot is offered
+            urgent = self.join_waitlist(patient_id="P901", insurance_id="INS901", priority=5).get_json()
+            self.assertEqual([e["waitlist_id"] for e in self.client.get('/api/waitlist?doctor_id=D001').get_json()["entries"]],
+                             [urgent["waitlist_id"]])
+
+            body = self.client.post(f'/api/appointments/{booked["appointment_id"]}/cancel').get_json()
+            self.assertEqual(body["backfill"]["waitlist_id"], waiting["waitlist_id"])
+            self.assertTrue(api.appointments_db.is_booked("D001", "2025-06-02", "09:00"))
+            entry = self.client.get(f'/api/waitlist/{waiting["waitlist_id"]}').get_json()
+            self.assertEqual((entry["status"], entry["appointment_id"]), ("booked", body["backfill"]["appointment_id"]))
+            entry = self.client.get(f'/api/waitlist/{urgent["waitlist_id"]}').get_json()
+            self.assertEqual((entry["status"], entry["last_skipped"]["reason"]), ("waiting", "Coverage ended on 2025-05-31"))
+
+            self.assertEqual(self.client.delete(f'/api/waitlist/{urgent["waitlist_id"]}').status_code, 200)
+            self.assertEqual(self.client.delete(f'/api/waitlist/{urgent["waitlist_id"]}').status_code, 409)
+        finally:
+            del api.insurance_db["INS900"]
+            del api.insurance_db["INS901"]
+
+    def test_waitlist_validation(self):
+        self.assertEqual(self.join_waitlist(specialty="Cardiology").status_code, 400)
+        self.assertEqual(self.join_waitlist(doctor_id="D999").status_code, 400)
+        self.assertEqual(self.join_waitlist(end_date="2025-12-31").status_code, 400)
+        self.assertEqual(self.join_waitlist(patient_id="P456", insurance_id="INS789").get_json()["error"],
+                         "Insurance is not active")
+        self.assertEqual(self.client.get('/api/waitlist/missing').status_code, 404)
+
+    def test_parallel_bookings_of_one_slot_have_one_winner(self):
+        start = threading.Barrier(32)
+
+        def book(n):
+            client = api.app.test_client()
+            if n < 32:
+                start.wait()
+            return client.post('/api/appointments', json=BOOKING).status_code
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            statuses = list(pool.map(book, range(3000)))
+        self.assertEqual(statuses.count(200), 1)
+        self.assertEqual(statuses.count(409), len(statuses) - 1)
+        self.assertEqual(len(api.appointments_db), 1)
+
+if __name__ == '__main__':
+    unittest.main()
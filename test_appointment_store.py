@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from appointment_store import AppointmentStore, slot_index, slot_time
+from repository import SQLiteRepository
+
+def make_appointment(appointment_id, doctor_id="D001", date="2025-06-01", time="09:00"):
+    return {
+        "appointment_id": appointment_id,
+        "patient_id": "P123",
+        "doctor_id": doctor_id,
+        "date": date,
+        "time": time,
+        "status": "confirmed"
+    }
+
+class TestAppointmentStore(unittest.TestCase):
+    def setUp(self):
+        self.store = AppointmentStore()
+
+    def test_slot_index_round_trip(self):
+        self.assertEqual(slot_index("00:00"), 0)
+        self.assertEqual(slot_time(slot_index("16:30")), "16:30")
+
+    def test_add_marks_slot_booked(self):
+        self.assertTrue(self.store.add(make_appointment("A1")))
+        self.assertTrue(self.store.is_booked("D001", "2025-06-01", "09:00"))
+        self.assertFalse(self.store.is_booked("D001", "2025-06-01", "09:30"))
+        self.assertFalse(self.store.is_booked("D002", "2025-06-01", "09:00"))
+        self.assertEqual(self.store.get("A1")["time"], "09:00")
+        self.assertEqual(len(self.store), 1)
+
+    def test_conflicting_add_is_rejected(self):
+        self.store.add(make_appointment("A1"))
+        self.assertFalse(self.store.add(make_appointment("A2")))
+        self.assertNotIn("A2", self.store)
+        self.assertEqual(self.store.booked_times("D001", "2025-06-01"), ["09:00"])
+
+    def test_remove_releases_slot(self):
+        self.store.add(make_appointment("A1"))
+        self.store.add(make_appointment("A2", time="10:00"))
+        self.assertEqual(self.store.remove("A1")["appointment_id"], "A1")
+        self.assertFalse(self.store.is_booked("D001", "2025-06-01", "09:00"))
+        self.assertEqual(self.store.booked_times("D001", "2025-06-01"), ["10:00"])
+        self.assertIsNone(self.store.remove("A1"))
+
+    def test_cancel_keeps_record_and_frees_slot(self):
+        self.store.add(make_appointment("A1"))
+        self.assertEqual(self.store.cancel("A1")["status"], "cancelled")
+        self.assertIsNone(self.store.cancel("A1"))
+        self.assertTrue(self.store.add(make_appointment("A2")))
+        self.assertCountEqual([a["appointment_id"] for a in self.store.for_patient("P123")], ["A1", "A2"])
+        # Removing the cancelled record must not release the slot A2 now holds
+        self.store.remove("A1")
+        self.assertTrue(self.store.is_booked("D001", "2025-06-01", "09:00"))
+
+    def test_reschedule_is_all_or_nothing(self):
+        self.store.add(make_appointment("A1"))
+        self.store.add(make_appointment("A2", time="10:00"))
+        self.assertIsNone(self.store.reschedule("A1", "D001", "2025-06-01", "10:00"))
+        self.assertEqual(self.store.booked_times("D001", "2025-06-01"), ["09:00", "10:00"])
+        self.assertEqual(self.store.reschedule("A1", "D002", "2025-06-02", "09:00")["doctor_id"], "D002")
+        self.assertEqual(self.store.booked_times("D001", "2025-06-01"), ["10:00"])
+        self.assertEqual([a["appointment_id"] for a in self.store.day_appointments("D002", "2025-06-02")], ["A1"])
+        self.store.cancel("A2")
+        with self.assertRaises(KeyError):
+            self.store.reschedule("A2", "D001", "2025-06-01", "11:00")
+
+    def test_day_appointments_after_slot(self):
+        for n, time in enumerate(("09:00", "09:30", "10:00")):
+            self.store.add(make_appointment(f"A{n}", time=time))
+        page = self.store.day_appointments("D001", "2025-06-01", slot_index("09:00"), limit=1)
+        self.assertEqual([a["time"] for a in page], ["09:30"])
+
+    def test_concurrent_swaps_do_not_deadlock(self):
+        self.store.add(make_appointment("A1", date="2025-06-01"))
+        self.store.add(make_appointment("A2", date="2025-06-02"))
+
+        def move(n):
+            appointment_id, date = ("A1", "2025-06-02") if n % 2 else ("A2", "2025-06-01")
+            self.store.reschedule(appointment_id, "D001", date, f"{10 + n % 7:02d}:00")
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(move, range(400)))
+        self.assertEqual(len(self.store.booked_times("D001", "2025-06-01"))
+                         + len(self.store.booked_times("D001", "2025-06-02")), 2)
+
+class TestConcurrentBooking(unittest.TestCase):
+    attempts = 2000
+
+    def race(self, stores):
+        start = threading.Barrier(16)
+
+        def attempt(n):
+            if n < 16:
+                start.wait()
+            return stores[n % len(stores)].add(make_appointment(f"A{n}"))
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            return list(pool.map(attempt, range(self.attempts)))
+
+    def test_parallel_bookings_of_one_slot_have_one_winner(self):
+        store = AppointmentStore()
+        results = self.race([store])
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(len(store), 1)
+
+    def test_workers_sharing_a_database_have_one_winner(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "hospital.db")
+            # Each repository stands in for a separate worker process
+            workers = [SQLiteRepository(path).appointments for _ in range(4)]
+            results = self.race(workers)
+            self.assertEqual(results.count(True), 1)
+            self.assertEqual(len(workers[0]), 1)
+            self.assertTrue(workers[3].is_booked("D001", "2025-06-01", "09:00"))
+
+if __name__ == '__main__':
+    unittest.main()
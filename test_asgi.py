@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import io
+import json
+import unittest
+from datetime import date
+from urllib.parse import urlencode
+import appointment_scheduling_api as scheduling_api
+import benchmark_async
+import insurance_verification_api as insurance_api
+from asgi import AsyncServices
+from idempotency import idempotency_store
+from repository import get_repository
+from waitlist import Waitlist
+
+BOOKING = {
+    "patient_id": "P123",
+    "insurance_id": "INS456",
+    "doctor_id": "D001",
+    "date": "2025-06-02",
+    "time": "09:00"
+}
+
+async def call(app, method, path, query=None, body=None, headers=None):
+    """(status, headers, body) of one request to an ASGI app"""
+    scope = {'type': 'http', 'method': method, 'path': path,
+             'query_string': urlencode(query or {}).encode(),
+             'headers': [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()]}
+    messages = [{'type': 'http.request', 'body': body or b'', 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+    async def send(message):
+        sent.append(message)
+
+    await app(scope, receive, send)
+    start, response = sent
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, response['body']
+
+class TestAsgiApp(unittest.TestCase):
+    def setUp(self):
+        scheduling_api.appointments_db.clear()
+        scheduling_api.waitlist = Waitlist(today=lambda: date(2025, 6, 1))
+        insurance_api.eligibility_cache.clear()
+        idempotency_store.clear()
+        self.app = AsyncServices()
+        self.insurance_client = insurance_api.app.test_client()
+        self.scheduling_client = scheduling_api.app.test_client()
+
+    def tearDown(self):
+        scheduling_api.appointments_db.clear()
+        idempotency_store.clear()
+
+    def request(self, method, path, query=None, body=None, headers=None):
+        return asyncio.run(call(self.app, method, path, query, body, headers))
+
+    def assertSameResponse(self, client, method, path, query=None, data=None, content_type='application/json'):
+        body = json.dumps(data).encode() if data is not None else b''
+        flask_response = client.open(path, method=method, query_string=query, data=body, content_type=content_type)
+        insurance_api.eligibility_cache.clear()
+        status, headers, asgi_body = self.request(method, path, query, body, {'Content-Type': content_type})
+        self.assertEqual(status, flask_response.status_code, (method, path, query, data))
+        self.assertEqual(asgi_body, flask_response.get_data(), (method, path, query, data))
+        self.assertEqual(headers['content-type'], flask_response.content_type)
+
+    def test_eligibility_matches_flask(self):
+        for query in [{"patient_id": "P123", "insurance_id": "INS456"},
+                      {"patient_id": "P123", "insurance_id": "INS456", "service_date": "2025-06-02"},
+                      {"patient_id": "P123", "insurance_id": "INS456", "service_date": "2031-06-02"},
+                      {"patient_id": "P123", "insurance_id": "INS456", "service_date": "June 2nd"},
+                      {"patient_id": "P123", "insurance_id": "INS000"},
+                      {"patient_id": "P999", "insurance_id": "INS456"},
+                      {"patient_id": "P123"}]:
+            self.assertSameResponse(self.insurance_client, 'GET', '/api/insurance/eligibility', query)
+        for data in [{"patient_id": "P123", "insurance_id": "INS456", "first_name": "John", "last_name": "Doe",
+                      "date_of_birth": "1980-01-01"},
+                     {"patient_id": "P123", "insurance_id": "INS456"},
+                     {"patient_id": "P123", "insurance_id": "INS000", "service_date": "2025-06-02"},
+                     {}]:
+            self.assertSameResponse(self.insurance_client, 'POST', '/api/insurance/eligibility', data=data)
+
+    def test_non_json_body_fails_like_flask(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertSameResponse(self.insurance_client, 'POST', '/api/insurance/eligibility',
+                                    data={"patient_id": "P123"}, content_type='text/plain')
+
+    def test_availability_and_listing_match_flask(self):
+        for query in [{"doctor_id": "D001", "date": "2025-06-02"}, {"doctor_id": "D001"},
+                      {"doctor_id": "D999", "date": "2025-06-02"}, {"doctor_id": "D001", "date": "2025-13-40"}]:
+            self.assertSameResponse(self.scheduling_client, 'GET', '/api/availability', query)
+        self.scheduling_client.post('/api/appointments', json=BOOKING)
+        self.assertSameResponse(self.scheduling_client, 'GET', '/api/availability',
+                                {"doctor_id": "D001", "date": "2025-06-02"})
+        for query in [{"patient_id": "P123"}, {"patient_id": "P123", "status": "cancelled"}, {}]:
+            self.assertSameResponse(self.scheduling_client, 'GET', '/api/appointments', query)
+
+    def test_booking_matches_flask(self):
+        for data in [{**BOOKING, "time": "09:07"}, {**BOOKING, "date": "2025-6-2"}, {**BOOKING, "doctor_id": "D999"},
+                     {"patient_id": "P123"}, {**BOOKING, "insurance_id": "INS000"}]:
+            self.assertSameResponse(self.scheduling_client, 'POST', '/api/appointments', data=data)
+
+        status, _, body = self.request('POST', '/api/appointments', body=json.dumps(BOOKING).encode(),
+                                       headers={'Content-Type': 'application/json'})
+        self.assertEqual(status, 200)
+        booked = json.loads(body)
+        flask_booked = self.scheduling_client.post('/api/appointments', json={**BOOKING, "time": "09:30"}).get_json()
+        self.assertEqual(set(booked), set(flask_booked))
+        self.assertEqual(booked["time"], "09:00")
+        # Both slots are now taken, whichever app is asked
+        self.assertSameResponse(self.scheduling_client, 'POST', '/api/appointments', data=BOOKING)
+        self.assertSameResponse(self.scheduling_client, 'POST', '/api/appointments', data={**BOOKING, "time": "09:30"})
+
+    def test_idempotency_key_replays_booking(self):
+        body = json.dumps(BOOKING).encode()
+        headers = {'Content-Type': 'application/json', 'Idempotency-Key': 'book-1'}
+        status, _, first = self.request('POST', '/api/appointments', body=body, headers=headers)
+        self.assertEqual(status, 200)
+        status, replayed_headers, second = self.request('POST', '/api/appointments', body=body, headers=headers)
+        self.assertEqual((status, second), (200, first))
+        self.assertEqual(replayed_headers['idempotent-replayed'], 'true')
+        self.assertEqual(len(scheduling_api.appointments_db), 1)
+
+        status, _, _ = self.request('POST', '/api/appointments', body=json.dumps({**BOOKING, "time": "10:00"}).encode(),
+                                    headers=headers)
+        self.assertEqual(status, 422)
+        status, _, _ = self.request('POST', '/api/appointments', body=body,
+                                    headers={'Content-Type': 'application/json', 'Idempotency-Key': ''})
+        self.assertEqual(status, 400)
+
+    def test_unknown_route_and_method(self):
+        self.assertEqual(self.request('GET', '/api/doctors')[0], 404)
+        self.assertEqual(self.request('DELETE', '/api/availability')[0], 405)
+
+    def test_concurrent_lookups_share_one_fetch(self):
+        fetched = []
+
+        async def fetch(insurance_id):
+            fetched.append(insurance_id)
+            await asyncio.sleep(0.05)
+            return insurance_api.insurance_db.coverage(insurance_id)
+
+        app = AsyncServices(fetch)
+        query = {"patient_id": "P123", "insurance_id": "INS456", "service_date": "2025-06-02"}
+
+        async def lookups():
+            return await asyncio.gather(*(call(app, 'GET', '/api/insurance/eligibility', query) for _ in range(20)))
+
+        responses = asyncio.run(lookups())
+        self.assertEqual(fetched, ["INS456"])
+        self.assertEqual({(status, body) for status, _, body in responses}, {(responses[0][0], responses[0][2])})
+        self.assertTrue(json.loads(responses[0][2])["covered"])
+
+    def test_lifespan(self):
+        messages = [{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        asyncio.run(self.app({'type': 'lifespan'}, receive, send))
+        self.assertEqual(sent, ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
+
+class TestBenchmarkAsync(unittest.TestCase):
+    def tearDown(self):
+        repository = get_repository()
+        repository.appointments.clear()
+        for policy_number in [p for p in repository.insurance if p.startswith("BIN")]:
+            del repository.insurance[policy_number]
+        for doctor in [d for d in scheduling_api.doctors_db if d['doctor_id'].startswith("BD")]:
+            scheduling_api.doctors_db.remove(doctor['doctor_id'])
+
+    def test_async_app_sustains_more_requests_under_latency(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = benchmark_async.main(['--requests', '60', '--threads', '2', '--concurrency', '30',
+                                           '--latency', '0.02', '--doctors', '3', '--policies', '500',
+                                           '--appointments', '10'])
+        self.assertEqual(status, 0)
+        results = json.loads(output.getvalue())["results"]
+        self.assertEqual(results["asgi"]["overall"]["requests"], 60)
+        self.assertGreater(results["speedup"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import asyncio
+import unittest
+from async_insurance_verification import AsyncInsuranceVerifier, CircuitBreaker
+from insurance_verification import (
+    InsuranceExpiredError,
+    InsuranceNotFoundError,
+    InsuranceServiceUnavailableError,
+    InsuranceVerificationError,
+    InvalidInsuranceIdError,
+)
+
+VALID = {"provider": "Acme", "expiry_date": "2099-12-31", "member_name": "John Doe"}
+EXPIRED = {"provider": "Acme", "expiry_date": "2000-01-01", "member_name": "Jane Doe"}
+
+class TestAsyncInsuranceVerifier(unittest.TestCase):
+    def make_verifier(self, lookup=None, **kwargs):
+        kwargs.setdefault("backoff_base", 0.001)
+        db = {"ABC123456789": VALID, "ABC000000000": EXPIRED}
+        return AsyncInsuranceVerifier(db, lookup=lookup, **kwargs)
+
+    def test_same_outcomes_as_sync_verifier(self):
+        verifier = self.make_verifier()
+        self.assertEqual(asyncio.run(verifier.verify_insurance("ABC123456789")), VALID)
+        with self.assertRaises(InvalidInsuranceIdError):
+            asyncio.run(verifier.verify_insurance("bad"))
+        with self.assertRaises(InsuranceNotFoundError):
+            asyncio.run(verifier.verify_insurance("XYZ123456789"))
+        with self.assertRaises(InsuranceExpiredError):
+            asyncio.run(verifier.verify_insurance("ABC000000000"))
+
+    def test_concurrency_is_limited(self):
+        running = 0
+        peak = 0
+
+        async def lookup(insurance_id):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return VALID
+
+        verifier = self.make_verifier(lookup, max_concurrency=5)
+        results = asyncio.run(verifier.verify_many(["ABC123456789"] * 50))
+        self.assertEqual(results, [VALID] * 50)
+        self.assertEqual(peak, 5)
+
+    def test_retries_after_timeout(self):
+        calls = 0
+
+        async def lookup(insurance_id):
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await asyncio.sleep(1)
+            return VALID
+
+        verifier = self.make_verifier(lookup, timeout=0.05)
+        self.assertEqual(asyncio.run(verifier.verify_insurance("ABC123456789")), VALID)
+        self.assertEqual(calls, 2)
+
+    def test_circuit_opens_and_sheds_load(self):
+        calls = 0
+
+        async def lookup(insurance_id):
+            nonlocal calls
+            calls += 1
+            raise ConnectionError("payer down")
+
+        verifier = self.make_verifier(lookup, max_retries=2, circuit_breaker=CircuitBreaker(failure_threshold=3))
+        with self.assertRaises(InsuranceVerificationError):
+            asyncio.run(verifier.verify_insurance("ABC123456789"))
+        self.assertEqual(calls, 3)
+        with self.assertRaises(InsuranceServiceUnavailableError):
+            asyncio.run(verifier.verify_insurance("ABC123456789"))
+        self.assertEqual(calls, 3)
+
+    def test_malformed_record_is_not_retried(self):
+        calls = 0
+
+        async def lookup(insurance_id):
+            nonlocal calls
+            calls += 1
+            return {"provider": "Acme", "expiry_date": "soon"}
+
+        breaker = CircuitBreaker(failure_threshold=1)
+        verifier = self.make_verifier(lookup, circuit_breaker=breaker)
+        with self.assertRaises(InsuranceVerificationError):
+            asyncio.run(verifier.verify_insurance("ABC123456789"))
+        self.assertEqual((calls, breaker.state), (1, CircuitBreaker.CLOSED))
+
+    def test_cancelled_trial_releases_half_open_circuit(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        now[0] = 10
+
+        async def lookup(insurance_id):
+            await asyncio.sleep(1)
+            return VALID
+
+        verifier = self.make_verifier(lookup, circuit_breaker=breaker)
+
+        async def cancel_trial():
+            task = asyncio.ensure_future(verifier.verify_insurance("ABC123456789"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(cancel_trial())
+        self.assertTrue(breaker.allow_request())
+
+class TestCircuitBreaker(unittest.TestCase):
+    def test_half_open_trial(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=lambda: now[0])
+        breaker.record_failure()
+        self.assertFalse(breaker.allow_request())
+        now[0] = 10
+        self.assertTrue(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(breaker.allow_request())
+
+if __name__ == '__main__':
+    unittest.main()
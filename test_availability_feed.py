@@ -0,0 +1,89 @@
+import os
+import tempfile
+import threading
+import unittest
+from availability_feed import SCHEDULE, AvailabilityFeed, SQLiteAvailabilityFeed
+from repository import SQLiteDatabase
+
+class FeedContract:
+    """Behaviour shared by the in-memory and SQLite feeds"""
+
+    def make_feed(self, max_events=3):
+        raise NotImplementedError
+
+    def other_feed(self):
+        """A feed whose tokens this one cannot resume from"""
+        raise NotImplementedError
+
+    def setUp(self):
+        self.feed = self.make_feed()
+
+    def test_events_are_filtered_by_doctor_and_date(self):
+        start = self.feed.last_seq
+        self.feed.publish("D001", "2025-06-02", booked=["09:00"])
+        self.feed.publish("D002", "2025-06-02", booked=["09:00"])
+        self.feed.publish("D001", "2025-06-03", released=["10:00"])
+        events, last = self.feed.wait(start, 0, "D001", "2025-06-02")
+        self.assertEqual([(e["doctor_id"], e["booked"]) for e in events], [("D001", ["09:00"])])
+        self.assertEqual(last, 3)
+        self.assertEqual(len(self.feed.wait(start, 0, "D001")[0]), 2)
+
+    def test_schedule_changes_match_every_date(self):
+        self.feed.publish_schedule("D001")
+        events, _ = self.feed.wait(0, 0, "D001", "2025-06-02")
+        self.assertEqual([(e["type"], e["date"]) for e in events], [(SCHEDULE, None)])
+
+    def test_wait_blocks_until_a_matching_event(self):
+        timer = threading.Timer(0.05, self.feed.publish, ("D001", "2025-06-02", ["09:00"]))
+        timer.start()
+        events, last = self.feed.wait(self.feed.last_seq, 5, "D001", "2025-06-02")
+        timer.join()
+        self.assertEqual((len(events), last), (1, 1))
+        self.assertEqual(self.feed.wait(last, 0.01, "D001"), ([], 1))
+
+    def test_tokens_older_than_the_buffer_cannot_be_resumed(self):
+        token = self.feed.token()
+        self.assertEqual(self.feed.parse_token(token), 0)
+        for n in range(4):
+            self.feed.publish("D001", "2025-06-02", booked=[f"0{n}:00"])
+        self.assertIsNone(self.feed.parse_token(token))
+        self.assertEqual(self.feed.wait(0, 0, "D001"), (None, 4))
+        self.assertEqual(self.feed.parse_token(self.feed.token(1)), 1)
+        self.assertIsNone(self.feed.parse_token(self.other_feed().token()))
+        self.assertIsNone(self.feed.parse_token("garbage"))
+
+class TestAvailabilityFeed(FeedContract, unittest.TestCase):
+    def make_feed(self, max_events=3):
+        return AvailabilityFeed(max_events)
+
+    def other_feed(self):
+        return AvailabilityFeed()
+
+class TestSQLiteAvailabilityFeed(FeedContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'feed.db')
+        super().setUp()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_feed(self, max_events=3):
+        return SQLiteAvailabilityFeed(SQLiteDatabase(self.path), max_events, poll_interval=0.02)
+
+    def other_feed(self):
+        return SQLiteAvailabilityFeed(SQLiteDatabase(os.path.join(self.tmp.name, 'other.db')))
+
+    def test_workers_share_events_and_tokens(self):
+        # Two feeds over one database file stand for two gunicorn workers
+        other = self.make_feed()
+        self.assertEqual(other.token(), self.feed.token())
+        timer = threading.Timer(0.05, other.publish, ("D001", "2025-06-02", ["09:00"]))
+        timer.start()
+        events, last = self.feed.wait(self.feed.parse_token(other.token()), 5, "D001", "2025-06-02")
+        timer.join()
+        self.assertEqual([(e["seq"], e["booked"]) for e in events], [(1, ["09:00"])])
+        self.assertEqual(self.feed.token(), other.token(last))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import batch_validation
+from batch_validation import first_errors, validate_batch
+from validation import APPOINTMENT_SCHEMA, PATIENT_SCHEMA
+
+PATIENTS = [
+    {"first_name": "John", "last_name": "Doe", "email": "john@example.com", "dob": "1990-01-15",
+     "phone": "+1-555-123-4567"},
+    {"first_name": "Jane", "email": "jane@example", "dob": "1990-02-30"},
+    {"first_name": "A" * 51, "last_name": "Smith", "email": "a@b.co", "dob": "2024-02-29", "phone": "555\n1234567"},
+    {"first_name": 42, "last_name": " ", "email": None, "dob": 19900115, "phone": "12345"},
+]
+
+class TestBatchValidation(unittest.TestCase):
+    def check_matches_per_record(self, schema, records):
+        result = validate_batch(schema, records)
+        for row, record in enumerate(records):
+            for collect_all in (False, True):
+                self.assertEqual(result.errors(row, collect_all), schema.validate(record, collect_all), record)
+        return result
+
+    def test_matches_schema_validate(self):
+        result = self.check_matches_per_record(PATIENT_SCHEMA, PATIENTS)
+        self.assertEqual(result.valid, [True, False, False, False])
+        self.assertEqual(result.failed_fields(1), ["last_name", "email", "dob"])
+        self.assertEqual(int(result.mask[2]), 1 << 0)
+
+    def test_times_and_dates(self):
+        appointments = [{"patient_id": "P1", "insurance_id": "I1", "doctor_id": "D001", "date": day, "time": time}
+                        for day, time in (("2025-06-01", "09:00"), ("2025-6-1", "09:00"), ("2100-02-29", "23:59"),
+                                          ("2025-06-01", "24:00"), ("２０２５-06-01", "9:00"))]
+        result = self.check_matches_per_record(APPOINTMENT_SCHEMA, appointments)
+        self.assertEqual(result.valid, [True, False, False, False, False])
+
+    def test_without_numpy(self):
+        numpy, batch_validation.np = batch_validation.np, None
+        try:
+            self.check_matches_per_record(PATIENT_SCHEMA, PATIENTS)
+            self.assertEqual(first_errors(PATIENT_SCHEMA, PATIENTS[:2]), [None, "Last Name is required."])
+        finally:
+            batch_validation.np = numpy
+
+if __name__ == '__main__':
+    unittest.main()
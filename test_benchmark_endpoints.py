@@ -0,0 +1,40 @@
+import contextlib
+import io
+import unittest
+import appointment_scheduling_api as api
+import benchmark_endpoints as bench
+from repository import get_repository
+
+class TestBenchmarkEndpoints(unittest.TestCase):
+    def tearDown(self):
+        # Drop the synthetic data the run seeded into the shared stores
+        repository = get_repository()
+        repository.appointments.clear()
+        repository.patients.clear()
+        for policy_number in [p for p in repository.insurance if p.startswith("BIN")]:
+            del repository.insurance[policy_number]
+        for doctor in [d for d in api.doctors_db if d['doctor_id'].startswith("BD")]:
+            api.doctors_db.remove(doctor['doctor_id'])
+
+    def test_percentile(self):
+        values = [n / 100 for n in range(1, 101)]
+        self.assertEqual(bench.percentile(values, 0.5), 0.5)
+        self.assertEqual(bench.percentile(values, 0.99), 0.99)
+        self.assertEqual(bench.percentile([], 0.5), 0.0)
+
+    def test_small_in_process_run(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            status = bench.main(['--mode', 'inprocess', '--requests', '100', '--concurrency', '2', '--patients', '10',
+                                 '--doctors', '3', '--policies', '10', '--appointments', '20'])
+        self.assertEqual(status, 0)
+
+    def test_thresholds_and_baseline(self):
+        stats = bench.summarize([0.001, 0.002, 0.010], errors=1, elapsed=1.0)
+        results = {"inprocess": {"overall": stats}}
+        self.assertEqual(bench.check_thresholds(results, {"overall": {"p99_ms": 20, "min_rps": 3}}), [])
+        self.assertEqual(len(bench.check_thresholds(results, {"overall": {"p95_ms": 5, "max_error_rate": 0}})), 2)
+        baseline = {"inprocess": {"overall": {**stats, "p95_ms": 5.0, "throughput_rps": 10.0}}}
+        self.assertEqual(len(bench.check_baseline(results, baseline, 0.2)), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import deploy
+
+APP = '/home/ubuntu/app'
+
+class FakeFile(io.BytesIO):
+    def __init__(self, files, path, data=b''):
+        super().__init__(data)
+        self.files = files
+        self.path = path
+
+    def write(self, data):
+        return super().write(data.encode() if isinstance(data, str) else data)
+
+    def close(self):
+        if self.files is not None:
+            self.files[self.path] = self.getvalue()
+        super().close()
+
+class FakeSFTP:
+    def __init__(self, host):
+        self.host = host
+
+    def open(self, path, mode='r'):
+        if 'w' in mode:
+            return FakeFile(self.host.files, path)
+        if path not in self.host.files:
+            raise IOError(path)
+        return FakeFile(None, path, self.host.files[path])
+
+    def put(self, local, remote):
+        with open(local, 'rb') as f:
+            self.host.files[remote] = f.read()
+        self.host.uploaded.append(remote)
+
+    def remove(self, path):
+        if path not in self.host.files:
+            raise IOError(path)
+        del self.host.files[path]
+
+    def posix_rename(self, old, new):
+        self.host.files[new] = self.host.files.pop(old)
+
+    def close(self):
+        pass
+
+class FakeChannel:
+    def __init__(self, host):
+        self.host = host
+
+    def set_combine_stderr(self, combine):
+        pass
+
+    def exec_command(self, command):
+        self.command = command
+        self.host.commands.append(command)
+
+    def makefile(self, mode):
+        return io.BytesIO(self.host.output.encode())
+
+    def recv_exit_status(self):
+        return 1 if any(failing in self.command for failing in self.host.failing) else 0
+
+    def close(self):
+        pass
+
+class FakeHost:
+    """The files and command history of one server, reached through a fake SSH client"""
+
+    def __init__(self):
+        self.files = {}
+        self.commands = []
+        self.uploaded = []
+        self.failing = []
+        self.output = ''
+
+    def connect(self, host):
+        return self
+
+    def open_sftp(self):
+        return FakeSFTP(self)
+
+    def get_transport(self):
+        return self
+
+    def open_session(self):
+        return FakeChannel(self)
+
+    def close(self):
+        pass
+
+    def manifest(self):
+        return json.loads(self.files.get(f'{APP}/{deploy.MANIFEST_NAME}', b'{}'))
+
+class TestDeployHost(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.build = self.tmp.name
+        self.write('app.py', 'print("v1")')
+        self.write('static/site.css', 'body {}')
+        self.write(deploy.REQUIREMENTS, 'flask\n')
+        self.host = FakeHost()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.build, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def deploy(self, **kwargs):
+        self.host.commands.clear()
+        self.host.uploaded.clear()
+        with contextlib.redirect_stdout(io.StringIO()):
+            return deploy.deploy_host('app1', deploy.file_hashes(self.build), self.build, APP,
+                                      connect=self.host.connect, **kwargs)
+
+    def installs(self):
+        return [command for command in self.host.commands if 'pip install' in command]
+
+    def restarts(self):
+        return [command for command in self.host.commands if 'systemctl restart' in command]
+
+    def test_first_deploy_uploads_everything_and_records_it(self):
+        self.assertEqual(self.deploy(), 3)
+        self.assertEqual(self.host.files[f'{APP}/static/site.css'], b'body {}')
+        self.assertEqual((len(self.installs()), len(self.restarts())), (1, 1))
+        self.assertEqual(self.host.manifest(), deploy.file_hashes(self.build))
+
+    def test_only_changed_files_are_uploaded_and_install_is_skipped(self):
+        self.deploy()
+        self.write('app.py', 'print("v2")')
+        self.assertEqual(self.deploy(), 1)
+        self.assertEqual(self.host.uploaded, [f'{APP}/app.py'])
+        self.assertEqual((self.installs(), len(self.restarts())), ([], 1))
+
+        self.write(deploy.REQUIREMENTS, 'flask\nrequests\n')
+        self.deploy()
+        self.assertEqual(len(self.installs()), 1)
+
+    def test_unchanged_build_does_nothing(self):
+        self.deploy()
+        self.assertEqual(self.deploy(), 0)
+        self.assertEqual((self.host.commands, self.host.uploaded), ([], []))
+
+    def test_manifest_is_written_only_after_a_successful_restart(self):
+        self.deploy()
+        before = self.host.manifest()
+        self.write('app.py', 'print("v2")')
+        self.host.failing = ['systemctl restart']
+        self.host.output = 'Job for myapp.service failed'
+        with self.assertRaises(RuntimeError):
+            self.deploy()
+        self.assertEqual(self.host.manifest(), before)
+
+        # The next deploy uploads the file again and restarts
+        self.host.failing = []
+        self.assertEqual(self.deploy(), 1)
+        self.assertEqual(self.host.manifest(), deploy.file_hashes(self.build))
+
+    def test_files_removed_from_the_build_are_deleted(self):
+        self.deploy()
+        os.remove(os.path.join(self.build, 'static', 'site.css'))
+        self.assertEqual(self.deploy(), 0)
+        self.assertNotIn(f'{APP}/static/site.css', self.host.files)
+        self.assertEqual(len(self.restarts()), 1)
+        self.assertNotIn('static/site.css', self.host.manifest())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from datetime import date
+from doctor_schedule import Schedule, load_schedules, minutes, slot_mask, slot_times
+
+class TestDoctorSchedule(unittest.TestCase):
+    def test_slot_mask_skips_breaks_and_partial_slots(self):
+        mask = slot_mask([(minutes("09:00"), minutes("10:40"))], 30, [(minutes("09:30"), minutes("09:45"))])
+        self.assertEqual(slot_times(mask), ("09:00", "10:00"))
+
+    def test_slot_minutes_must_fit_the_resolution(self):
+        with self.assertRaises(ValueError):
+            slot_mask([(0, 60)], 7)
+
+    def test_office_hours_by_weekday(self):
+        schedule = Schedule.office_hours("09:00", "11:00", slot_minutes=60)
+        self.assertEqual(slot_times(schedule.day_mask(date(2025, 6, 2))), ("09:00", "10:00"))
+        self.assertEqual(schedule.day_mask(date(2025, 6, 1)), 0)
+
+    def test_holidays_and_overrides(self):
+        schedule = Schedule.from_config({
+            "slot_minutes": 15,
+            "hours": {"mon": [["08:00", "09:00"]]},
+            "holidays": ["2025-06-02"],
+            "overrides": {"2025-06-07": [["10:00", "10:30"]]}
+        })
+        self.assertEqual(schedule.day_mask(date(2025, 6, 2)), 0)
+        self.assertEqual(slot_times(schedule.day_mask(date(2025, 6, 9))), ("08:00", "08:15", "08:30", "08:45"))
+        self.assertEqual(slot_times(schedule.day_mask(date(2025, 6, 7))), ("10:00", "10:15"))
+        self.assertTrue(schedule.is_bookable(date(2025, 6, 9), minutes("08:15") // 5))
+        self.assertFalse(schedule.is_bookable(date(2025, 6, 9), minutes("08:10") // 5))
+        leave = schedule.with_holidays([date(2025, 6, 9)])
+        self.assertEqual(leave.day_mask(date(2025, 6, 9)), 0)
+        self.assertEqual(schedule.day_mask(date(2025, 6, 9)), leave.day_mask(date(2025, 6, 16)))
+
+    def test_config_without_hours_uses_default(self):
+        default = Schedule.office_hours("09:00", "10:00")
+        schedules = load_schedules({"D1": {"holidays": ["2025-06-03"]}}, default)
+        self.assertEqual(schedules["D1"].day_mask(date(2025, 6, 2)), default.day_mask(date(2025, 6, 2)))
+        self.assertEqual(schedules["D1"].day_mask(date(2025, 6, 3)), 0)
+        with self.assertRaises(ValueError):
+            Schedule.from_config({"holidays": []})
+        with self.assertRaises(ValueError):
+            Schedule.from_config({"hours": {"funday": [["09:00", "10:00"]]}})
+
+if __name__ == '__main__':
+    unittest.main()
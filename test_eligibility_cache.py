@@ -0,0 +1,90 @@
+import os
+import tempfile
+import unittest
+from eligibility_cache import EligibilityCache, MISS
+from insurance_verification import InsuranceVerifier
+from repository import SQLiteRepository
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestEligibilityCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = EligibilityCache(max_entries=2, ttl=10, negative_ttl=2, clock=self.clock)
+
+    def test_hit_and_miss_counters(self):
+        self.assertIs(self.cache.get("P1", "INS1", "2025-06-01"), MISS)
+        self.cache.put("P1", "INS1", "2025-06-01", "active")
+        self.assertEqual(self.cache.get("P1", "INS1", "2025-06-01"), "active")
+        self.assertIs(self.cache.get("P1", "INS1", "2025-06-02"), MISS)
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+    def test_entries_expire(self):
+        self.cache.put("P1", "INS1", None, "active")
+        self.cache.put("P2", "INS2", None, None, negative=True)
+        self.clock.now = 5
+        self.assertEqual(self.cache.get("P1", "INS1"), "active")
+        self.assertIs(self.cache.get("P2", "INS2"), MISS)
+        self.clock.now = 11
+        self.assertIs(self.cache.get("P1", "INS1"), MISS)
+        self.assertEqual(self.cache.stats()["expirations"], 2)
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put("P1", "INS1", None, 1)
+        self.cache.put("P2", "INS2", None, 2)
+        self.cache.get("P1", "INS1")
+        self.cache.put("P3", "INS3", None, 3)
+        self.assertIs(self.cache.get("P2", "INS2"), MISS)
+        self.assertEqual(self.cache.get("P1", "INS1"), 1)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_verifier_update_invalidates_cache(self):
+        verifier = InsuranceVerifier()
+        verifier.add_invalidation_hook(self.cache.invalidate)
+        self.cache.put("P1", "ABC123456789", "2025-06-01", "active")
+        self.cache.put("P1", "ABC123456789", "2025-06-02", "active")
+        verifier.update_insurance_info("ABC123456789", {
+            "provider": "Acme", "expiry_date": "2030-01-01", "member_name": "John Doe"
+        })
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.stats()["invalidations"], 2)
+
+class TestVersionedEligibilityCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp.name, "hospital.db")
+        # Two repositories over one database file stand for two gunicorn workers
+        self.worker, self.other_worker = SQLiteRepository(path), SQLiteRepository(path)
+        self.cache = EligibilityCache(version=self.worker.insurance.version)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def lookup(self):
+        cached = self.cache.get("P1", "INS1")
+        if cached is not MISS:
+            return cached
+        version = self.cache.version("INS1")
+        record = self.worker.insurance.get("INS1")
+        status = record["eligibility_status"] if record else "not_found"
+        self.cache.put("P1", "INS1", None, status, negative=record is None, version=version)
+        return status
+
+    def test_update_by_another_worker_is_seen_on_the_next_hit(self):
+        self.assertEqual(self.lookup(), "not_found")
+        self.other_worker.insurance["INS1"] = {"patient_id": "P1", "eligibility_status": "active"}
+        self.assertEqual(self.lookup(), "active")
+        self.assertEqual(self.lookup(), "active")
+        self.other_worker.insurance["INS1"] = {"patient_id": "P1", "eligibility_status": "inactive"}
+        self.assertEqual(self.lookup(), "inactive")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["invalidations"]), (1, 2))
+
+if __name__ == '__main__':
+    unittest.main()
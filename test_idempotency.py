@@ -0,0 +1,183 @@
+import os
+import tempfile
+import threading
+import unittest
+import app
+import appointment_scheduling_api as scheduling_api
+from idempotency import (IN_PROGRESS, MISMATCH, NEW, REPLAY, IdempotencyStore, SQLiteIdempotencyStore,
+                         client_identity, create_store, idempotency_store)
+from repository import InMemoryRepository, SQLiteDatabase, SQLiteRepository
+
+PATIENT = {
+    "first_name": "John",
+    "last_name": "Doe",
+    "id_number": "1001",
+    "insurance_number": "INS456",
+    "contact_info": "john@example.com"
+}
+
+BOOKING = {
+    "patient_id": "P123",
+    "insurance_id": "INS456",
+    "doctor_id": "D001",
+    "date": "2025-06-02",
+    "time": "09:00"
+}
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestIdempotencyStore(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = IdempotencyStore(max_entries=2, ttl=60, wait_timeout=0.05, clock=self.clock)
+
+    def test_replays_until_expired(self):
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        self.assertEqual(self.store.begin(key, "a"), (NEW, None))
+        self.store.finish(key, (201, b"{}", "application/json"))
+        self.assertEqual(self.store.begin(key, "a"), (REPLAY, (201, b"{}", "application/json")))
+        self.assertEqual(self.store.begin(key, "b"), (MISMATCH, None))
+        self.clock.now = 61
+        self.assertEqual(self.store.begin(key, "b"), (NEW, None))
+        self.assertEqual(self.store.stats()["expirations"], 1)
+
+    def test_released_key_can_be_retried(self):
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        self.store.begin(key, "a")
+        self.assertEqual(self.store.begin(key, "a"), (IN_PROGRESS, None))
+        self.store.finish(key, None)
+        self.assertEqual(self.store.begin(key, "a"), (NEW, None))
+
+    def test_least_recently_used_completed_entry_is_evicted(self):
+        running = ("POST", "/register", "addr:10.0.0.1", "running")
+        self.store.begin(running, "a")
+        for name in ("k1", "k2"):
+            self.store.begin(("POST", "/register", "addr:10.0.0.1", name), "a")
+            self.store.finish(("POST", "/register", "addr:10.0.0.1", name), (201, b"", "application/json"))
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.begin(running, "a"), (IN_PROGRESS, None))
+        self.assertEqual(self.store.begin(("POST", "/register", "addr:10.0.0.1", "k1"), "a"), (NEW, None))
+
+    def test_repeat_waits_for_the_running_request(self):
+        self.store.wait_timeout = 5
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        self.store.begin(key, "a")
+        timer = threading.Timer(0.05, self.store.finish, (key, (201, b"done", "text/plain")))
+        timer.start()
+        self.assertEqual(self.store.begin(key, "a"), (REPLAY, (201, b"done", "text/plain")))
+        timer.join()
+
+class TestSQLiteIdempotencyStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.clock = FakeClock()
+        self.path = os.path.join(self.tmp.name, "hospital.db")
+        self.store = self.worker()
+
+    def worker(self):
+        # A store on its own database connection stands in for another worker process
+        return SQLiteIdempotencyStore(SQLiteDatabase(self.path), ttl=60, wait_timeout=0.05, lease=10,
+                                      poll_interval=0.01, clock=self.clock)
+
+    def test_store_follows_the_repository(self):
+        self.assertIsInstance(create_store(SQLiteRepository(self.path)), SQLiteIdempotencyStore)
+        self.assertIsInstance(create_store(InMemoryRepository()), IdempotencyStore)
+
+    def test_keys_are_shared_between_workers(self):
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        other = self.worker()
+        self.assertEqual(self.store.begin(key, "a"), (NEW, None))
+        self.assertEqual(other.begin(key, "a"), (IN_PROGRESS, None))
+        self.store.finish(key, (201, b"{}", "application/json"))
+        self.assertEqual(other.begin(key, "a"), (REPLAY, (201, b"{}", "application/json")))
+        self.assertEqual(other.begin(key, "b"), (MISMATCH, None))
+        self.assertEqual(other.begin(("POST", "/register", "addr:10.0.0.2", "k1"), "a"), (NEW, None))
+
+    def test_released_and_expired_keys_can_be_reused(self):
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        self.store.begin(key, "a")
+        self.store.finish(key, None)
+        self.assertEqual(self.store.begin(key, "a"), (NEW, None))
+        # A claim whose worker never finished is given up after the lease
+        self.clock.now = 11
+        self.assertEqual(self.store.begin(key, "a"), (NEW, None))
+        self.store.finish(key, (201, b"{}", "application/json"))
+        self.clock.now = 72
+        self.assertEqual(self.store.begin(key, "b"), (NEW, None))
+        self.assertEqual(len(self.store), 1)
+
+    def test_repeat_waits_for_the_other_worker(self):
+        self.store.wait_timeout = 5
+        key = ("POST", "/register", "addr:10.0.0.1", "k1")
+        other = self.worker()
+        other.begin(key, "a")
+        timer = threading.Timer(0.05, other.finish, (key, (201, b"done", "text/plain")))
+        timer.start()
+        self.assertEqual(self.store.begin(key, "a"), (REPLAY, (201, b"done", "text/plain")))
+        timer.join()
+
+class TestIdempotentEndpoints(unittest.TestCase):
+    def setUp(self):
+        idempotency_store.clear()
+        app.patients_db.clear()
+        scheduling_api.appointments_db.clear()
+
+    def tearDown(self):
+        idempotency_store.clear()
+        app.patients_db.clear()
+        scheduling_api.appointments_db.clear()
+
+    def test_retried_registration_is_replayed(self):
+        client = app.app.test_client()
+        first = client.post('/register', json=PATIENT, headers={"Idempotency-Key": "reg-1"})
+        retry = client.post('/register', json=PATIENT, headers={"Idempotency-Key": "reg-1"})
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.get_json()["patient_id"], first.get_json()["patient_id"])
+        self.assertEqual(retry.headers["Idempotent-Replayed"], "true")
+        self.assertEqual(len(app.patients_db), 1)
+
+        # A new key is a new request: the duplicate checks apply as before
+        response = client.post('/register', json=PATIENT, headers={"Idempotency-Key": "reg-2"})
+        self.assertEqual(response.status_code, 409)
+        response = client.post('/register', json={**PATIENT, "first_name": "Jack"}, headers={"Idempotency-Key": "reg-1"})
+        self.assertEqual(response.status_code, 422)
+
+    def test_retried_booking_is_replayed(self):
+        client = scheduling_api.app.test_client()
+        first = client.post('/api/appointments', json=BOOKING, headers={"Idempotency-Key": "book-1"})
+        retry = client.post('/api/appointments', json=BOOKING, headers={"Idempotency-Key": "book-1"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.get_json()["appointment_id"], first.get_json()["appointment_id"])
+        # Without a key a repeat is a conflicting booking
+        self.assertEqual(client.post('/api/appointments', json=BOOKING).status_code, 409)
+
+    def test_keys_are_scoped_to_the_client(self):
+        self.assertNotEqual(client_identity("Bearer a", "10.0.0.1"), client_identity("Bearer b", "10.0.0.1"))
+        self.assertEqual(client_identity("Bearer a", "10.0.0.1"), client_identity("Bearer a", "10.0.0.2"))
+        client = scheduling_api.app.test_client()
+        headers = {"Idempotency-Key": "book-1"}
+        first = client.post('/api/appointments', json=BOOKING, headers=headers,
+                            environ_base={"REMOTE_ADDR": "10.0.0.1"})
+        # The same key from another client is a new request, not a replay of the first response
+        other = client.post('/api/appointments', json=BOOKING, headers=headers,
+                            environ_base={"REMOTE_ADDR": "10.0.0.2"})
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(other.status_code, 409)
+        self.assertNotIn("Idempotent-Replayed", other.headers)
+
+    def test_invalid_key_is_rejected(self):
+        client = app.app.test_client()
+        response = client.post('/register', json=PATIENT, headers={"Idempotency-Key": "x" * 300})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(app.patients_db), 0)
+
+if __name__ == '__main__':
+    unittest.main()
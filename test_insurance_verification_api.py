@@ -0,0 +1,130 @@
+import json
+import unittest
+import insurance_verification_api as api
+from insurance_verification import shared_verifier
+
+JOHN = {
+    "patient_id": "P123",
+    "insurance_id": "INS456",
+    "first_name": "John",
+    "last_name": "Doe",
+    "date_of_birth": "1980-01-01"
+}
+
+class TestEligibilityBatch(unittest.TestCase):
+    def setUp(self):
+        api.eligibility_cache.clear()
+        self.client = api.app.test_client()
+
+    def test_batch_reports_partial_failures(self):
+        batch = [JOHN, {**JOHN, "insurance_id": "INS000"}, {"patient_id": "P123"}, "not an object"]
+        response = self.client.post('/api/insurance/eligibility/batch', json=batch)
+        self.assertEqual(response.status_code, 200)
+        body = response.get_json()
+        self.assertEqual((body["total"], body["succeeded"], body["failed"]), (4, 2, 2))
+        results = body["results"]
+        self.assertEqual(results[0]["eligibility_status"], "active")
+        self.assertEqual(results[1]["eligibility_status"], "not_found")
+        self.assertEqual(results[2]["status"], 400)
+        self.assertIn("Missing required fields", results[2]["error"])
+        self.assertEqual(results[3]["index"], 3)
+
+    def test_batch_items_match_single_requests(self):
+        single = self.client.post('/api/insurance/eligibility', json=JOHN).get_json()
+        batched = self.client.post('/api/insurance/eligibility/batch', json=[JOHN]).get_json()["results"][0]
+        self.assertEqual({k: v for k, v in batched.items() if k not in ("index", "status")}, single)
+
+    def test_streamed_ndjson_batch(self):
+        lines = [json.dumps(JOHN), "{broken", json.dumps({**JOHN, "insurance_id": "INS789", "patient_id": "P456",
+                                                          "first_name": "Jane", "last_name": "Smith",
+                                                          "date_of_birth": "1990-05-15"})]
+        response = self.client.post('/api/insurance/eligibility/batch?stream=true', data="\n".join(lines),
+                                    content_type="application/x-ndjson")
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        results = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([r["status"] for r in results], [200, 400, 200])
+        self.assertEqual(results[2]["eligibility_status"], "inactive")
+
+    def test_batch_requires_array(self):
+        response = self.client.post('/api/insurance/eligibility/batch', json=JOHN)
+        self.assertEqual(response.status_code, 400)
+
+class TestEligibilityCaching(unittest.TestCase):
+    def setUp(self):
+        api.eligibility_cache.clear()
+        self.client = api.app.test_client()
+        self.original = api.insurance_db["INS456"]
+
+    def tearDown(self):
+        api.update_insurance_record("INS456", self.original)
+
+    def test_repeated_lookups_hit_cache(self):
+        hits = api.eligibility_cache.hits
+        url = '/api/insurance/eligibility?patient_id=P123&insurance_id=INS456'
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(api.eligibility_cache.hits, hits + 1)
+
+    def test_update_invalidates_cached_result(self):
+        url = '/api/insurance/eligibility?patient_id=P123&insurance_id=INS456'
+        self.assertEqual(self.client.get(url).get_json()["eligibility_status"], "active")
+        api.update_insurance_record("INS456", {**self.original, "eligibility_status": "inactive"})
+        self.assertEqual(self.client.get(url).get_json()["eligibility_status"], "inactive")
+
+    def test_service_date_outside_coverage_is_not_eligible(self):
+        url = '/api/insurance/eligibility?patient_id=P123&insurance_id=INS456&service_date='
+        body = self.client.get(url + '2025-06-02').get_json()
+        self.assertEqual((body["eligibility_status"], body["covered"]), ("active", True))
+        body = self.client.get(url + '2026-01-01').get_json()
+        self.assertEqual((body["eligibility_status"], body["covered"]), ("inactive", False))
+        self.assertEqual(body["message"], "Coverage ended on 2025-12-31")
+
+    def test_coverage_lists_policies_in_force(self):
+        api.update_insurance_record("INS900", {**self.original, "coverage_level": "secondary"})
+        try:
+            body = self.client.get('/api/insurance/coverage?patient_id=P123&service_date=2025-06-02').get_json()
+            self.assertEqual([(p["insurance_id"], p["coverage_level"]) for p in body["policies"]],
+                             [("INS456", "primary"), ("INS900", "secondary")])
+            body = self.client.get('/api/insurance/coverage?patient_id=P123&service_date=2026-06-02').get_json()
+            self.assertEqual((body["covered"], body["policies"]), (False, []))
+        finally:
+            del api.insurance_db["INS900"]
+
+    def test_verifier_update_changes_next_answer(self):
+        verifier = shared_verifier()
+        record = {**self.original, "provider": "Acme", "expiry_date": "2030-01-01", "member_name": "John Doe"}
+        api.insurance_db["ABC123456789"] = record
+        try:
+            url = '/api/insurance/eligibility?patient_id=P123&insurance_id=ABC123456789'
+            self.assertEqual(self.client.get(url).get_json()["eligibility_status"], "active")
+            verifier.update_insurance_info("ABC123456789", {**record, "eligibility_status": "inactive"})
+            self.assertEqual(self.client.get(url).get_json()["eligibility_status"], "inactive")
+        finally:
+            del api.insurance_db["ABC123456789"]
+
+    def test_verifier_and_api_read_each_others_records(self):
+        verifier = shared_verifier()
+        details = {**self.original["coverage_details"], "expiration_date": "2030-12-31"}
+        api.insurance_db["ABC123456789"] = {**self.original, "coverage_details": details}
+        try:
+            # A policy written by the API is verified against its coverage expiration date
+            self.assertEqual(verifier.verify_insurance("ABC123456789")["patient_id"], "P123")
+            verifier.update_insurance_info("ABC123456789", {"provider": "Acme", "expiry_date": "2031-06-30",
+                                                            "member_name": "John Doe"})
+            url = '/api/insurance/eligibility?patient_id=P123&insurance_id=ABC123456789&service_date='
+            body = self.client.get(url + '2031-06-30').get_json()
+            self.assertEqual((body["eligibility_status"], body["covered"]), ("active", True))
+            self.assertEqual(body["coverage_details"]["plan_name"], "Gold Plan")
+            self.assertFalse(self.client.get(url + '2031-07-01').get_json()["covered"])
+
+            # A policy only the verifier knows is not linked to a patient: not found, not an error
+            verifier.update_insurance_info("XYZ123456789", {"provider": "Acme", "expiry_date": "2031-06-30",
+                                                            "member_name": "John Doe"})
+            response = self.client.get('/api/insurance/eligibility?patient_id=P123&insurance_id=XYZ123456789')
+            self.assertEqual((response.status_code, response.get_json()["eligibility_status"]), (200, "not_found"))
+        finally:
+            del api.insurance_db["ABC123456789"]
+            api.insurance_db.pop("XYZ123456789", None)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,163 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import benchmark_recovery
+from journal import Journal, read_snapshot, replay, segments
+from repository import JournaledRepository
+
+def make_appointment(appointment_id, time="09:00"):
+    return {"appointment_id": appointment_id, "patient_id": "1", "doctor_id": "D001",
+            "date": "2025-06-02", "time": time, "status": "confirmed"}
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def open(self, **kwargs):
+        repo = JournaledRepository(self.dir, **kwargs)
+        self.addCleanup(repo.close)
+        return repo
+
+    def test_changes_survive_a_restart(self):
+        repo = self.open()
+        first = repo.patients.add({"first_name": "John", "email": "john@example.com"})
+        second = repo.patients.add({"first_name": "Jane"})
+        repo.patients.update(first, {"first_name": "Johnny", "email": "johnny@example.com"})
+        repo.patients.delete(second)
+        repo.insurance["INS900"] = {"patient_id": first, "eligibility_status": "active"}
+        repo.insurance["INS901"] = {"patient_id": first, "eligibility_status": "active"}
+        del repo.insurance["INS901"]
+        self.assertTrue(repo.appointments.add(make_appointment("A1")))
+        self.assertTrue(repo.appointments.add(make_appointment("A2", "09:30")))
+        repo.appointments.remove("A1")
+        repo.close()
+
+        recovered = self.open()
+        self.assertEqual([p["first_name"] for p in recovered.patients], ["Johnny"])
+        self.assertEqual(recovered.patients.find_duplicates({"email": "JOHNNY@example.com"}), {"email": first})
+        self.assertEqual(list(recovered.insurance), ["INS900"])
+        self.assertEqual(recovered.appointments.booked_times("D001", "2025-06-02"), ["09:30"])
+        # New patients do not reuse recovered ids
+        self.assertEqual(recovered.patients.add({"first_name": "Joe"}), "3")
+
+    def test_cancel_and_reschedule_survive_a_restart(self):
+        repo = self.open()
+        repo.appointments.add(make_appointment("A1"))
+        repo.appointments.add(make_appointment("A2", "09:30"))
+        repo.appointments.reschedule("A1", "D001", "2025-06-02", "10:00")
+        repo.appointments.cancel("A2")
+        repo.close()
+
+        recovered = self.open()
+        self.assertEqual(recovered.appointments.booked_times("D001", "2025-06-02"), ["10:00"])
+        self.assertEqual([a["status"] for a in recovered.appointments.for_patient("1")], ["cancelled", "confirmed"])
+
+    def test_snapshot_replaces_old_segments(self):
+        repo = self.open()
+        patient_id = repo.patients.add({"first_name": "John", "id_number": "AB-1"})
+        repo.patients.delete(repo.patients.add({"first_name": "Jane"}))
+        repo.appointments.add(make_appointment("A1"))
+        seq = repo.snapshot()
+        repo.appointments.add(make_appointment("A2", "10:00"))
+        repo.close()
+
+        self.assertEqual(read_snapshot(os.path.join(self.dir, "snapshot.bin"))[0], seq)
+        self.assertTrue(all(first_seq > seq for first_seq, _ in segments(self.dir)))
+        self.assertEqual([entry[:2] for _, entry in replay(self.dir)], [["appointments", "put"]])
+
+        recovered = self.open()
+        self.assertEqual(recovered.patients.find_duplicates({"id_number": "ab1"}), {"id_number": patient_id})
+        self.assertEqual(recovered.appointments.booked_times("D001", "2025-06-02"), ["09:00", "10:00"])
+        self.assertEqual(recovered.patients.add({"first_name": "Joe"}), "3")
+
+    def test_snapshots_are_taken_in_the_background(self):
+        repo = self.open(snapshot_every=10)
+        for n in range(30):
+            repo.insurance[f"INS{n}"] = {"patient_id": "1"}
+        repo.close()
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "snapshot.bin")))
+        self.assertEqual(len(self.open().insurance), 30)
+
+    def test_torn_tail_is_ignored(self):
+        repo = self.open()
+        repo.insurance["INS1"] = {"patient_id": "1"}
+        repo.insurance["INS2"] = {"patient_id": "2"}
+        repo.close()
+        _, path = segments(self.dir)[-1]
+        with open(path, "r+b") as f:
+            f.truncate(os.path.getsize(path) - 3)
+
+        recovered = self.open()
+        self.assertEqual(list(recovered.insurance), ["INS1"])
+        recovered.insurance["INS3"] = {"patient_id": "3"}
+        recovered.close()
+        self.assertEqual(sorted(self.open().insurance), ["INS1", "INS3"])
+
+    def test_concurrent_commits_share_flushes(self):
+        journal = Journal(self.dir)
+        self.addCleanup(journal.close)
+        start = threading.Barrier(8)
+
+        def write(n):
+            start.wait()
+            for i in range(50):
+                journal.commit(journal.record(["insurance", "put", f"INS{n}-{i}", {}]))
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(list(replay(self.dir))), 400)
+        self.assertLess(journal.flushes, 400)
+
+    def test_one_writer_per_directory(self):
+        repo = self.open()
+        repo.insurance["INS1"] = {"patient_id": "1"}
+        other = JournaledRepository(self.dir)
+        with self.assertRaises(RuntimeError):
+            other.insurance["INS2"] = {"patient_id": "2"}
+
+    def fork(self, child):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                child()
+                os._exit(0)
+            except RuntimeError:
+                os._exit(2)
+            except BaseException:
+                os._exit(1)
+        _, status = os.waitpid(pid, 0)
+        return os.waitstatus_to_exitcode(status)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "requires fork")
+    def test_forked_child_does_not_write_through_inherited_journal(self):
+        repo = self.open()
+        repo.insurance["INS1"] = {"patient_id": "1"}
+        # The parent still holds the journal, so the child cannot take it
+        self.assertEqual(self.fork(lambda: repo.insurance.__setitem__("INS2", {"patient_id": "2"})), 2)
+        repo.journal.close()
+        self.assertEqual(self.fork(lambda: repo.insurance.__setitem__("INS3", {"patient_id": "3"})), 0)
+        self.assertEqual([entry[2] for _, entry in replay(self.dir)], ["INS1", "INS3"])
+
+class TestBenchmarkRecovery(unittest.TestCase):
+    def test_recovers_snapshot_and_tail(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            status = benchmark_recovery.main(['--patients', '200', '--appointments', '300', '--tail', '50'])
+        self.assertEqual(status, 0)
+        results = json.loads(output.getvalue())["results"]
+        self.assertEqual(results["records"], {"patients": 200, "appointments": 350})
+        self.assertGreater(results["cold_start_seconds"], 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+import wsgi
+from metrics import Registry
+
+class TestRegistry(unittest.TestCase):
+    def test_exposition_format(self):
+        registry = Registry()
+        requests = registry.counter('requests_total', "Requests", ('path',))
+        latency = registry.histogram('latency_seconds', "Latency", buckets=(0.1, 1))
+        requests.labels('/a"b').inc()
+        requests.labels('/a"b').inc(2)
+        latency.labels().observe(0.05)
+        latency.labels().observe(5)
+        lines = registry.exposition().splitlines()
+        self.assertIn('# TYPE requests_total counter', lines)
+        self.assertIn('requests_total{path="/a\\"b"} 3', lines)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 2', lines)
+        self.assertIn('latency_seconds_sum 5.05', lines)
+        self.assertIn('latency_seconds_count 2', lines)
+
+    def test_reregistering_returns_same_metric(self):
+        registry = Registry()
+        self.assertIs(registry.gauge('in_flight', "In flight"), registry.gauge('in_flight', "In flight"))
+        with self.assertRaises(ValueError):
+            registry.counter('in_flight', "In flight")
+
+class TestMetricsEndpoint(unittest.TestCase):
+    def test_records_requests_and_cache(self):
+        client = wsgi.create_app().test_client()
+        client.get('/api/doctors')
+        client.get('/api/insurance/eligibility?patient_id=P123&insurance_id=INS456')
+        client.get('/api/insurance/eligibility?patient_id=P123&insurance_id=INS456')
+        response = client.get('/metrics')
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('http_request_duration_seconds_count{method="GET",endpoint="/api/doctors"}', text)
+        self.assertIn('http_requests_total{method="GET",endpoint="/api/doctors",status="200"}', text)
+        self.assertIn('http_requests_in_flight{method="GET",endpoint="/metrics"} 1', text)
+        self.assertIn('eligibility_check_duration_seconds_count{source="cache"}', text)
+        self.assertIn('eligibility_cache_hit_ratio', text)
+
+if __name__ == '__main__':
+    unittest.main()
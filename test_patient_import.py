@@ -0,0 +1,58 @@
+import io
+import json
+import unittest
+import app
+from patient_import import import_patients, iter_rows
+from repository import InMemoryRepository, SQLiteRepository
+
+CSV = (
+    "first_name,last_name,id_number,insurance_number,contact_info\n"
+    "John,Doe,1001,INS456,john@example.com\n"
+    "Jane,Smith,1002\n"
+    "Bob,Wilson,1003,INS789,555-0100\n"
+)
+
+class TestPatientImport(unittest.TestCase):
+    def test_csv_import_reports_bad_rows(self):
+        patients = InMemoryRepository().patients
+        report = import_patients(iter_rows(io.BytesIO(CSV.encode()), 'csv'), patients, batch_size=1)
+        self.assertEqual((report["imported"], report["failed"]), (2, 1))
+        self.assertEqual(report["errors"], [{"row": 3, "error": "Missing field: insurance_number"}])
+        self.assertEqual(sorted(p["first_name"] for p in patients), ["Bob", "John"])
+
+    def test_reimport_reports_duplicates(self):
+        for patients in (InMemoryRepository().patients, SQLiteRepository(":memory:").patients):
+            import_patients(iter_rows(io.BytesIO(CSV.encode()), 'csv'), patients)
+            report = import_patients(iter_rows(io.BytesIO(CSV.encode()), 'csv'), patients)
+            self.assertEqual((report["imported"], report["failed"]), (0, 3))
+            self.assertEqual([e["row"] for e in report["errors"]], [2, 3, 4])
+            self.assertEqual(report["errors"][2], {
+                "row": 4, "error": "Patient already registered (duplicate fields: id_number, insurance_number)"})
+            self.assertEqual(len(patients), 2)
+
+    def test_ndjson_import(self):
+        patients = InMemoryRepository().patients
+        lines = [
+            json.dumps({"first_name": "John", "last_name": "Doe", "id_number": "1001",
+                        "insurance_number": "INS456", "contact_info": "john@example.com"}),
+            "",
+            "{not json",
+            "[1, 2]"
+        ]
+        report = import_patients(iter_rows(io.BytesIO("\n".join(lines).encode()), 'ndjson'), patients)
+        self.assertEqual(report["imported"], 1)
+        self.assertEqual([e["row"] for e in report["errors"]], [3, 4])
+
+    def test_bulk_endpoint(self):
+        app.patients_db.clear()
+        client = app.app.test_client()
+        response = client.post('/register/bulk', data=CSV, content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["imported"], 2)
+        self.assertEqual(len(app.patients_db), 2)
+        response = client.post('/register/bulk', data=CSV, content_type='text/plain')
+        self.assertEqual(response.status_code, 415)
+        app.patients_db.clear()
+
+if __name__ == '__main__':
+    unittest.main()
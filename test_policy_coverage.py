@@ -0,0 +1,63 @@
+import unittest
+from datetime import date
+from policy_coverage import OPEN_END, coverage_decision, coverage_interval, lapsed_appointments
+from repository import InMemoryRepository
+
+POLICY = {
+    "patient_id": "P1",
+    "eligibility_status": "active",
+    "coverage_details": {"effective_date": "2025-01-01", "expiration_date": "2025-06-30"}
+}
+
+def make_appointment(appointment_id, day, insurance_id=None, patient_id="P1"):
+    appointment = {"appointment_id": appointment_id, "patient_id": patient_id, "doctor_id": "D001",
+                   "date": day, "time": "09:00", "status": "confirmed"}
+    if insurance_id:
+        appointment["insurance_id"] = insurance_id
+    return appointment
+
+class TestCoverage(unittest.TestCase):
+    def test_interval_formats(self):
+        self.assertEqual(coverage_interval(POLICY), (date(2025, 1, 1).toordinal(), date(2025, 6, 30).toordinal()))
+        self.assertEqual(coverage_interval({"start_date": "2025-01-01"}), (date(2025, 1, 1).toordinal(), OPEN_END))
+        self.assertEqual(coverage_interval({"expiry_date": "2030-01-01"})[1], date(2030, 1, 1).toordinal())
+
+    def test_decision_uses_the_service_date(self):
+        interval = coverage_interval(POLICY)
+        self.assertEqual(coverage_decision(POLICY, interval, date(2025, 6, 30)), (True, "Covered on 2025-06-30"))
+        self.assertEqual(coverage_decision(POLICY, interval, date(2025, 7, 1)),
+                         (False, "Coverage ended on 2025-06-30"))
+        self.assertEqual(coverage_decision(POLICY, interval, date(2024, 12, 31)),
+                         (False, "Coverage starts on 2025-01-01"))
+        self.assertFalse(coverage_decision({**POLICY, "eligibility_status": "inactive"}, interval, None)[0])
+        self.assertTrue(coverage_decision(POLICY, interval, None)[0])
+
+    def test_policies_are_indexed_per_patient(self):
+        repo = InMemoryRepository()
+        repo.insurance["SEC1"] = {**POLICY, "coverage_level": "secondary"}
+        repo.insurance["PRI1"] = POLICY
+        self.assertEqual([number for number, _, _ in repo.insurance.policies_for("P1")], ["PRI1", "SEC1"])
+        repo.insurance["PRI1"] = {**POLICY, "coverage_details": {"expiration_date": "2025-03-31"}}
+        self.assertEqual(repo.insurance.coverage("PRI1")[1][1], date(2025, 3, 31).toordinal())
+        del repo.insurance["PRI1"]
+        self.assertIsNone(repo.insurance.coverage("PRI1"))
+
+    def test_lapse_sweep(self):
+        repo = InMemoryRepository()
+        repo.insurance["PRI1"] = POLICY
+        repo.insurance["SEC1"] = {**POLICY, "coverage_level": "secondary",
+                                  "coverage_details": {"effective_date": "2025-07-01"}}
+        appointments = [
+            make_appointment("past", "2024-01-01", "PRI1"),
+            make_appointment("covered", "2025-06-01", "PRI1"),
+            make_appointment("lapsed", "2025-08-01", "PRI1"),
+            make_appointment("secondary", "2025-08-01"),
+            make_appointment("unknown", "2025-05-01", "NOPE"),
+            make_appointment("uninsured", "2025-05-01", patient_id="P2"),
+        ]
+        lapsed = lapsed_appointments(appointments, repo.insurance, date(2025, 1, 1))
+        self.assertEqual([entry["appointment_id"] for entry in lapsed], ["unknown", "uninsured", "lapsed"])
+        self.assertEqual(lapsed[2]["reason"], "Coverage ended on 2025-06-30")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+from policy_coverage import OPEN_END
+from repository import InMemoryRepository, JournaledRepository, SQLiteRepository, create_repository
+
+APPOINTMENT = {
+    "appointment_id": "A1",
+    "patient_id": "P123",
+    "doctor_id": "D001",
+    "date": "2025-06-01",
+    "time": "09:00",
+    "status": "confirmed"
+}
+
+class RepositoryContract:
+    """Behaviour every repository backend must provide"""
+
+    def test_patients_round_trip(self):
+        patient_id = self.repo.patients.add({"first_name": "John", "email": "john@example.com"})
+        self.assertEqual(self.repo.patients.get(patient_id)["first_name"], "John")
+        self.assertTrue(self.repo.patients.update(patient_id, {"first_name": "Johnny"}))
+        self.assertEqual(self.repo.patients.get(patient_id)["first_name"], "Johnny")
+        self.assertEqual(len(self.repo.patients), 1)
+        self.assertIsNotNone(self.repo.patients.delete(patient_id))
+        self.assertIsNone(self.repo.patients.get(patient_id))
+
+    def test_duplicate_indexes_follow_updates(self):
+        record = {"first_name": "John", "last_name": "Doe", "id_number": "AB-123",
+                  "insurance_number": "INS456", "contact_info": "John.Doe@Example.com"}
+        patient_id, duplicates = self.repo.patients.add_if_unique(record)
+        self.assertEqual(duplicates, {})
+        _, duplicates = self.repo.patients.add_if_unique({**record, "id_number": "ab123 ",
+                                                          "contact_info": "john.doe@example.com"})
+        self.assertEqual(duplicates, {"email": patient_id, "id_number": patient_id, "insurance_number": patient_id})
+        self.repo.patients.update(patient_id, {**record, "insurance_number": "INS789"})
+        self.assertNotIn("insurance_number", self.repo.patients.find_duplicates(record))
+        self.assertEqual(self.repo.patients.find_duplicates(record, exclude_id=patient_id), {})
+        self.repo.patients.delete(patient_id)
+        self.assertEqual(self.repo.patients.find_duplicates(record), {})
+
+    def test_batch_add_rejects_duplicates(self):
+        first = {"first_name": "John", "id_number": "AB-123", "insurance_number": "INS456"}
+        existing, _ = self.repo.patients.add_if_unique(first)
+        results = self.repo.patients.add_many_if_unique([
+            {"first_name": "Jane", "id_number": "CD-456"},
+            {"first_name": "Johnny", "id_number": "ab123"},
+            {"first_name": "Janet", "id_number": "cd456"}
+        ])
+        self.assertEqual(results[1], (None, {"id_number": existing}))
+        # A later row of the same batch is checked against the earlier ones
+        self.assertEqual(results[2], (None, {"id_number": results[0][0]}))
+        self.assertEqual(len(self.repo.patients), 2)
+
+    def test_similar_patients_share_blocking_key(self):
+        patient_id = self.repo.patients.add({"first_name": "José", "last_name": "O'Connor", "dob": "1990-05-15"})
+        similar = self.repo.patients.find_similar({"first_name": "OCONNOR", "last_name": "Jose", "dob": "1990-05-15"})
+        self.assertEqual([p["patient_id"] for p in similar], [patient_id])
+        self.assertEqual(self.repo.patients.find_similar({"first_name": "Jose", "last_name": "OConnor",
+                                                          "dob": "1990-05-16"}), [])
+
+    def test_insurance_mapping(self):
+        self.repo.seed_sample_data()
+        self.assertIn("INS456", self.repo.insurance)
+        self.assertNotIn("INS000", self.repo.insurance)
+        self.assertEqual(self.repo.insurance["INS456"]["patient_id"], "P123")
+        self.repo.insurance["INS900"] = {"patient_id": "P123", "eligibility_status": "active"}
+        self.assertEqual(len(self.repo.insurance.for_patient("P123")), 2)
+        del self.repo.insurance["INS900"]
+        self.assertIsNone(self.repo.insurance.get("INS900"))
+
+    def test_coverage_windows(self):
+        record = {"patient_id": "P1", "coverage_details": {"effective_date": "2025-01-01"}, "end_date": "2025-12-31"}
+        self.repo.insurance["INS900"] = record
+        window = (date(2025, 1, 1).toordinal(), date(2025, 12, 31).toordinal())
+        self.assertEqual(self.repo.insurance.coverage("INS900"), (record, window))
+        self.repo.insurance["INS900"] = {**record, "end_date": None}
+        self.assertEqual(self.repo.insurance.policies_for("P1")[0][2], (window[0], OPEN_END))
+        self.assertIsNone(self.repo.insurance.coverage("INS000"))
+
+    def test_appointments_reserve_slots(self):
+        self.assertTrue(self.repo.appointments.add(APPOINTMENT))
+        self.assertFalse(self.repo.appointments.add({**APPOINTMENT, "appointment_id": "A2"}))
+        self.assertTrue(self.repo.appointments.is_booked("D001", "2025-06-01", "09:00"))
+        self.assertEqual(self.repo.appointments.booked_times("D001", "2025-06-01"), ["09:00"])
+        self.assertEqual(self.repo.appointments.remove("A1")["time"], "09:00")
+        self.assertEqual(self.repo.appointments.booked_mask("D001", "2025-06-01"), 0)
+
+    def test_appointments_cancel_and_reschedule(self):
+        appointments = self.repo.appointments
+        appointments.add(APPOINTMENT)
+        appointments.add({**APPOINTMENT, "appointment_id": "A2", "time": "10:00"})
+        self.assertIsNone(appointments.reschedule("A1", "D001", "2025-06-01", "10:00"))
+        self.assertEqual(appointments.reschedule("A1", "D001", "2025-06-01", "11:00")["time"], "11:00")
+        self.assertEqual(appointments.booked_times("D001", "2025-06-01"), ["10:00", "11:00"])
+        self.assertEqual(appointments.cancel("A2")["status"], "cancelled")
+        self.assertIsNone(appointments.cancel("A2"))
+        self.assertTrue(appointments.add({**APPOINTMENT, "appointment_id": "A3", "time": "10:00"}))
+        self.assertEqual([a["appointment_id"] for a in appointments.day_appointments("D001", "2025-06-01")],
+                         ["A3", "A1"])
+        self.assertEqual([a["time"] for a in appointments.for_patient("P123")], ["10:00", "10:00", "11:00"])
+        self.assertEqual(appointments.get("A2")["status"], "cancelled")
+
+class TestInMemoryRepository(RepositoryContract, unittest.TestCase):
+    def setUp(self):
+        self.repo = InMemoryRepository()
+
+class TestJournaledRepository(RepositoryContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.repo = JournaledRepository(self.tmp.name)
+
+    def tearDown(self):
+        self.repo.close()
+        self.tmp.cleanup()
+
+class TestSQLiteRepository(RepositoryContract, unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "hospital.db")
+        self.repo = SQLiteRepository(self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_state_is_shared_between_repositories(self):
+        # A second repository on the same file stands in for another worker process
+        other = create_repository(self.path)
+        self.assertTrue(self.repo.appointments.add(APPOINTMENT))
+        self.assertFalse(other.appointments.add({**APPOINTMENT, "appointment_id": "A2"}))
+        self.assertEqual(other.appointments.get("A1")["patient_id"], "P123")
+
+    def test_coverage_columns_are_added_to_older_databases(self):
+        path = os.path.join(self.tmp.name, "old.db")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE insurance (policy_number TEXT PRIMARY KEY, patient_id TEXT, record TEXT NOT NULL)")
+        conn.execute("INSERT INTO insurance VALUES ('INS1', 'P1', ?)", (json.dumps({"start_date": "2025-01-01"}),))
+        conn.commit()
+        conn.close()
+        insurance = SQLiteRepository(path).insurance
+        self.assertEqual(insurance.coverage("INS1")[1], (date(2025, 1, 1).toordinal(), OPEN_END))
+        self.assertIsNotNone(insurance.version("INS1"))
+
+    def test_insurance_version_changes_on_every_write(self):
+        insurance = self.repo.insurance
+        self.assertIsNone(insurance.version("INS1"))
+        insurance["INS1"] = {"patient_id": "P1"}
+        first = insurance.version("INS1")
+        insurance["INS1"] = {"patient_id": "P1"}
+        self.assertNotIn(insurance.version("INS1"), (None, first))
+        del insurance["INS1"]
+        self.assertIsNone(insurance.version("INS1"))
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "requires fork")
+    def test_forked_worker_opens_its_own_connection(self):
+        parent_connection = self.repo.patients.db.connection()
+        pid = os.fork()
+        if pid == 0:
+            ok = self.repo.patients.db.connection() is not parent_connection and self.repo.appointments.add(APPOINTMENT)
+            os._exit(0 if ok else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertEqual(self.repo.appointments.get("A1")["patient_id"], "P123")
+
+if __name__ == '__main__':
+    unittest.main()
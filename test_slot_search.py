@@ -0,0 +1,37 @@
+import unittest
+from datetime import date
+from doctor_registry import DoctorRegistry
+from slot_search import earliest_openings, iter_free_slots
+
+class TestSlotSearch(unittest.TestCase):
+    def test_iter_free_slots_starts_at_first_index(self):
+        masks = {date(2025, 6, 1): 0b1011, date(2025, 6, 2): 0, date(2025, 6, 3): 0b100}
+        slots = list(iter_free_slots(masks.get, date(2025, 6, 1), date(2025, 6, 3), first_index=1))
+        self.assertEqual(slots, [(date(2025, 6, 1), 1), (date(2025, 6, 1), 3), (date(2025, 6, 3), 2)])
+
+    def test_earliest_openings_reads_only_what_it_needs(self):
+        calls = []
+
+        def free_mask(doctor_id, day):
+            calls.append((doctor_id, day))
+            return 0b10 if doctor_id == "A" else 0b1
+
+        openings = earliest_openings(["A", "B"], free_mask, date(2025, 6, 1), date(2025, 12, 31), limit=3)
+        self.assertEqual(openings, [(date(2025, 6, 1), 0, "B"), (date(2025, 6, 1), 1, "A"),
+                                    (date(2025, 6, 2), 0, "B")])
+        self.assertLessEqual(len(calls), 4)
+
+class TestDoctorRegistry(unittest.TestCase):
+    def test_indexes_by_id_and_specialty(self):
+        registry = DoctorRegistry([{"doctor_id": "D1", "name": "A", "specialty": "Cardiology"},
+                                   {"doctor_id": "D2", "name": "B", "specialty": "Pediatrics"}])
+        registry.add({"doctor_id": "D1", "name": "A", "specialty": "Pediatrics"})
+        self.assertEqual(registry.for_specialty("Cardiology"), [])
+        self.assertEqual([d["doctor_id"] for d in registry.for_specialty("Pediatrics")], ["D2", "D1"])
+        self.assertEqual(registry.specialties(), ["Pediatrics"])
+        registry.remove("D2")
+        self.assertNotIn("D2", registry)
+        self.assertEqual(len(registry), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+from validation import (
+    APPOINTMENT_SCHEMA,
+    REGISTRATION_FORM_SCHEMA,
+    is_valid_date,
+    is_valid_insurance_id,
+    is_valid_phone,
+    is_valid_time,
+    parse_date,
+)
+
+class TestValidators(unittest.TestCase):
+    def test_dates(self):
+        self.assertEqual(parse_date("2024-02-29").isoformat(), "2024-02-29")
+        for value in ("2023-02-29", "2025-13-01", "2025-6-1", "2025-06-00", "20250601", "", None, 20250601):
+            self.assertFalse(is_valid_date(value), value)
+
+    def test_times(self):
+        self.assertTrue(is_valid_time("09:30"))
+        self.assertTrue(is_valid_time("23:59"))
+        for value in ("9:30", "24:00", "12:60", "12:00:00", None):
+            self.assertFalse(is_valid_time(value), value)
+
+    def test_phone_and_insurance_id(self):
+        self.assertTrue(is_valid_phone("+1-555-123-4567"))
+        self.assertTrue(is_valid_phone("5551234567"))
+        self.assertFalse(is_valid_phone("12345"))
+        self.assertTrue(is_valid_insurance_id("ABC123456789"))
+        self.assertFalse(is_valid_insurance_id("abc123456789"))
+
+class TestSchema(unittest.TestCase):
+    def test_first_error_mode(self):
+        data = {"patient_id": "P1", "insurance_id": "I1", "doctor_id": "D001", "date": "2025-6-1", "time": "9:00"}
+        self.assertEqual(APPOINTMENT_SCHEMA.validate(data), ["Invalid date format. Use YYYY-MM-DD"])
+        self.assertEqual(APPOINTMENT_SCHEMA.missing_fields({"patient_id": " ", "date": ""}),
+                         ["patient_id", "insurance_id", "doctor_id", "date", "time"])
+
+    def test_collect_all_mode(self):
+        data = {"first_name": "John", "last_name": "", "dob": "1990-02-30", "email": "john@example.com",
+                "phone": "123", "address": "1 Main St", "insurance_provider": "Acme", "policy_number": ""}
+        self.assertEqual(REGISTRATION_FORM_SCHEMA.validate(data, collect_all=True), [
+            "Last Name is required",
+            "Policy Number is required",
+            "Date of Birth must be in YYYY-MM-DD format",
+            "Phone Number must have 10 to 15 digits"
+        ])
+
+if __name__ == '__main__':
+    unittest.main()
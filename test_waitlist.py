@@ -0,0 +1,167 @@
+import os
+import tempfile
+import threading
+import unittest
+from datetime import date
+from repository import SQLiteDatabase
+from waitlist import BOOKED, EXPIRED, LEFT, WAITING, SQLiteWaitlist, Waitlist
+
+class TestWaitlist(unittest.TestCase):
+    def setUp(self):
+        self.waitlist = Waitlist(today=lambda: date(2025, 6, 1))
+        self.booked = []
+
+    def book(self, entry):
+        self.booked.append(entry['patient_id'])
+        return {"appointment_id": f"A-{entry['patient_id']}"}
+
+    def add(self, patient_id, start="2025-06-01", end="2025-06-30", **kwargs):
+        if 'specialty' not in kwargs:
+            kwargs.setdefault('doctor_id', "D001")
+        return self.waitlist.add(patient_id, "INS", start, end, **kwargs)
+
+    def test_priority_then_join_order_across_doctor_and_specialty(self):
+        self.add("P1")
+        self.add("P2", specialty="General Practice")
+        self.add("P3", specialty="General Practice", priority=5)
+        self.add("P4", doctor_id="D002")
+        self.assertEqual([e["patient_id"] for e in self.waitlist.queue(specialty="General Practice")], ["P3", "P2"])
+        for _ in range(3):
+            self.waitlist.backfill("D001", "General Practice", "2025-06-02", self.book)
+        self.assertEqual(self.booked, ["P3", "P1", "P2"])
+        self.assertIsNone(self.waitlist.backfill("D001", "General Practice", "2025-06-02", self.book))
+
+    def test_entries_outside_their_dates_or_ineligible_are_kept(self):
+        early = self.add("P1", end="2025-06-05")
+        ineligible = self.add("P2")
+        late = self.add("P3")
+        entry = self.waitlist.backfill("D001", "GP", "2025-06-10",
+                                       lambda e: "Coverage ended" if e["patient_id"] == "P2" else self.book(e))
+        self.assertIs(entry, late)
+        self.assertEqual((early["status"], ineligible["status"], late["status"]), (WAITING, WAITING, BOOKED))
+        self.assertEqual(ineligible["last_skipped"]["reason"], "Coverage ended")
+        self.assertEqual([e["patient_id"] for e in self.waitlist.queue("D001")], ["P1", "P2"])
+
+    def test_taken_slot_stops_matching(self):
+        first = self.add("P1")
+        self.assertIsNone(self.waitlist.backfill("D001", "GP", "2025-06-02", lambda entry: None))
+        self.assertEqual(first["status"], WAITING)
+        self.assertEqual(len(self.waitlist), 1)
+
+    def test_left_excluded_and_expired_entries_are_skipped(self):
+        left = self.add("P1")
+        self.add("P2")
+        expired = self.add("P3", start="2025-05-01", end="2025-05-31", priority=9)
+        self.assertIs(self.waitlist.remove(left["waitlist_id"]), left)
+        self.assertIsNone(self.waitlist.remove(left["waitlist_id"]))
+        self.assertIsNone(self.waitlist.backfill("D001", "GP", "2025-06-02", self.book, exclude_patient="P2"))
+        self.assertEqual((left["status"], expired["status"]), (LEFT, EXPIRED))
+        self.assertEqual(self.waitlist.backfill("D001", "GP", "2025-06-02", self.book)["patient_id"], "P2")
+
+    def test_needs_doctor_or_specialty(self):
+        with self.assertRaises(ValueError):
+            self.waitlist.add("P1", "INS", "2025-06-01", "2025-06-30")
+        with self.assertRaises(ValueError):
+            self.waitlist.add("P1", "INS", "2025-06-30", "2025-06-01", doctor_id="D001")
+
+class TestSQLiteWaitlist(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'waitlist.db')
+        self.waitlist = self.worker()
+        self.booked = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def worker(self, **kwargs):
+        """A waitlist over the shared database file, as one gunicorn worker would have"""
+        return SQLiteWaitlist(SQLiteDatabase(self.path), today=lambda: date(2025, 6, 1), **kwargs)
+
+    def book(self, entry):
+        self.booked.append(entry['patient_id'])
+        return {"appointment_id": f"A-{entry['patient_id']}"}
+
+    def add(self, patient_id, start="2025-06-01", end="2025-06-30", **kwargs):
+        if 'specialty' not in kwargs:
+            kwargs.setdefault('doctor_id', "D001")
+        return self.waitlist.add(patient_id, "INS", start, end, **kwargs)
+
+    def status(self, entry):
+        return self.waitlist.get(entry["waitlist_id"])["status"]
+
+    def test_priority_then_join_order_across_doctor_and_specialty(self):
+        self.add("P1")
+        self.add("P2", specialty="General Practice")
+        self.add("P3", specialty="General Practice", priority=5)
+        self.add("P4", doctor_id="D002")
+        self.assertEqual([e["patient_id"] for e in self.waitlist.queue(specialty="General Practice")], ["P3", "P2"])
+        for _ in range(3):
+            self.waitlist.backfill("D001", "General Practice", "2025-06-02", self.book)
+        self.assertEqual(self.booked, ["P3", "P1", "P2"])
+        self.assertIsNone(self.waitlist.backfill("D001", "General Practice", "2025-06-02", self.book))
+        self.assertEqual(len(self.waitlist), 1)
+
+    def test_entries_outside_their_dates_or_ineligible_are_kept(self):
+        early = self.add("P1", end="2025-06-05")
+        ineligible = self.add("P2")
+        late = self.add("P3")
+        entry = self.waitlist.backfill("D001", "GP", "2025-06-10",
+                                       lambda e: "Coverage ended" if e["patient_id"] == "P2" else self.book(e))
+        self.assertEqual((entry["waitlist_id"], entry["appointment_id"]), (late["waitlist_id"], "A-P3"))
+        self.assertEqual([self.status(e) for e in (early, ineligible, late)], [WAITING, WAITING, BOOKED])
+        self.assertEqual(self.waitlist.get(ineligible["waitlist_id"])["last_skipped"]["reason"], "Coverage ended")
+        self.assertEqual([e["patient_id"] for e in self.waitlist.queue("D001")], ["P1", "P2"])
+
+    def test_left_excluded_and_expired_entries_are_skipped(self):
+        left = self.add("P1")
+        self.add("P2")
+        expired = self.add("P3", start="2025-05-01", end="2025-05-31", priority=9)
+        self.assertEqual(self.waitlist.remove(left["waitlist_id"])["status"], LEFT)
+        self.assertIsNone(self.waitlist.remove(left["waitlist_id"]))
+        self.assertIsNone(self.waitlist.backfill("D001", "GP", "2025-06-02", self.book, exclude_patient="P2"))
+        self.assertEqual((self.status(left), self.status(expired)), (LEFT, EXPIRED))
+        self.assertEqual(self.waitlist.backfill("D001", "GP", "2025-06-02", self.book)["patient_id"], "P2")
+
+    def test_workers_share_entries_and_do_not_offer_one_entry_twice(self):
+        other = self.worker()
+        entry = self.add("P1")
+        self.add("P2")
+        self.assertEqual(other.get(entry["waitlist_id"])["patient_id"], "P1")
+        offering, release = threading.Event(), threading.Event()
+
+        def slow_book(entry):
+            offering.set()
+            release.wait(5)
+            return self.book(entry)
+
+        thread = threading.Thread(target=other.backfill, args=("D001", "GP", "2025-06-02", slow_book))
+        thread.start()
+        offering.wait(5)
+        # P1 is being offered a slot by the other worker, so this cancellation goes to P2
+        self.assertIsNone(self.waitlist.remove(entry["waitlist_id"]))
+        self.assertEqual(self.waitlist.backfill("D001", "GP", "2025-06-02", self.book)["patient_id"], "P2")
+        release.set()
+        thread.join()
+        self.assertEqual(self.booked, ["P2", "P1"])
+        self.assertEqual(len(other), 0)
+
+    def test_failed_and_abandoned_offers_are_released(self):
+        now = [1000.0]
+        worker = self.worker(lease=60, clock=lambda: now[0])
+        entry = self.add("P1")
+
+        def failing_book(entry):
+            raise RuntimeError("booking failed")
+
+        with self.assertRaises(RuntimeError):
+            worker.backfill("D001", "GP", "2025-06-02", failing_book)
+        self.assertEqual(self.status(entry), WAITING)
+        # A worker killed while offering a slot leaves its claim behind until the lease ends
+        worker.db.connection().execute("UPDATE waitlist SET offered_until = ?", (now[0] + 60,))
+        self.assertIsNone(worker.backfill("D001", "GP", "2025-06-02", self.book))
+        now[0] += 61
+        self.assertEqual(worker.backfill("D001", "GP", "2025-06-02", self.book)["patient_id"], "P1")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import unittest
+import appointment_scheduling_api
+import wsgi
+from repository import get_repository
+
+class TestCreateApp(unittest.TestCase):
+    def setUp(self):
+        self.app = wsgi.create_app()
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        appointment_scheduling_api.appointments_db.clear()
+
+    def test_serves_every_service(self):
+        self.assertEqual(self.client.get('/api/doctors').status_code, 200)
+        response = self.client.get('/api/insurance/eligibility?patient_id=P123&insurance_id=INS456')
+        self.assertEqual(response.get_json()["eligibility_status"], "active")
+        self.assertEqual(self.client.post('/register', json={}).status_code, 400)
+
+    def test_services_share_the_repository(self):
+        self.assertIs(self.app.extensions['repository'], get_repository())
+        response = self.client.post('/api/appointments', json={
+            "patient_id": "P123", "insurance_id": "INS456", "doctor_id": "D001", "date": "2025-06-03", "time": "09:00"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(response.get_json()["appointment_id"], get_repository().appointments)
+
+    def test_conflicting_repository_settings_are_rejected(self):
+        with self.assertRaises(RuntimeError):
+            wsgi.create_app({'DATABASE_PATH': 'other.db'})
+
+if __name__ == '__main__':
+    unittest.main()
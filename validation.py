@@ -0,0 +1,219 @@
+"""
+Shared input validation for every intake path.
+
+Patterns are compiled once at import and dates/times are checked without strptime, so
+the bulk and batch paths can validate large volumes cheaply. Each entry point describes
+its input as a Schema of Fields defined here, so they all agree on what is valid.
+"""
+import re
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}', re.ASCII)
+TIME_PATTERN = re.compile(r'([01]\d|2[0-3]):[0-5]\d', re.ASCII)
+EMAIL_PATTERN = re.compile(r'[^\s@]+@[^\s@]+\.[^\s@]+')
+PHONE_PATTERN = re.compile(r'\+?[\d\s\-().]+')
+INSURANCE_ID_PATTERN = re.compile(r'[A-Z]{3}\d{9}', re.ASCII)
+
+_DAYS_IN_MONTH = (31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31)
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """Parse a YYYY-MM-DD string into a date, or return None if it is not a real date"""
+    if not isinstance(value, str):
+        return None
+    if DATE_PATTERN.fullmatch(value) is None:
+        return None
+    year, month, day = int(value[:4]), int(value[5:7]), int(value[8:])
+    if not 1 <= month <= 12 or day < 1:
+        return None
+    leap = month == 2 and year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+    if day > _DAYS_IN_MONTH[month - 1] + leap or year < 1:
+        return None
+    return date(year, month, day)
+
+
+def is_valid_date(value: Any) -> bool:
+    return parse_date(value) is not None
+
+
+def is_valid_time(value: Any) -> bool:
+    """True for a zero-padded 24-hour HH:MM time"""
+    return isinstance(value, str) and TIME_PATTERN.fullmatch(value) is not None
+
+
+def is_valid_email(value: Any) -> bool:
+    return isinstance(value, str) and EMAIL_PATTERN.fullmatch(value) is not None
+
+
+def is_valid_phone(value: Any) -> bool:
+    """Digits with optional leading + and separators, 10 to 15 digits in total"""
+    if not isinstance(value, str) or PHONE_PATTERN.fullmatch(value) is None:
+        return False
+    digits = sum(c.isdigit() for c in value)
+    return 10 <= digits <= 15
+
+
+def is_valid_insurance_id(value: Any) -> bool:
+    """Insurance ID format used by InsuranceVerifier (e.g. ABC123456789)"""
+    return isinstance(value, str) and INSURANCE_ID_PATTERN.fullmatch(value) is not None
+
+
+class Field:
+    """
+    One input field.
+    required: the value must be present and non-blank (or just present with allow_blank).
+    check: format check applied to present, non-blank values.
+    Messages are format strings that may use {name} and {label}.
+    """
+
+    def __init__(self, name: str, label: Optional[str] = None, required: bool = False, allow_blank: bool = False,
+                 check: Optional[Callable[[Any], bool]] = None, max_length: Optional[int] = None,
+                 required_message: str = "{label} is required", invalid_message: str = "Invalid {label}",
+                 too_long_message: str = "{label} exceeds maximum length of {max_length} characters"):
+        self.name = name
+        self.label = label or name
+        self.required = required
+        self.allow_blank = allow_blank
+        self.check = check
+        self.max_length = max_length
+        self.required_message = required_message
+        self.invalid_message = invalid_message
+        self.too_long_message = too_long_message
+
+    def _format(self, message: str) -> str:
+        return message.format(name=self.name, label=self.label, max_length=self.max_length)
+
+    def is_missing(self, data: Dict) -> bool:
+        if self.name not in data or data[self.name] is None:
+            return True
+        value = data[self.name]
+        return not self.allow_blank and not (value.strip() if isinstance(value, str) else value)
+
+    def error(self, value: Any) -> Optional[str]:
+        """Format error for a present value, or None"""
+        if value is None or (isinstance(value, str) and not value.strip()):
+            return None
+        if self.max_length is not None and isinstance(value, str) and len(value) > self.max_length:
+            return self._format(self.too_long_message)
+        if self.check is not None and not self.check(value):
+            return self._format(self.invalid_message)
+        return None
+
+
+class Schema:
+    """An ordered set of Fields validated together"""
+
+    def __init__(self, fields: Sequence[Field]):
+        self.fields = list(fields)
+        self.required_names = [field.name for field in self.fields if field.required]
+
+    def missing_fields(self, data: Dict) -> List[str]:
+        """Names of required fields that are absent or blank, in schema order"""
+        return [field.name for field in self.fields if field.required and field.is_missing(data)]
+
+    def validate(self, data: Dict, collect_all: bool = False) -> List[str]:
+        """
+        Return error messages for data (empty if valid).
+        By default every missing required field is reported, or else only the first
+        invalid field; with collect_all every error is reported.
+        """
+        errors = [field._format(field.required_message)
+                  for field in self.fields if field.required and field.is_missing(data)]
+        if errors and not collect_all:
+            return errors
+        for field in self.fields:
+            error = field.error(data.get(field.name))
+            if error is not None:
+                errors.append(error)
+                if not collect_all:
+                    break
+        return errors
+
+
+# POST /register and the bulk import: the fields only need to be present
+REGISTRATION_SCHEMA = Schema([
+    Field(name, required=True, allow_blank=True, required_message="Missing field: {name}")
+    for name in ('first_name', 'last_name', 'id_number', 'insurance_number', 'contact_info')
+])
+
+# PatientRegistration (the registration flow covered by test_patient_registration.py)
+PATIENT_SCHEMA = Schema([
+    Field('first_name', "First Name", required=True, max_length=50, required_message="{label} is required.",
+          too_long_message="{label} exceeds maximum length of {max_length} characters."),
+    Field('last_name', "Last Name", required=True, max_length=50, required_message="{label} is required.",
+          too_long_message="{label} exceeds maximum length of {max_length} characters."),
+    Field('email', "Email", required=True, check=is_valid_email,
+          required_message="{label} is required.", invalid_message="Invalid email format."),
+    Field('dob', "Date of Birth", required=True, check=is_valid_date,
+          required_message="{label} is required.", invalid_message="Invalid date of birth format."),
+    Field('phone', "Phone Number", check=is_valid_phone, invalid_message="Invalid phone number format."),
+])
+
+# Desktop registration form (patient_registration.PatientRegistrationApp)
+REGISTRATION_FORM_SCHEMA = Schema([
+    Field('first_name', "First Name", required=True),
+    Field('last_name', "Last Name", required=True),
+    Field('dob', "Date of Birth", required=True, check=is_valid_date,
+          required_message="{label} must be in YYYY-MM-DD format", invalid_message="{label} must be in YYYY-MM-DD format"),
+    Field('email', "Email", required=True, check=is_valid_email,
+          required_message="Valid {label} is required", invalid_message="Valid {label} is required"),
+    Field('phone', "Phone Number", required=True, check=is_valid_phone,
+          required_message="{label} must have 10 to 15 digits", invalid_message="{label} must have 10 to 15 digits"),
+    Field('address', "Address", required=True),
+    Field('insurance_provider', "Insurance Provider", required=True),
+    Field('policy_number', "Policy Number", required=True),
+])
+
+# patient_forms.py registration and insurance forms and their mock endpoints
+PATIENT_FORM_SCHEMA = Schema([Field(name, required=True) for name in ('first_name', 'last_name', 'dob', 'email')])
+INSURANCE_FORM_SCHEMA = Schema([Field(name, required=True) for name in ('provider', 'policy_number')])
+
+# InsuranceVerifier.update_insurance_info
+INSURANCE_UPDATE_SCHEMA = Schema([
+    Field(name, required=True, allow_blank=True) for name in ('provider', 'expiry_date', 'member_name')
+])
+
+# GET /api/insurance/eligibility
+ELIGIBILITY_QUERY_SCHEMA = Schema([
+    Field('patient_id', required=True),
+    Field('insurance_id', required=True),
+    Field('service_date', check=is_valid_date, invalid_message="Invalid service_date format. Use YYYY-MM-DD"),
+])
+
+# POST /api/insurance/eligibility and each item of the batch endpoint
+ELIGIBILITY_REQUEST_SCHEMA = Schema([
+    Field('patient_id', required=True),
+    Field('insurance_id', required=True),
+    Field('first_name', required=True),
+    Field('last_name', required=True),
+    Field('date_of_birth', required=True, check=is_valid_date,
+          invalid_message="Invalid date_of_birth format. Use YYYY-MM-DD"),
+    Field('service_date', check=is_valid_date, invalid_message="Invalid service_date format. Use YYYY-MM-DD"),
+])
+
+# POST /api/appointments
+APPOINTMENT_SCHEMA = Schema([
+    Field('patient_id', required=True),
+    Field('insurance_id', required=True),
+    Field('doctor_id', required=True),
+    Field('date', required=True, check=is_valid_date, invalid_message="Invalid date format. Use YYYY-MM-DD"),
+    Field('time', required=True, check=is_valid_time, invalid_message="Invalid time format. Use HH:MM"),
+])
+
+# POST /api/waitlist: either doctor_id or specialty is given (checked by the endpoint)
+WAITLIST_SCHEMA = Schema([
+    Field('patient_id', required=True),
+    Field('insurance_id', required=True),
+    Field('doctor_id'),
+    Field('specialty'),
+    Field('start_date', required=True, check=is_valid_date, invalid_message="Invalid start_date format. Use YYYY-MM-DD"),
+    Field('end_date', required=True, check=is_valid_date, invalid_message="Invalid end_date format. Use YYYY-MM-DD"),
+])
+
+# POST /api/appointments/<appointment_id>/reschedule: the doctor stays the same unless given
+RESCHEDULE_SCHEMA = Schema([
+    Field('doctor_id'),
+    Field('date', required=True, check=is_valid_date, invalid_message="Invalid date format. Use YYYY-MM-DD"),
+    Field('time', required=True, check=is_valid_time, invalid_message="Invalid time format. Use HH:MM"),
+])
@@ -0,0 +1,268 @@
+"""
+Waitlist for appointments, and backfill of cancelled slots from it.
+
+A patient waits for any slot of one doctor, or of any doctor with a specialty, between
+two dates. Entries are kept in one priority queue (a heap) per doctor and per specialty,
+ordered by priority (higher first) and then by when they joined. When a slot is freed,
+backfill() walks the doctor's and the specialty's queues together in that order and
+books the slot for the first entry whose dates include the slot's date and who can take
+it (e.g. whose insurance covers the date). Entries that do not match are put back, so
+the cost is proportional to the entries looked at, not to the size of the waitlist.
+
+Left, booked and expired entries are marked rather than deleted from the heaps, and are
+dropped when they reach the head of a queue.
+
+With DATABASE_PATH the waitlist is the waitlist table of the shared database instead
+(SQLiteWaitlist), so every worker sees the same entries. A worker claims an entry for
+OFFER_LEASE seconds while it tries to book a slot for it, so two cancellations in
+different workers cannot offer slots to the same entry.
+"""
+import heapq
+import itertools
+import json
+import threading
+import time
+import uuid
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from policy_coverage import date_ordinal
+from repository import SQLiteDatabase, SQLiteRepository
+
+WAITING = 'waiting'
+BOOKED = 'booked'
+LEFT = 'left'
+EXPIRED = 'expired'
+
+# (-priority, join sequence number, waitlist_id)
+QueueItem = Tuple[int, int, str]
+
+# Seconds an entry stays claimed by a worker offering it a slot, should that worker die
+OFFER_LEASE = 60.0
+
+
+def new_entry(patient_id: str, insurance_id: str, start_date: str, end_date: str, doctor_id: Optional[str],
+              specialty: Optional[str], priority: int) -> Tuple[Dict, int, int]:
+    """A waiting entry and its (first, last) date ordinals; ValueError if it is invalid"""
+    if (doctor_id is None) == (specialty is None):
+        raise ValueError("A waitlist entry needs either a doctor_id or a specialty")
+    first, last = date_ordinal(start_date), date_ordinal(end_date)
+    if first is None or last is None or last < first:
+        raise ValueError("Invalid waitlist date range")
+    entry = {
+        "waitlist_id": str(uuid.uuid4()),
+        "patient_id": patient_id,
+        "insurance_id": insurance_id,
+        "doctor_id": doctor_id,
+        "specialty": specialty,
+        "start_date": start_date,
+        "end_date": end_date,
+        "priority": priority,
+        "status": WAITING
+    }
+    return entry, first, last
+
+
+class Waitlist:
+    """Waitlist entries by waitlist_id, queued per ('doctor', doctor_id) and ('specialty', specialty)"""
+
+    def __init__(self, today: Callable[[], date] = date.today):
+        self._today = today
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        # waitlist_id -> (first, last) date ordinal
+        self._ranges: Dict[str, Tuple[int, int]] = {}
+        self._queues: Dict[Tuple[str, str], List[QueueItem]] = {}
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return sum(1 for entry in list(self._entries.values()) if entry['status'] == WAITING)
+
+    def get(self, waitlist_id: str) -> Optional[Dict]:
+        return self._entries.get(waitlist_id)
+
+    def add(self, patient_id: str, insurance_id: str, start_date: str, end_date: str,
+            doctor_id: Optional[str] = None, specialty: Optional[str] = None, priority: int = 0) -> Dict:
+        """Put a patient on the waitlist of a doctor or, without one, of a specialty"""
+        entry, first, last = new_entry(patient_id, insurance_id, start_date, end_date, doctor_id, specialty, priority)
+        key = ('doctor', doctor_id) if doctor_id is not None else ('specialty', specialty)
+        with self._lock:
+            self._entries[entry['waitlist_id']] = entry
+            self._ranges[entry['waitlist_id']] = (first, last)
+            heapq.heappush(self._queues.setdefault(key, []),
+                           (-priority, next(self._sequence), entry['waitlist_id']))
+        return entry
+
+    def remove(self, waitlist_id: str) -> Optional[Dict]:
+        """Take a waiting entry off the waitlist; returns it, or None if it is not waiting"""
+        with self._lock:
+            entry = self._entries.get(waitlist_id)
+            if entry is None or entry['status'] != WAITING:
+                return None
+            entry['status'] = LEFT
+            return entry
+
+    def queue(self, doctor_id: Optional[str] = None, specialty: Optional[str] = None) -> List[Dict]:
+        """Waiting entries of a doctor or a specialty, in the order they would be offered a slot"""
+        key = ('doctor', doctor_id) if doctor_id is not None else ('specialty', specialty)
+        with self._lock:
+            items = sorted(self._queues.get(key, ()))
+            return [self._entries[item[2]] for item in items if self._entries[item[2]]['status'] == WAITING]
+
+    def backfill(self, doctor_id: str, specialty: str, slot_date: str,
+                 book: Callable[[Dict], Union[Dict, str, None]], exclude_patient: Optional[str] = None) -> Optional[Dict]:
+        """
+        Offer a freed slot of doctor_id on slot_date to the waitlist. book(entry) books the
+        slot for an entry and returns the appointment, returns a reason (str) if that
+        patient cannot take it, or None if the slot is no longer free. Returns the entry the
+        slot was booked for, or None. Runs under the waitlist's lock, so concurrent
+        cancellations cannot offer two slots to the same entry.
+        """
+        day = date_ordinal(slot_date)
+        today = self._today().toordinal()
+        with self._lock:
+            queues = [queue for queue in (self._queues.get(('doctor', doctor_id)),
+                                          self._queues.get(('specialty', specialty))) if queue]
+            skipped: List[Tuple[List[QueueItem], QueueItem]] = []
+            try:
+                while queues:
+                    queue = min(queues, key=lambda q: q[0])
+                    item = heapq.heappop(queue)
+                    if not queue:
+                        queues.remove(queue)
+                    waitlist_id = item[2]
+                    entry = self._entries[waitlist_id]
+                    first, last = self._ranges[waitlist_id]
+                    if entry['status'] != WAITING:
+                        continue
+                    if last < today:
+                        entry['status'] = EXPIRED
+                        continue
+                    skipped.append((queue, item))
+                    if not first <= day <= last or entry['patient_id'] == exclude_patient:
+                        continue
+                    result = book(entry)
+                    if result is None:
+                        return None
+                    if isinstance(result, str):
+                        entry['last_skipped'] = {"date": slot_date, "reason": result}
+                        continue
+                    skipped.pop()
+                    entry['status'] = BOOKED
+                    entry['appointment_id'] = result['appointment_id']
+                    return entry
+                return None
+            finally:
+                for queue, item in skipped:
+                    heapq.heappush(queue, item)
+
+
+class SQLiteWaitlist:
+    """Waitlist over the waitlist table of the shared SQLite database; same interface as Waitlist"""
+
+    _columns = "record, status, appointment_id, last_skipped"
+
+    def __init__(self, db: SQLiteDatabase, today: Callable[[], date] = date.today,
+                 lease: float = OFFER_LEASE, clock: Callable[[], float] = time.time):
+        self.db = db
+        self._today = today
+        self.lease = lease
+        self._clock = clock
+
+    @staticmethod
+    def _entry(row) -> Dict:
+        record, status, appointment_id, last_skipped = row
+        entry = json.loads(record)
+        entry['status'] = status
+        if appointment_id is not None:
+            entry['appointment_id'] = appointment_id
+        if last_skipped is not None:
+            entry['last_skipped'] = json.loads(last_skipped)
+        return entry
+
+    def __len__(self) -> int:
+        return self.db.connection().execute("SELECT COUNT(*) FROM waitlist WHERE status = ?", (WAITING,)).fetchone()[0]
+
+    def get(self, waitlist_id: str) -> Optional[Dict]:
+        row = self.db.connection().execute(
+            f"SELECT {self._columns} FROM waitlist WHERE waitlist_id = ?", (waitlist_id,)).fetchone()
+        return self._entry(row) if row else None
+
+    def add(self, patient_id: str, insurance_id: str, start_date: str, end_date: str,
+            doctor_id: Optional[str] = None, specialty: Optional[str] = None, priority: int = 0) -> Dict:
+        """Put a patient on the waitlist of a doctor or, without one, of a specialty"""
+        entry, first, last = new_entry(patient_id, insurance_id, start_date, end_date, doctor_id, specialty, priority)
+        record = {key: value for key, value in entry.items() if key != 'status'}
+        self.db.connection().execute(
+            "INSERT INTO waitlist (waitlist_id, patient_id, doctor_id, specialty, first_day, last_day, priority,"
+            " status, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (entry['waitlist_id'], patient_id, doctor_id, specialty, first, last, priority, WAITING,
+             json.dumps(record)))
+        return entry
+
+    def remove(self, waitlist_id: str) -> Optional[Dict]:
+        """Take a waiting entry off the waitlist; returns it, or None if it is not waiting or is being offered a slot"""
+        changed = self.db.connection().execute(
+            "UPDATE waitlist SET status = ? WHERE waitlist_id = ? AND status = ?"
+            " AND (offered_until IS NULL OR offered_until < ?)",
+            (LEFT, waitlist_id, WAITING, self._clock())).rowcount
+        return self.get(waitlist_id) if changed else None
+
+    def queue(self, doctor_id: Optional[str] = None, specialty: Optional[str] = None) -> List[Dict]:
+        """Waiting entries of a doctor or a specialty, in the order they would be offered a slot"""
+        column, value = ('doctor_id', doctor_id) if doctor_id is not None else ('specialty', specialty)
+        rows = self.db.connection().execute(
+            f"SELECT {self._columns} FROM waitlist WHERE {column} = ? AND status = ? ORDER BY priority DESC, seq",
+            (value, WAITING)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def backfill(self, doctor_id: str, specialty: str, slot_date: str,
+                 book: Callable[[Dict], Union[Dict, str, None]], exclude_patient: Optional[str] = None) -> Optional[Dict]:
+        """
+        See Waitlist.backfill. Each candidate is claimed before book(entry) is called and
+        released afterwards, so no two workers offer slots to the same entry at once.
+        """
+        day = date_ordinal(slot_date)
+        conn = self.db.connection()
+        now = self._clock()
+        conn.execute(
+            "UPDATE waitlist SET status = ? WHERE (doctor_id = ? OR specialty = ?) AND status = ? AND last_day < ?"
+            " AND (offered_until IS NULL OR offered_until < ?)",
+            (EXPIRED, doctor_id, specialty, WAITING, self._today().toordinal(), now))
+        candidates = conn.execute(
+            "SELECT waitlist_id FROM waitlist WHERE (doctor_id = ? OR specialty = ?) AND status = ?"
+            " AND first_day <= ? AND last_day >= ? AND patient_id IS NOT ? ORDER BY priority DESC, seq",
+            (doctor_id, specialty, WAITING, day, day, exclude_patient)).fetchall()
+        for (waitlist_id,) in candidates:
+            now = self._clock()
+            claimed = conn.execute(
+                "UPDATE waitlist SET offered_until = ? WHERE waitlist_id = ? AND status = ?"
+                " AND (offered_until IS NULL OR offered_until < ?)",
+                (now + self.lease, waitlist_id, WAITING, now)).rowcount
+            if not claimed:
+                continue
+            status, appointment_id, last_skipped = WAITING, None, None
+            try:
+                entry = self.get(waitlist_id)
+                result = book(entry)
+                if isinstance(result, str):
+                    last_skipped = json.dumps({"date": slot_date, "reason": result})
+                elif result is not None:
+                    status, appointment_id = BOOKED, result['appointment_id']
+            finally:
+                conn.execute(
+                    "UPDATE waitlist SET offered_until = NULL, status = ?, appointment_id = COALESCE(?, appointment_id),"
+                    " last_skipped = COALESCE(?, last_skipped) WHERE waitlist_id = ?",
+                    (status, appointment_id, last_skipped, waitlist_id))
+            if result is None:
+                return None
+            if status == BOOKED:
+                return self.get(waitlist_id)
+        return None
+
+
+def create_waitlist(repository, today: Callable[[], date] = date.today):
+    """A waitlist next to the repository's data: shared with SQLite, per process otherwise"""
+    if isinstance(repository, SQLiteRepository):
+        return SQLiteWaitlist(repository.db, today)
+    return Waitlist(today)
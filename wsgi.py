@@ -0,0 +1,45 @@
+"""
+One WSGI app serving patient registration, insurance verification and appointment scheduling.
+
+Usage: gunicorn -c gunicorn.conf.py   (or: python wsgi.py for a development server)
+
+create_app configures the shared repository before it imports the service modules, so
+every blueprint works on the same stores and eligibility cache. Request metrics
+for all of them are served at /metrics. The service modules (and
+their dependencies) are only imported by create_app. Under gunicorn's preload_app the
+imports, schema setup and seeding run once in the master, and workers fork already
+initialized; each worker opens its own SQLite connections after the fork.
+"""
+import os
+from typing import Dict, Optional
+
+from flask import Flask
+
+
+def create_app(config: Optional[Dict] = None) -> Flask:
+    """
+    Build the combined app. config overrides the defaults read from the environment:
+    DATABASE_PATH (SQLite database shared by all workers) and JOURNAL_DIR.
+    """
+    app = Flask(__name__)
+    app.config['DATABASE_PATH'] = os.environ.get('DATABASE_PATH')
+    app.config['JOURNAL_DIR'] = os.environ.get('JOURNAL_DIR')
+    app.config.update(config or {})
+
+    from repository import configure_repository
+    app.extensions['repository'] = configure_repository(app.config['DATABASE_PATH'], app.config['JOURNAL_DIR'])
+
+    from app import registration
+    from appointment_scheduling_api import scheduling
+    from insurance_verification_api import insurance
+    app.register_blueprint(registration)
+    app.register_blueprint(insurance)
+    app.register_blueprint(scheduling)
+
+    import metrics
+    metrics.init_app(app)
+    return app
+
+
+if __name__ == '__main__':
+    create_app().run(debug=True, host='0.0.0.0', port=5000)